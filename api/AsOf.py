@@ -0,0 +1,103 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# As-of (nearest preceding row) lookups for time-ordered tables
+#
+# AsOf.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#
+#
+#   AsOfSeries
+#
+#       Streaming "as-of" join side. The table is read once, in time order,
+#       with its own cursor. Each lookup() receives a batch of non-decreasing
+#       timestamps (typically a fetchmany() batch of hitcount rotations) and
+#       returns, for each, the latest row whose time is at or before it.
+#       Rows are fetched only as far as the batch requires and matched with
+#       numpy.searchsorted(); rows no longer needed are dropped, so memory use
+#       stays bounded and no correlated subqueries are executed.
+#
+#       Reading starts from the last row at or before 'begin', so that the
+#       first rotations of the range also get their preceding row.
+#
+import numpy
+
+from .                  import DataObject
+
+
+class AsOfSeries:
+
+    def __init__(
+        self,
+        cursor,
+        table,
+        time_column,
+        columns,
+        begin = None,
+        end = None,
+        tolerance = None,
+        batch = 1024
+    ):
+        """As-of lookup of 'columns' in 'table', by 'time_column'. Matches older than 'tolerance' seconds are not returned."""
+        self.table      = DataObject(cursor, table)
+        self.columns    = columns
+        self.tolerance  = tolerance
+        self.batch      = batch
+        self.times      = numpy.empty(0, dtype = numpy.int64)
+        self.rows       = []
+        self.exhausted  = False
+        self.empty      = (None,) * (len(columns) + 1)
+
+        ts = self.table.where_condition(time_column)
+        conditions = ["{} IS NOT NULL".format(ts)]
+        if begin is not None:
+            conditions.append(
+                "{0} >= (SELECT ifnull(max({0}), :begin) FROM {1} WHERE {0} <= :begin)"
+                .format(ts, table)
+            )
+        if end is not None:
+            conditions.append("{} <= :end".format(ts))
+        self.sql = "SELECT {} AS {}{} FROM {} WHERE {} ORDER BY {}.{}".format(
+            ts,
+            time_column,
+            "".join(", " + c for c in columns),
+            table,
+            " AND ".join(conditions),
+            table,
+            time_column
+        )
+        self.cursor = cursor.connection.cursor()
+        self.cursor.execute(self.sql, {'begin' : begin, 'end' : end})
+
+
+    def lookup(self, timestamps):
+        """Return a list of matching rows, (time, column values...) tuples, for a non-decreasing NumPy array of 'timestamps'. Later calls must not use earlier timestamps. Rotations without a match get a tuple of None's."""
+        limit = timestamps[-1]
+        while not self.exhausted and \
+              (not self.times.size or self.times[-1] <= limit):
+            rows = self.cursor.fetchmany(self.batch)
+            if not rows:
+                self.exhausted = True
+                self.cursor.close()
+                break
+            self.times = numpy.concatenate(
+                (self.times, numpy.array([r[0] for r in rows], dtype = numpy.int64))
+            )
+            self.rows += rows
+        index = numpy.searchsorted(self.times, timestamps, side = 'right') - 1
+        if self.tolerance is not None and self.times.size:
+            stale = timestamps - self.times[numpy.maximum(index, 0)] > self.tolerance
+            index[stale] = -1
+        result = [self.rows[i] if i >= 0 else self.empty for i in index.tolist()]
+        # Rows before the last match can never match again
+        drop = int(numpy.searchsorted(self.times, limit, side = 'right')) - 1
+        if drop > 0:
+            self.times = self.times[drop:]
+            self.rows  = self.rows[drop:]
+        return result
+
+
+# EOF
@@ -0,0 +1,206 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# Multi-resource batch requests
+#
+# Batch.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#   0.1.1   2026.10.19  Query time budget reported as api.Timeout.
+#   0.1.2   2026.10.19  Functions and aggregates validated per resource.
+#
+#
+#   Batch
+#
+#       Executes a list of read-only sub-requests, given as JSON payload:
+#
+#       {
+#           "parallel"  : false,
+#           "requests"  : [
+#               {
+#                   "resource"  : "hitcount",
+#                   "aggregate" : "avg",
+#                   "fields"    : ["s1", "s2"],
+#                   "begin"     : 1541400000,
+#                   "end"       : 1541430000
+#               },
+#               {
+#                   "resource"  : "housekeeping",
+#                   "function"  : "latest"
+#               },
+#               ...
+#           ]
+#       }
+#
+#       'resource' is one of the keys of Batch.resources. 'function' is one
+#       of the resource's functions (default 'get'), 'aggregate' (only with
+#       'get') is one of the resource's aggregates. 'psu' supports only
+#       'get', without an aggregate. All other keys are passed to the resource
+#       class as request arguments, exactly as the corresponding GET
+#       endpoint would receive them (lists are joined with commas).
+#
+#       By default, sub-requests are executed one after another on the
+#       request's database connection, inside one read transaction. Results
+#       are therefore a consistent snapshot of the database.
+#
+#       With "parallel" : true, sub-requests are executed in a thread pool
+#       of BATCH_MAX_WORKERS (default 2) threads, each with its own database
+#       connection and read transaction. Results may then come from
+#       different database states (writes committed between the
+#       sub-requests are visible to the later ones).
+#
+#       A failing sub-request does not fail the batch; its result carries
+#       the error code and message. Unexpected errors are logged and
+#       reported as a generic InternalError. At most BATCH_MAX_REQUESTS (default 32)
+#       sub-requests are accepted.
+#
+#       Serial sub-requests share the request's query time budget
+#       (api.QueryBudget, endpoint 'batch'). Once it is used up, remaining
+#       sub-requests fail with the Timeout error.
+#
+import sqlite3
+
+from flask              import g
+
+from application        import app
+from .                  import ArgumentRequest, InvalidArgument, InternalError
+from .                  import timeout_error
+
+
+class Batch:
+
+    functions  = ('get', 'latest', 'stats', 'quantile')
+    aggregates = ('avg', 'sum', 'min', 'max', 'count')
+
+    # {resource : (module, class, functions, aggregates)}
+    resources = {
+        'hitcount'      : ('api.HitCount',      'HitCount',     functions, aggregates),
+        'housekeeping'  : ('api.Housekeeping',  'Housekeeping', functions, aggregates),
+        'pulseheight'   : ('api.PulseHeight',   'PulseHeight',  functions, aggregates),
+        'psu'           : ('api.PSU',           'PSU',          ('get',),  ())
+    }
+
+    def __init__(self, request):
+        """Parse and validate batch payload."""
+        payload = request.get_json(silent = True)
+        if isinstance(payload, list):
+            payload = {'requests' : payload}
+        if not isinstance(payload, dict) or \
+           not isinstance(payload.get('requests'), list):
+            raise InvalidArgument(
+                "This method requires a JSON payload!",
+                "Expected {\"requests\" : [...]} or a list of sub-requests."
+            )
+        limit = int(app.config.get('BATCH_MAX_REQUESTS', 32))
+        if len(payload['requests']) > limit:
+            raise InvalidArgument(
+                "Too many sub-requests!",
+                "At most {} sub-requests are accepted.".format(limit)
+            )
+        self.parallel = bool(payload.get('parallel', False))
+        self.requests = [
+            self.parse(i, item) for i, item in enumerate(payload['requests'])
+        ]
+
+
+    def parse(self, index, item):
+        """Return (resource, function, aggregate, args) of a sub-request."""
+        if not isinstance(item, dict):
+            raise InvalidArgument(
+                "Sub-request #{} is not an object!".format(index)
+            )
+        item      = dict(item)
+        resource  = str(item.pop('resource', '')).lower()
+        function  = str(item.pop('function', 'get')).lower()
+        aggregate = item.pop('aggregate', None)
+        if resource not in self.resources:
+            raise InvalidArgument(
+                "Sub-request #{}: unsupported resource '{}'!".format(index, resource),
+                "Supported resources: {}".format(", ".join(self.resources))
+            )
+        _, _, functions, aggregates = self.resources[resource]
+        if function not in functions:
+            raise InvalidArgument(
+                "Sub-request #{}: unsupported function '{}' for '{}'!"
+                .format(index, function, resource),
+                "Supported functions: {}".format(", ".join(functions))
+            )
+        if aggregate is not None:
+            aggregate = str(aggregate).lower()
+            if function != 'get' or aggregate not in aggregates:
+                raise InvalidArgument(
+                    "Sub-request #{}: aggregate '{}' is not supported for '{}'!"
+                    .format(index, aggregate, resource),
+                    "Supported aggregates: {}".format(", ".join(aggregates) or "none")
+                )
+        args = {}
+        for key, value in item.items():
+            if isinstance(value, (list, tuple)):
+                value = ",".join(str(v) for v in value)
+            args[key] = str(value)
+        return resource, function, aggregate, args
+
+
+    def execute(self, resource, function, aggregate, args):
+        """Run one sub-request (in the current application context). Returns result dictionary."""
+        import importlib
+        module, name, _, _ = self.resources[resource]
+        cls = getattr(importlib.import_module(module), name)
+        try:
+            instance = cls(ArgumentRequest(args))
+            if function == 'get':
+                code, payload = instance.get(aggregate) \
+                                if aggregate else instance.get()
+            else:
+                code, payload = getattr(instance, function)()
+            return {"code" : code, "data" : payload.get('data')}
+        except Exception as e:
+            e = timeout_error(e)
+            if getattr(e, 'ApiException', None):
+                return dict(code = e.code, **e.to_dict())
+            # Unexpected error, log trace and report a generic error
+            app.logger.exception(
+                "Batch sub-request failed! resource='{}', function='{}', args='{}'"
+                .format(resource, function, args)
+            )
+            e = InternalError("Sub-request failed!")
+            return dict(code = e.code, **e.to_dict())
+
+
+    def execute_in_thread(self, subrequest):
+        """Run one sub-request on a connection of its own (thread pool worker)."""
+        with app.app_context():
+            g.db = sqlite3.connect(
+                app.config.get('SQLITE3_DATABASE_FILE', 'pmapi.sqlite3')
+            )
+            try:
+                g.db.execute("PRAGMA foreign_keys = 1")
+                g.db.execute("BEGIN")
+                return self.execute(*subrequest)
+            finally:
+                g.db.rollback()
+                g.db.close()
+                if hasattr(g, 'cache'):
+                    g.cache.close()
+
+
+    def post(self):
+        """Execute sub-requests. Returns results in the order of the sub-requests."""
+        if self.parallel and len(self.requests) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            workers = int(app.config.get('BATCH_MAX_WORKERS', 2))
+            with ThreadPoolExecutor(max_workers = max(1, workers)) as pool:
+                results = list(pool.map(self.execute_in_thread, self.requests))
+        else:
+            # One read transaction, one consistent snapshot
+            g.db.execute("BEGIN")
+            try:
+                results = [self.execute(*item) for item in self.requests]
+            finally:
+                g.db.rollback()
+        return (200, {"data" : results})
+
+
+# EOF
@@ -8,6 +8,7 @@
 # Command.py - Jani Tammi <jasata@utu.fi>
 #
 #   0.1.0   2018.10.12  Initial version.
+#   0.1.1   2026.10.19  Request arguments parsed with api.ArgumentSchema.
 #
 import json
 import logging
@@ -17,58 +18,19 @@ import sqlite3
 from flask              import g
 from application        import app
 from .                  import InvalidArgument, NotFound
-from .                  import DataObject
+from .                  import DataObject, ArgumentSchema
 
 class Command(DataObject):
 
-    accepted_request_arguments = ('id')
-    class DotDict(dict):
-        """dot.notation access to dictionary attributes"""
-        __getattr__ = dict.get
-        __setattr__ = dict.__setitem__
-        __delattr__ = dict.__delitem__
-        def __missing__(self, key):
-            """Return None if non-existing key is accessed"""
-            return None
+    argument_schema = ArgumentSchema(
+        ('id',          int)
+    )
 
     def __init__(self, request):
         """Parses request arguments."""
         self.cursor = g.db.cursor()
         super().__init__(self.cursor, 'command')
-
-        try:
-            # build empty arg dictionary
-            self.args = self.DotDict()
-            for var in self.accepted_request_arguments:
-                setattr(self.args, var, None)
-
-            if request.args:
-                # Raise exception for request unsupported arguments
-                for key, _ in request.args.items():
-                    if key not in self.accepted_request_arguments:
-                        raise InvalidArgument(
-                            "Unsupported argument '{}'".format(key)
-                        )
-
-                try:
-                    id = request.args.get('id', None)
-                except Exception as e:
-                    # Replace with api.ApiException
-                    raise InvalidArgument(
-                        "Argument extraction failed!",
-                        {'arguments' : request.args, 'exception' : str(e)}
-                    ) from None
-
-                self.args.id = int(id) if begin else None
-
-        except InvalidArgument:
-            raise
-        except Exception as e:
-            # Replace with api.ApiException
-            raise InvalidArgument(
-                "Parameter parsing failed!",
-                str(e)
-            ) from None
+        self.parse_arguments(request)
 
         #
         # JSON, if any
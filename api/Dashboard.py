@@ -0,0 +1,162 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# Dashboard snapshot, materialised by a background thread
+#
+# Dashboard.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#   0.1.1   2026.10.19  ETag derived from the snapshot data.
+#
+#
+#   Dashboard
+#
+#       UI dashboard needs PSU values, the latest housekeeping row and the
+#       latest hit counter rotation. Instead of each console requesting
+#       these separately on every refresh, one background thread per worker
+#       process keeps a snapshot of them, already encoded with every
+#       registered response encoder. Requests only select the encoding that
+#       matches their 'Accept' header, so the cost of a request does not
+#       depend on the number of open consoles.
+#
+#       The thread polls 'PRAGMA data_version' on its own database
+#       connection every DASHBOARD_POLL_INTERVAL (default 0.5) seconds. The
+#       value changes whenever another connection commits to the database;
+#       only then the snapshot is rebuilt.
+#
+#       The thread is started by the first dashboard request in each worker
+#       process (threads do not survive uWSGI's fork, so they cannot be
+#       started at import). uWSGI must run with threads enabled ('threads'
+#       or 'enable-threads' in uwsgi.ini).
+#
+#       The ETag is a hash of the JSON encoded snapshot data (without the
+#       per process 'api' element), so all worker processes give the same
+#       ETag for the same data and conditional requests work regardless of
+#       the worker that answers them.
+#
+#       Requests and rebuilds are counted in api.metrics as
+#       'dashboard.request' and 'dashboard.build'.
+#
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+from flask              import g
+
+from application        import app
+from .                  import encoders, count_metric, ArgumentRequest
+from .                  import NotFound, Timeout
+
+
+class Dashboard:
+
+    lock     = threading.Lock()
+    ready    = threading.Event()
+    thread   = None
+    pid      = None
+    snapshot = None         # {'version', 'built', 'etag', 'encoded' : {mimetype : bytes}}
+
+    @classmethod
+    def current(cls):
+        """Return the current snapshot, starting the refresher thread if necessary."""
+        count_metric('dashboard.request')
+        with cls.lock:
+            if cls.thread is None or cls.pid != os.getpid() or \
+               not cls.thread.is_alive():
+                cls.pid    = os.getpid()
+                cls.ready  = threading.Event()
+                cls.thread = threading.Thread(
+                    target  = cls.run,
+                    name    = 'dashboard-refresher',
+                    daemon  = True
+                )
+                cls.thread.start()
+        if not cls.ready.wait(float(app.config.get('DASHBOARD_WAIT', 5.0))):
+            raise Timeout(
+                "Dashboard snapshot is not available!",
+                "Background refresher has not produced a snapshot yet."
+            )
+        return cls.snapshot
+
+
+    @classmethod
+    def run(cls):
+        """Refresher thread main loop."""
+        interval = float(app.config.get('DASHBOARD_POLL_INTERVAL', 0.5))
+        database = app.config.get('SQLITE3_DATABASE_FILE', 'pmapi.sqlite3')
+        monitor  = sqlite3.connect(database)
+        version  = None
+        while True:
+            try:
+                current = monitor.execute("PRAGMA data_version").fetchone()[0]
+                if current != version:
+                    cls.build(database, current)
+                    version = current
+            except Exception:
+                app.logger.exception("Dashboard snapshot refresh failed!")
+            time.sleep(interval)
+
+
+    @classmethod
+    def build(cls, database, version):
+        """Query dashboard data and store it, encoded, as the current snapshot."""
+        from .PSU           import PSU
+        from .Housekeeping  import Housekeeping
+        from .HitCount      import HitCount
+
+        def data(function):
+            try:
+                return function()[1]['data']
+            except NotFound:
+                return None
+
+        with app.app_context():
+            g.db = sqlite3.connect(database)
+            try:
+                request = ArgumentRequest()
+                snapshot = {
+                    "psu"           : data(lambda: PSU(request).get()),
+                    "housekeeping"  : data(lambda: Housekeeping(request).latest()),
+                    "hitcount"      : data(lambda: HitCount(request).latest())
+                }
+            finally:
+                g.db.close()
+
+        built   = time.time()
+        payload = {
+            "data"  : snapshot,
+            "api"   : {
+                "version"   : app.apiversion,
+                "snapshot"  : {
+                    "data_version"  : version,
+                    "built"         : built
+                }
+            }
+        }
+        def encode(function, payload):
+            body = function(payload)
+            return body.encode('utf-8') if isinstance(body, str) else body
+
+        encoded = {
+            mimetype : encode(function, payload)
+            for mimetype, function in encoders.items()
+        }
+        # Same data, same ETag, in every worker process
+        etag = hashlib.sha1(
+            encode(encoders['application/json'], {"data" : snapshot})
+        ).hexdigest()
+        cls.snapshot = {
+            'version'   : version,
+            'built'     : built,
+            'etag'      : etag,
+            'encoded'   : encoded
+        }
+        count_metric('dashboard.build')
+        cls.ready.set()
+
+
+# EOF
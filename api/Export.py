@@ -0,0 +1,567 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# Background CSV export jobs
+#
+# Export.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#   0.2.0   2026.10.19  Sharded exports, formatted in a process pool.
+#   0.2.1   2026.10.19  Unsharded exports read in short keyset bounded pages.
+#   0.2.2   2026.10.19  Arguments not used by the export method rejected by POST.
+#
+#
+#   Export
+#
+#       Long CSV exports are written into files by a background worker
+#       pool, instead of being streamed by an API thread for the whole
+#       duration of the transfer. A job is created with a POST (same
+#       arguments as the corresponding '/csv/*' endpoint), its progress is
+#       polled from a status endpoint and the finished file is downloaded
+#       separately.
+#
+#       Job state is kept in the local cache database (api.cache_db(),
+#       table 'export_job'). Files are written into EXPORT_DIRECTORY
+#       (default 'exports'), first as '<file>.part' and renamed when
+#       complete. Each worker process runs a pool of EXPORT_WORKERS
+#       (default 1) threads, each with its own database connection.
+#       Progress (rows, bytes and, when the rows carry a timestamp, the
+#       fraction of the time range written) is stored at most once per
+#       EXPORT_PROGRESS_INTERVAL (default 1.0) seconds.
+#
+#       Exports of query based resources are sharded: the table's rowid
+#       range, up to its largest rowid at the start of the job (later
+#       inserts are not included), is split into up to 4 x EXPORT_PROCESSES
+#       (default: number of CPUs) ranges of at least EXPORT_SHARD_ROWS
+#       (default 10000) rowids. Each range is read with a read-only
+#       connection and CSV formatted in a pool of EXPORT_PROCESSES
+#       processes (csvshard.py). Shard files are concatenated in rowid (and
+#       therefore time) order, so the file is identical to an unsharded
+#       export. Process pool interpreter can be set with EXPORT_PYTHON.
+#       EXPORT_PROCESSES = 1 disables sharding.
+#
+#       Finished files are served with HTTP Range support (downloads can be
+#       resumed) through the WSGI file wrapper. If EXPORT_ACCEL_REDIRECT is
+#       set (an nginx 'internal' location that aliases EXPORT_DIRECTORY, for
+#       example '/exports/'), the transfer is handed to nginx with the
+#       'X-Accel-Redirect' header and no API thread is used for it.
+#
+#       Jobs (and their files) older than EXPORT_MAX_AGE (default 86400)
+#       seconds are removed when new jobs are created. Jobs left unfinished
+#       by a process that no longer exists are reported as failed.
+#
+import os
+import csv
+import json
+import time
+import sqlite3
+import itertools
+import threading
+
+from flask              import g
+
+from application        import app
+from .                  import cache_db, ArgumentRequest
+from .                  import InvalidArgument, NotFound, Conflict
+
+
+class Export:
+
+    # Tables for the local cache database
+    schema = (
+        """
+        CREATE TABLE IF NOT EXISTS export_job
+        (
+            id              INTEGER     PRIMARY KEY AUTOINCREMENT,
+            resource        TEXT        NOT NULL,
+            arguments       TEXT        NOT NULL,
+            state           TEXT        NOT NULL DEFAULT 'queued',
+            pid             INTEGER     NOT NULL,
+            rows            INTEGER     NOT NULL DEFAULT 0,
+            bytes           INTEGER     NOT NULL DEFAULT 0,
+            progress        REAL,
+            error           TEXT,
+            created         REAL        NOT NULL,
+            started         REAL,
+            finished        REAL
+        )
+        """,
+    )
+
+    # {resource : (module, class, method)}
+    # Method returns an SQLite3 cursor or (columns, rows) tuple.
+    # Resources read with 'paged_query' can be sharded.
+    resources = {
+        'hitcount'      : ('api.HitCount',      'HitCount',     'paged_query'),
+        'hitcount/asof' : ('api.HitCount',      'HitCount',     'asof'),
+        'housekeeping'  : ('api.Housekeeping',  'Housekeeping', 'paged_query'),
+        'pulseheight'   : ('api.PulseHeight',   'PulseHeight',  'paged_query')
+    }
+
+    # {method : (request arguments used by the method)}
+    # Other arguments (aggregates, grouping, histogram bins, ...) would be
+    # silently ignored or fail in the worker; POST rejects them.
+    arguments = {
+        'paged_query'   : (
+            'fields', 'begin', 'end', 'timestamp', 'session_id',
+            'sector', 'class', 'channel'
+        ),
+        'asof'          : (
+            'fields', 'begin', 'end', 'timestamp', 'session_id',
+            'sector', 'class', 'channel', 'housekeeping', 'psu', 'tolerance'
+        )
+    }
+
+    # Worker pool, one per process
+    executor     = None
+    executor_pid = None
+    lock         = threading.Lock()
+
+    def __init__(self, request):
+        """Export job interface for a request."""
+        self.request   = request
+        self.directory = os.path.abspath(
+            app.config.get('EXPORT_DIRECTORY', 'exports')
+        )
+        self.cache     = cache_db()
+        for sql in self.schema:
+            self.cache.execute(sql)
+        self.cache.commit()
+
+
+    @classmethod
+    def resource(cls, name, args):
+        """Create resource object 'name' for request arguments 'args' (dict)."""
+        import importlib
+        module, classname, method = cls.resources[name]
+        instance = getattr(
+            importlib.import_module(module),
+            classname
+        )(ArgumentRequest(args))
+        return instance, getattr(instance, method)
+
+
+    def path(self, job_id):
+        return os.path.join(self.directory, "export-{}.csv".format(job_id))
+
+
+    def job(self, job_id):
+        """Return job row as a dictionary. Raises NotFound."""
+        cursor = self.cache.execute(
+            "SELECT * FROM export_job WHERE id = ?",
+            (job_id,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            raise NotFound(
+                "Export job not found!",
+                "Job '{}' does not exist (or has expired).".format(job_id)
+            )
+        job = dict(zip([c[0] for c in cursor.description], row))
+        if job['state'] in ('queued', 'running') and not alive(job['pid']):
+            job['state'] = 'failed'
+            job['error'] = "Interrupted (worker process has exited)."
+            self.cache.execute(
+                "UPDATE export_job SET state = ?, error = ? WHERE id = ?",
+                (job['state'], job['error'], job_id)
+            )
+            self.cache.commit()
+        return job
+
+
+    def describe(self, job):
+        """Public representation of a job row."""
+        result = {
+            key : job[key] for key in (
+                'id', 'resource', 'state', 'rows', 'bytes', 'progress',
+                'error', 'created', 'started', 'finished'
+            )
+        }
+        result['arguments'] = json.loads(job['arguments'])
+        result['file'] = "/api/export/{}/file".format(job['id']) \
+                         if job['state'] == 'done' else None
+        return result
+
+
+    def expire(self):
+        """Remove jobs and files older than EXPORT_MAX_AGE seconds."""
+        limit = time.time() - float(app.config.get('EXPORT_MAX_AGE', 86400))
+        expired = [
+            row[0] for row in self.cache.execute(
+                "SELECT id FROM export_job WHERE created < ? "
+                "AND state NOT IN ('queued', 'running')",
+                (limit,)
+            )
+        ]
+        for job_id in expired:
+            self.remove_files(job_id)
+            self.cache.execute("DELETE FROM export_job WHERE id = ?", (job_id,))
+        self.cache.commit()
+
+
+    def remove_files(self, job_id):
+        import glob
+        for path in [self.path(job_id), self.path(job_id) + '.part'] + \
+                    glob.glob(glob.escape(self.path(job_id)) + '.*.part'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+    def post(self):
+        """Create export job from JSON payload {"resource" : str, <request arguments>}. Returns (202, {"data" : <job>})."""
+        payload = self.request.get_json(silent = True)
+        if not isinstance(payload, dict):
+            raise InvalidArgument("This method requires a JSON payload!")
+        payload  = dict(payload)
+        resource = str(payload.pop('resource', '')).lower()
+        if resource not in self.resources:
+            raise InvalidArgument(
+                "Unsupported export resource '{}'!".format(resource),
+                "Supported resources: {}".format(", ".join(self.resources))
+            )
+        args = {}
+        for key, value in payload.items():
+            if isinstance(value, (list, tuple)):
+                value = ",".join(str(v) for v in value)
+            args[key] = str(value)
+        # Validate arguments now, rather than in the worker
+        instance, _ = self.resource(resource, args)
+        accepted = [
+            key for key in self.arguments[self.resources[resource][2]]
+            if key in instance.argument_schema.arguments
+        ]
+        unused   = [key for key in args if key not in accepted]
+        if unused:
+            raise InvalidArgument(
+                "Argument(s) '{}' not supported by exports!".format(
+                    "', '".join(unused)
+                ),
+                "Resource '{}' exports accept: {}".format(
+                    resource,
+                    ", ".join(accepted)
+                )
+            )
+
+        self.expire()
+        os.makedirs(self.directory, exist_ok = True)
+        cursor = self.cache.execute(
+            "INSERT INTO export_job (resource, arguments, pid, created) "
+            "VALUES (?, ?, ?, ?)",
+            (resource, json.dumps(args), os.getpid(), time.time())
+        )
+        job_id = cursor.lastrowid
+        self.cache.commit()
+        self.pool().submit(run, job_id)
+        return (202, {"data" : self.describe(self.job(job_id))})
+
+
+    def get(self, job_id = None):
+        """Status of one job, or a list of all jobs (newest first)."""
+        if job_id is not None:
+            return (200, {"data" : self.describe(self.job(job_id))})
+        ids = [
+            row[0] for row in
+            self.cache.execute("SELECT id FROM export_job ORDER BY id DESC")
+        ]
+        return (200, {"data" : [self.describe(self.job(i)) for i in ids]})
+
+
+    def delete(self, job_id):
+        """Cancel a job (if unfinished) and remove it and its file."""
+        job = self.job(job_id)
+        if job['state'] in ('queued', 'running'):
+            # Worker notices the state change at its next progress update
+            self.cache.execute(
+                "UPDATE export_job SET state = 'cancelled' WHERE id = ?",
+                (job_id,)
+            )
+        else:
+            self.remove_files(job_id)
+            self.cache.execute("DELETE FROM export_job WHERE id = ?", (job_id,))
+        self.cache.commit()
+        return (200, {"data" : {"id" : job_id}})
+
+
+    def download(self, job_id):
+        """Return Flask.Response for the finished file."""
+        import flask
+        job = self.job(job_id)
+        if job['state'] != 'done':
+            raise Conflict(
+                "Export is not finished!",
+                "Job '{}' is {}.".format(job_id, job['state'])
+            )
+        filename = "{}-{}.csv".format(
+            job['resource'].replace('/', '-'),
+            time.strftime("%Y-%m-%d %H.%M.%S", time.localtime(job['created']))
+        )
+        accel = app.config.get('EXPORT_ACCEL_REDIRECT', None)
+        if accel:
+            response = flask.Response(mimetype = 'text/csv')
+            response.headers['X-Accel-Redirect'] = \
+                accel.rstrip('/') + '/' + os.path.basename(self.path(job_id))
+            response.headers.set(
+                'Content-Disposition',
+                'attachment',
+                filename = filename
+            )
+            return response
+        from werkzeug.exceptions import RequestedRangeNotSatisfiable
+        try:
+            return flask.send_file(
+                self.path(job_id),
+                mimetype        = 'text/csv',
+                as_attachment   = True,
+                download_name   = filename,
+                conditional     = True,
+                max_age         = 0
+            )
+        except RequestedRangeNotSatisfiable as e:
+            # 416 with 'Content-Range: bytes */<size>'
+            return e.get_response()
+
+
+    @classmethod
+    def pool(cls):
+        """Return this process's worker pool."""
+        with cls.lock:
+            if cls.executor is None or cls.executor_pid != os.getpid():
+                from concurrent.futures import ThreadPoolExecutor
+                cls.executor = ThreadPoolExecutor(
+                    max_workers = int(app.config.get('EXPORT_WORKERS', 1)),
+                    thread_name_prefix = 'export'
+                )
+                cls.executor_pid = os.getpid()
+        return cls.executor
+
+
+
+def alive(pid):
+    """True if process 'pid' exists."""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Cancelled(Exception):
+    pass
+
+
+def run(job_id):
+    """Worker; write export job's CSV file."""
+    with app.app_context():
+        g.db = sqlite3.connect(
+            app.config.get('SQLITE3_DATABASE_FILE', 'pmapi.sqlite3')
+        )
+        g.db.execute("PRAGMA foreign_keys = 1")
+        export = Export(None)
+        cache  = export.cache
+        path   = export.path(job_id)
+        try:
+            job = export.job(job_id)
+            if job['state'] == 'cancelled':
+                raise Cancelled()
+            if job['state'] != 'queued':
+                return
+            cache.execute(
+                "UPDATE export_job SET state = 'running', started = ? WHERE id = ?",
+                (time.time(), job_id)
+            )
+            cache.commit()
+            write(export, job_id, job['resource'], json.loads(job['arguments']), path)
+            cache.execute(
+                "UPDATE export_job SET state = 'done', progress = 1.0, "
+                "finished = ? WHERE id = ?",
+                (time.time(), job_id)
+            )
+            cache.commit()
+        except Cancelled:
+            export.remove_files(job_id)
+            cache.execute("DELETE FROM export_job WHERE id = ?", (job_id,))
+            cache.commit()
+        except Exception as e:
+            app.logger.exception("Export job {} failed!".format(job_id))
+            export.remove_files(job_id)
+            cache.execute(
+                "UPDATE export_job SET state = 'failed', error = ?, "
+                "finished = ? WHERE id = ?",
+                (str(e), time.time(), job_id)
+            )
+            cache.commit()
+        finally:
+            g.db.close()
+            if hasattr(g, 'cache'):
+                g.cache.close()
+
+
+def write(export, job_id, resource, args, path):
+    """Write CSV file '<path>.part' and rename it as 'path' once complete."""
+    instance, method = Export.resource(resource, args)
+    processes = int(app.config.get('EXPORT_PROCESSES', os.cpu_count() or 1))
+    ranges = None
+    if processes > 1 and Export.resources[resource][2] == 'paged_query':
+        ranges = shards(instance, processes)
+    if ranges:
+        count, size = write_shards(export, job_id, instance, ranges, processes, path)
+    else:
+        count, size = write_rows(export, job_id, instance, method, path)
+    os.replace(path + '.part', path)
+    export.cache.execute(
+        "UPDATE export_job SET rows = ?, bytes = ? WHERE id = ?",
+        (count, size, job_id)
+    )
+
+
+def report(export, job_id, count, size, progress):
+    """Store job progress. Raises Cancelled if the job is no longer running."""
+    cursor = export.cache.execute(
+        "UPDATE export_job SET rows = ?, bytes = ?, progress = ? "
+        "WHERE id = ? AND state = 'running'",
+        (count, size, progress, job_id)
+    )
+    export.cache.commit()
+    if cursor.rowcount == 0:
+        raise Cancelled()
+
+
+def write_rows(export, job_id, instance, method, path):
+    """Write all rows of 'method' result in this thread. Returns (rows, bytes)."""
+    # Range for progress estimate (rows are in time order). Queried before
+    # the export query, which uses the same cursor.
+    begin, end = instance.args.begin, instance.args.end
+    if begin is None or end is None:
+        oldest, newest = instance.timestamp_range()
+        begin = oldest if begin is None else begin
+        end   = newest if end is None else end
+
+    result = method()
+    if isinstance(result, tuple):
+        columns, rows = result
+    else:
+        columns, rows = [c[0] for c in result.description], result
+    ts = columns.index('timestamp') if 'timestamp' in columns else None
+    if begin is None or end is None or end <= begin:
+        ts = None
+
+    interval = float(app.config.get('EXPORT_PROGRESS_INTERVAL', 1.0))
+    batch    = int(app.config.get('EXPORT_BATCH_ROWS', 1024))
+    count    = 0
+    reported = time.perf_counter()
+    rows     = iter(rows)
+    with open(path + '.part', 'w', encoding = 'utf-8', newline = '') as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        while True:
+            chunk = list(itertools.islice(rows, batch))
+            if not chunk:
+                break
+            writer.writerows(chunk)
+            count += len(chunk)
+            if time.perf_counter() - reported >= interval:
+                progress = None
+                if ts is not None and chunk[-1][ts] is not None:
+                    progress = min(1.0, max(0.0,
+                        (chunk[-1][ts] - begin) / (end - begin)
+                    ))
+                report(export, job_id, count, file.tell(), progress)
+                reported = time.perf_counter()
+        return count, file.tell()
+
+
+def shards(instance, processes):
+    """Split the table into rowid ranges [(first, last), ...] for a sharded export. Returns None if the table is too small to be worth sharding."""
+    first, last = instance.rowid_bounds()
+    if first is None:
+        return None
+    span  = last - first + 1
+    count = min(
+        processes * 4,
+        span // max(1, int(app.config.get('EXPORT_SHARD_ROWS', 10000)))
+    )
+    if count < 2:
+        return None
+    step = -(-span // count)
+    return [
+        (lo, min(lo + step - 1, last)) for lo in range(first, last + 1, step)
+    ]
+
+
+def write_shards(export, job_id, instance, ranges, processes, path):
+    """Format rowid ranges in a process pool and concatenate the shard files, in order, into '<path>.part'. Returns (rows, bytes)."""
+    import io
+    import sys
+    import shutil
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    import csvshard
+
+    # Prepare the statement (and its bindings) with an empty rowid range;
+    # shards execute it with their own range.
+    instance.rowid_range = (0, -1)
+    cursor   = instance.query()
+    columns  = [c[0] for c in cursor.description]
+    sql      = instance.sql
+    bindings = dict(instance.args)
+    database = app.config.get('SQLITE3_DATABASE_FILE', 'pmapi.sqlite3')
+    batch    = int(app.config.get('EXPORT_BATCH_ROWS', 1024))
+
+    # Pool processes must not re-import the application (see csvshard.py).
+    # Under uWSGI, sys.executable is the uWSGI binary, not the interpreter.
+    context = multiprocessing.get_context('spawn')
+    python  = app.config.get('EXPORT_PYTHON', None) or sys.executable
+    if not os.path.basename(python).startswith('python'):
+        python = os.path.join(sys.exec_prefix, 'bin', 'python3')
+    context.set_executable(python)
+
+    parts = [
+        "{}.{}.part".format(path, n) for n in range(len(ranges))
+    ]
+    pool = ProcessPoolExecutor(
+        max_workers = min(processes, len(ranges)),
+        mp_context  = context
+    )
+    try:
+        futures = [
+            pool.submit(
+                csvshard.write_shard,
+                database,
+                sql,
+                dict(bindings, rowid_first = first, rowid_last = last),
+                part,
+                batch
+            )
+            for (first, last), part in zip(ranges, parts)
+        ]
+        count = 0
+        with open(path + '.part', 'wb') as file:
+            header = io.StringIO(newline = '')
+            csv.writer(header).writerow(columns)
+            file.write(header.getvalue().encode('utf-8'))
+            for n, (future, part) in enumerate(zip(futures, parts), 1):
+                rows, _ = future.result()
+                with open(part, 'rb') as shard:
+                    shutil.copyfileobj(shard, file, 1024 * 1024)
+                os.remove(part)
+                count += rows
+                report(export, job_id, count, file.tell(), n / len(parts))
+            return count, file.tell()
+    finally:
+        pool.shutdown(wait = True, cancel_futures = True)
+        for part in parts:
+            try:
+                os.remove(part)
+            except FileNotFoundError:
+                pass
+
+
+# EOF
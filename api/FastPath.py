@@ -0,0 +1,158 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# Fast-path WSGI dispatch for hot read endpoints
+#
+# FastPath.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#   0.1.1   2026.10.19  Query time budget on fast-path connections.
+#   0.1.2   2026.10.19  ApiException responses without the Flask fallback.
+#
+#
+#   FastPath
+#
+#       WSGI middleware that answers a whitelist of small, frequently polled
+#       GET endpoints (PSU values, latest rows) without Flask's request
+#       handling. URLs and payloads are the same as those of the
+#       corresponding Flask routes. Enabled with FASTPATH_ENABLED = True in
+#       application.conf (application.py installs it).
+#
+#       Per endpoint, the response headers ('Allow', 'Vary' and, per
+#       mimetype, 'Content-Type') are computed once at startup. Accept
+#       header negotiation results are cached by header value. Per request,
+#       only an application context is pushed (for 'g.db'), the resource
+#       object is queried and the payload is encoded. Connections get the
+#       query time budget of the route's endpoint (api.QueryBudget).
+#
+#       Only requests without a query string are handled. Everything else is
+#       passed to Flask. ApiExceptions raised by the handler (for example
+#       NotFound for an empty table) are answered directly, with the same
+#       payload api.exception_response() would give. Only unexpected errors
+#       are passed to Flask, which then runs the request again and produces
+#       its usual error response.
+#
+#       Handlers are given as {path : function(request) -> (code, payload)},
+#       where 'request' is an api.ArgumentRequest without arguments. See
+#       'fastpath_handlers' in routes.py.
+#
+import time
+import sqlite3
+
+from http                       import HTTPStatus
+from flask                      import g
+from werkzeug.datastructures    import MIMEAccept
+from werkzeug.http              import parse_accept_header
+
+from .                  import encoders, allow_header, count_metric
+from .                  import ArgumentRequest, QueryBudget, timeout_error
+
+
+class FastPath:
+
+    def __init__(self, app, handlers):
+        """Wrap 'app.wsgi_app' and serve 'handlers' ({path : function}) directly."""
+        self.app        = app
+        self.wsgi_app   = app.wsgi_app
+        self.database   = app.config.get('SQLITE3_DATABASE_FILE', 'pmapi.sqlite3')
+        self.request    = ArgumentRequest()
+        self.accepts    = {}
+        rules = {rule.rule : rule for rule in app.url_map.iter_rules()}
+        self.endpoints  = {}
+        for path, handler in handlers.items():
+            if path not in rules or 'GET' not in rules[path].methods:
+                raise ValueError(
+                    "Fast-path '{}' does not match a GET route!".format(path)
+                )
+            headers = {
+                mimetype : [
+                    ('Content-Type',    mimetype),
+                    ('Allow',           allow_header(rules[path])),
+                    ('Vary',            'Accept')
+                ]
+                for mimetype in encoders
+            }
+            self.endpoints[path] = (handler, headers, rules[path].endpoint)
+        self.status = {
+            code.value : "{} {}".format(code.value, code.phrase)
+            for code in HTTPStatus
+        }
+        app.logger.info(
+            "Fast-path dispatch enabled for: {}".format(", ".join(self.endpoints))
+        )
+
+
+    def negotiate(self, accept):
+        """Return encoder mimetype for 'Accept' header value (cached)."""
+        try:
+            return self.accepts[accept]
+        except KeyError:
+            mimetype = parse_accept_header(accept, MIMEAccept).best_match(
+                encoders,
+                default = 'application/json'
+            )
+            if len(self.accepts) > 64:
+                self.accepts.clear()
+            self.accepts[accept] = mimetype
+            return mimetype
+
+
+    def __call__(self, environ, start_response):
+        endpoint = self.endpoints.get(environ.get('PATH_INFO'))
+        if endpoint is None or \
+           environ.get('REQUEST_METHOD') != 'GET' or \
+           environ.get('QUERY_STRING'):
+            return self.wsgi_app(environ, start_response)
+
+        t_real = time.perf_counter()
+        t_cpu  = time.process_time()
+        handler, headers, name = endpoint
+        mimetype = self.negotiate(environ.get('HTTP_ACCEPT'))
+        try:
+            with self.app.app_context():
+                g.t_real_start = t_real
+                g.t_cpu_start  = t_cpu
+                g.db = sqlite3.connect(self.database)
+                try:
+                    g.db.execute("PRAGMA foreign_keys = 1")
+                    g.budget = QueryBudget.install(g.db, name)
+                    code, payload = handler(self.request)
+                except Exception as e:
+                    # ApiExceptions (NotFound, Timeout, ...) are answered
+                    # here, as api.exception_response() would
+                    e = timeout_error(e)
+                    if not getattr(e, 'ApiException', None):
+                        raise
+                    self.app.logger.error(
+                        "ApiException: '{}'".format(str(e))
+                    )
+                    count_metric('fastpath.error')
+                    code, payload = e.code, e.to_dict()
+                finally:
+                    g.db.close()
+                    if hasattr(g, 'cache'):
+                        g.cache.close()
+            payload['api'] = {
+                'version'   : self.app.apiversion,
+                't_cpu'     : time.process_time() - t_cpu,
+                't_real'    : time.perf_counter() - t_real
+            }
+            body = encoders[mimetype](payload)
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+        except Exception:
+            # Unexpected error, let Flask produce the error response
+            count_metric('fastpath.fallback')
+            return self.wsgi_app(environ, start_response)
+
+        count_metric('fastpath.hit')
+        start_response(
+            self.status[code],
+            headers[mimetype] + [('Content-Length', str(len(body)))]
+        )
+        return [body]
+
+
+# EOF
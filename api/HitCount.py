@@ -12,6 +12,23 @@
 #   0.3.0   2018.11.04  Complies with new DataObject pattern.
 #   0.3.1   2018.11.11  Renamed to 'Hitcount' to confuse users less.
 #   0.3.2   2018.11.11  Renamed to 'HitCount'.
+#   0.4.0   2026.10.19  Quantile argument 'q'.
+#   0.5.0   2026.10.19  Grouped aggregates ('group_by'), session comparison.
+#   0.6.0   2026.10.19  Sector, particle class and channel selectors.
+#   0.7.0   2026.10.19  Batched rotation reader, sector reduced spectra.
+#   0.8.0   2026.10.19  Spin-phase (angular) distribution.
+#   0.9.0   2026.10.19  Time-energy spectrogram (binary typed array).
+#   0.10.0  2026.10.19  Spectrogram tiles (api/Tiles.py).
+#   0.11.0  2026.10.19  As-of join with housekeeping and PSU data.
+#   0.12.0  2026.10.19  Latest rows ('n').
+#   0.13.0  2026.10.19  Recent searches served from the hot-tail buffer.
+#   0.13.1  2026.10.19  Request arguments parsed with api.ArgumentSchema.
+#   0.13.2  2026.10.19  Optional rowid bounds in .query() (sharded exports).
+#   0.13.3  2026.10.19  'group_by' validated by DataObject.parse_arguments().
+#   0.13.4  2026.10.19  Malformed counter selectors rejected before range expansion.
+#   0.13.5  2026.10.19  Columnar as-of payload (.asof_columns()).
+#   0.13.6  2026.10.19  Spectrogram range limited to the requested 'end'.
+#   0.13.7  2026.10.19  As-of join no longer selects 'timestamp' twice.
 #
 #
 #   Hit counter values for energy and type classified (by PATE).
@@ -39,14 +56,86 @@
 #   The default setting for SQLITE_MAX_COLUMN is 2000.
 #   (https://www.sqlite.org/limits.html)
 #
+#   Counter selectors
+#
+#       Instead of listing counter names in 'fields', clients may select
+#       counters with 'sector', 'class' and 'channel' arguments. Each accepts
+#       a comma separated list and 'sector' and 'channel' also ranges:
+#
+#           sector=5&class=proton           All proton channels of sector 5
+#           class=electron&channel=3        Electron channel 3, all sectors
+#           sector=1-36&class=proton,electron&channel=1-4
+#
+#       Sectors are numbered 0 (sun-pointing) ... 36, channels from 1.
+#       Omitted selector means "all". Selected counters are added to those
+#       listed in 'fields' (if any).
+#
+#       Counter columns are mapped positionally; hitcount table columns,
+#       excluding primary key and 'session_id', are in sector order and
+#       within each sector in the class order listed above. The index from
+#       (sector, class, channel) to column name is built once per process
+#       and resolved selector combinations are cached.
+#
+#   Rotation arrays
+#
+#       HitCount.rotations() reads the requested range in batches of
+#       HITCOUNT_BATCH_ROWS (default 1024) rows into NumPy arrays shaped
+#       (rotations, sectors, channels). Server-side reductions (spectra,
+#       angular distributions, spectrograms) are vectorised over these
+#       batches, so any range is processed in one streamed pass with
+#       bounded memory.
+#
 import json
 import logging
 import sqlite3
+import functools
 
 from flask              import g
 from application        import app
-from .                  import InvalidArgument, NotFound
+from .                  import InvalidArgument, NotFound, InternalError
 from .                  import DataObject
+from .                  import ArgumentSchema, field_list, integer_list, float_list, lowercase
+
+
+#
+# Counter layout of each rotation
+#
+SECTORS  = 37
+CLASSES  = (
+    ('proton',   12),
+    ('electron',  8),
+    ('ac',        1),
+    ('dx',        4),
+    ('trash',     2)
+)
+COUNTERS = sum(n for _, n in CLASSES)
+# Sectors 1 ... 36 rotate, sector 0 is the sun-pointing telescope
+SPINNING = tuple(range(1, SECTORS))
+
+
+def parse_integers(value, lo, hi, name):
+    """Parse a comma separated list of integers and ranges ('1,3,5-7') into a sorted tuple. All values must be within [lo, hi]. Raises InvalidArgument."""
+    def invalid():
+        return InvalidArgument(
+            "Invalid '{}' selector '{}'!".format(name, value),
+            "Values must be integers or ranges ('5-7') within {} ... {}."
+            .format(lo, hi)
+        )
+    result = set()
+    for item in value.split(','):
+        try:
+            if '-' in item:
+                first, last = (int(x) for x in item.split('-', 1))
+            else:
+                first = last = int(item)
+        except ValueError:
+            raise invalid() from None
+        # Bounds are checked before ranges are expanded
+        if not lo <= first <= last <= hi:
+            raise invalid()
+        result.update(range(first, last + 1))
+    return tuple(sorted(result))
+
 
 class HitCount(DataObject):
 
@@ -55,78 +144,117 @@ class HitCount(DataObject):
     args        = {}
     cursor      = None
 
-    accepted_request_arguments = (
-        'fields',
-        'begin',
-        'end',
-        'timestamp',
-        'session_id'
+    argument_schema = ArgumentSchema(
+        ('fields',          field_list),
+        ('begin',           int),
+        ('end',             int),
+        ('timestamp',       int),
+        ('session_id',      int),
+        ('q',               float_list),
+        ('group_by',        str),
+        ('sessions',        integer_list),
+        ('baseline',        int),
+        ('aggregate',       lowercase),
+        ('sector',          str),
+        ('class',           lowercase,  'particle'),
+        ('channel',         str),
+        ('normalize',       lowercase),
+        ('rebin',           int),
+        ('bins',            int),
+        ('resolution',      int),
+        ('level',           int),
+        ('tile',            int),
+        ('housekeeping',    field_list),
+        ('psu',             field_list),
+        ('tolerance',       int),
+        ('n',               int)
     )
-    class DotDict(dict):
-        """dot.notation access to dictionary attributes"""
-        __getattr__ = dict.get
-        __setattr__ = dict.__setitem__
-        __delattr__ = dict.__delitem__
-        def __missing__(self, key):
-            """Return None if non-existing key is accessed"""
-            return None
+
+    # (sector, class, channel) : column name, built once per process
+    counter_index   = None
+    # Counter column names in (sector, class, channel) order
+    counter_columns = None
 
     def __init__(self, request):
         """Parses request arguments."""
         self.cursor = g.db.cursor()
         super().__init__(self.cursor, 'hitcount')
-        try:
-            # build empty arg dictionary
-            self.args = self.DotDict()
-            for var in self.accepted_request_arguments:
-                setattr(self.args, var, None)
-
-            if request.args:
-                # Raise exception for request unsupported arguments
-                for key, _ in request.args.items():
-                    if key not in self.accepted_request_arguments:
-                        raise InvalidArgument(
-                            "Unsupported argument '{}'".format(key)
-                        )
-
-                try:
-                    fields      = request.args.get('fields',        None)
-                    timestamp   = request.args.get('timestamp',     None)
-                    begin       = request.args.get('begin',         None)
-                    end         = request.args.get('end',           None)
-                    session_id  = request.args.get('session_id',    None)
-                except Exception as e:
-                    # Replace with api.ApiException
-                    raise InvalidArgument(
-                        "Argument extraction failed!",
-                        {'arguments' : request.args, 'exception' : str(e)}
-                    ) from None
-
-                # Convert to desired types (or create as None's)
-                self.args.fields     = fields.split(',') if fields     else None
-                self.args.timestamp  = int(timestamp)    if timestamp  else None
-                self.args.begin      = int(begin)        if begin      else None
-                self.args.end        = int(end)          if end        else None
-                self.args.session_id = int(session_id)   if session_id else None
-
-        except InvalidArgument:
-            raise
-        except Exception as e:
-            # Replace with api.ApiException
-            raise InvalidArgument(
-                "Parameter parsing failed!",
-                str(e)
-            ) from None
+        self.parse_arguments(request)
 
         #
-        # Complain if args.fields contains non-existent columns
+        # Counter selectors (resolved names need no validation)
         #
-        if self.missing_columns(self.args.fields):
+        if self.args.sector or self.args.particle or self.args.channel:
+            self.build_counter_index()
+            selected = self.resolve_selectors(
+                self.args.sector,
+                self.args.particle,
+                self.args.channel
+            )
+            if self.args.fields:
+                explicit = set(self.args.fields)
+                self.args.fields += [c for c in selected if c not in explicit]
+            else:
+                self.args.fields = list(selected)
+
+
+    def build_counter_index(self):
+        """Create (sector, class, channel) -> column name index, unless already created by this process."""
+        if HitCount.counter_index is not None:
+            return
+        columns = [
+            col.name for col in self
+            if not col.primarykey and col.name != 'session_id'
+        ]
+        if len(columns) != SECTORS * COUNTERS:
+            raise InternalError(
+                "Unexpected 'hitcount' table layout!",
+                "Expected {} counter columns, found {}."
+                .format(SECTORS * COUNTERS, len(columns))
+            )
+        index = {}
+        names = iter(columns)
+        for sector in range(SECTORS):
+            for particle, channels in CLASSES:
+                for channel in range(1, channels + 1):
+                    index[(sector, particle, channel)] = next(names)
+        HitCount.counter_columns = tuple(columns)
+        HitCount.counter_index   = index
+
+
+    @staticmethod
+    @functools.lru_cache(maxsize = 256)
+    def resolve_selectors(sector, particle, channel):
+        """Return a tuple of counter column names (in table order) matching selector argument strings. Omitted (None) selector matches all. Results are cached."""
+        sectors = parse_integers(sector, 0, SECTORS - 1, 'sector') \
+                  if sector else range(SECTORS)
+        classes = dict(CLASSES)
+        if particle:
+            particles = particle.split(',')
+            unknown = [p for p in particles if p not in classes]
+            if unknown:
+                raise InvalidArgument(
+                    "Unknown particle class(es) '{}'!".format(",".join(unknown)),
+                    "Supported classes are: " + ", ".join(classes)
+                )
+        else:
+            particles = [p for p, _ in CLASSES]
+        channels = parse_integers(channel, 1, max(classes.values()), 'channel') \
+                   if channel else None
+        selected = [
+            HitCount.counter_index[(s, p, c)]
+            for s in sectors
+            for p in (p for p, _ in CLASSES if p in particles)
+            for c in range(1, classes[p] + 1)
+            if channels is None or c in channels
+        ]
+        if not selected:
             raise InvalidArgument(
-                "Non-existent fields defined!",
-                "Field(s) " + ","
-                .join(self.missing_columns(self.args.fields)) + " do not exist!"
+                "Selectors do not match any counters!",
+                "sector='{}', class='{}', channel='{}'"
+                .format(sector, particle, channel)
             )
+        return tuple(selected)
 
 
     def query(self, aggregate=None):
@@ -157,6 +285,8 @@ class HitCount(DataObject):
             #
             columnlist = []
             if aggregate:
+                if self.args.group_by:
+                    columnlist.append(self.args.group_by)
                 for col in cols:
                     if not col.primarykey:
                         if col.datatype in ('INTEGER', 'REAL'):
@@ -195,9 +325,25 @@ class HitCount(DataObject):
                     )
                 if self.args.session_id:
                     conditions.append("session_id = :session_id")
+            if self.rowid_range:
+                conditions.append(self.rowid_condition())
             if conditions:
                 self.sql += " WHERE " + " AND ".join(conditions)
 
+            #
+            # Grouped aggregate (one pass, one result row per group)
+            #
+            if self.args.group_by:
+                if not aggregate:
+                    raise InvalidArgument(
+                        "Argument 'group_by' requires an aggregate function!"
+                    )
+                self.sql += " GROUP BY {0} ORDER BY {0}".format(
+                    self.args.group_by
+                )
+
+        except InvalidArgument:
+            raise
         except:
             app.logger.exception("Query preparations failed!")
             raise
@@ -221,24 +367,32 @@ class HitCount(DataObject):
 
     def get(self, aggregate=None):
         """Handle Fetch and Search requests."""
-        cursor = self.query(aggregate)
-
         #
-        # Convert to dict or list of dicts
+        # Search within the recent rows is served from memory
         #
-        if self.args.timestamp or aggregate:
-            # Fetch request - return object
-            result = cursor.fetchall()
-            if len(result) < 1:
-                raise NotFound(
-                    "Pulseheight record not found!",
-                    "Provided timestamp '{}' does not match any in the database"
-                    .format(self.args.timestamp)
-                )
-            data = dict(zip([c[0] for c in cursor.description], result[0]))
-        else:
-            # Search request - return a list of objects
-            data = [dict(zip([key[0] for key in cursor.description], row)) for row in cursor]
+        data = None if aggregate else self.search_hot_tail()
+        if data is None:
+            cursor = self.query(aggregate)
+
+            #
+            # Convert to dict or list of dicts
+            #
+            if aggregate and self.args.group_by:
+                # Grouped aggregate - return a list of objects, one per group
+                data = [dict(zip([key[0] for key in cursor.description], row)) for row in cursor]
+            elif self.args.timestamp or aggregate:
+                # Fetch request - return object
+                result = cursor.fetchall()
+                if len(result) < 1:
+                    raise NotFound(
+                        "Pulseheight record not found!",
+                        "Provided timestamp '{}' does not match any in the database"
+                        .format(self.args.timestamp)
+                    )
+                data = dict(zip([c[0] for c in cursor.description], result[0]))
+            else:
+                # Search request - return a list of objects
+                data = [dict(zip([key[0] for key in cursor.description], row)) for row in cursor]
 
         #
         # Return as tuple
@@ -261,4 +415,457 @@ class HitCount(DataObject):
 
 
 
+    def selected_sectors(self, default = SPINNING):
+        """Return a tuple of sector numbers selected by 'sector' argument, or 'default'."""
+        if self.args.sector:
+            return parse_integers(self.args.sector, 0, SECTORS - 1, 'sector')
+        return tuple(default)
+
+
+    def selected_channels(self):
+        """Return a list of (class, channel, index) tuples selected by 'class' and 'channel' arguments (all, if not specified). Index is the counter's position (0 ... 26) within a sector."""
+        particles = self.args.particle.split(',') if self.args.particle else None
+        channels  = parse_integers(
+                        self.args.channel, 1, max(dict(CLASSES).values()), 'channel'
+                    ) \
+                    if self.args.channel else None
+        selected  = []
+        index     = 0
+        for particle, count in CLASSES:
+            for channel in range(1, count + 1):
+                if (particles is None or particle in particles) and \
+                   (channels is None or channel in channels):
+                    selected.append((particle, channel, index))
+                index += 1
+        if not selected:
+            raise InvalidArgument(
+                "Selectors do not match any counters!",
+                "class='{}', channel='{}'"
+                .format(self.args.particle, self.args.channel)
+            )
+        return selected
+
+
+    def rotations(self, sectors, channels, batch = None):
+        """Generator that yields (timestamps, counts) NumPy array tuples for the requested range, in timestamp order. 'counts' is shaped (rotations, len(sectors), len(channels)), where 'channels' are counter indices (0 ... 26) within a sector. NULL counters become NaN."""
+        import numpy
+        self.build_counter_index()
+        batch = batch or int(app.config.get('HITCOUNT_BATCH_ROWS', 1024))
+        columns = [
+            self.counter_columns[sector * COUNTERS + channel]
+            for sector in sectors
+            for channel in channels
+        ]
+        self.sql = "SELECT {} AS timestamp, {} FROM hitcount".format(
+            self.where_condition('timestamp'),
+            ", ".join(columns)
+        )
+        conditions = self.search_conditions()
+        if conditions:
+            self.sql += " WHERE " + " AND ".join(conditions)
+        self.sql += " ORDER BY timestamp"
+        try:
+            self.cursor.execute(self.sql, self.args)
+        except:
+            app.logger.exception(
+                "Query failure! SQL='{}', args='{}'"
+                .format(self.sql, self.args)
+            )
+            raise
+        while True:
+            rows = self.cursor.fetchmany(batch)
+            if not rows:
+                break
+            a = numpy.array(rows, dtype = float)
+            yield (
+                a[:, 0].astype(numpy.int64),
+                a[:, 1:].reshape(len(rows), len(sectors), len(channels))
+            )
+
+
+    def spectrum(self):
+        """Per-rotation energy spectra, reduced over selected sectors ('sector', default: spinning sectors 1 ... 36) with 'aggregate' function 'sum' (default) or 'avg'. Channels are selected with 'class' and 'channel' arguments (default: all 27 counters). NULL counters are ignored."""
+        import numpy
+        import warnings
+        function = self.args.aggregate or 'sum'
+        if function not in ('sum', 'avg'):
+            raise InvalidArgument(
+                "Unsupported aggregate function '{}'!".format(function),
+                "Spectra can be reduced with 'sum' or 'avg'."
+            )
+        reduce   = numpy.nansum if function == 'sum' else numpy.nanmean
+        sectors  = self.selected_sectors()
+        channels = self.selected_channels()
+
+        timestamps = []
+        spectra    = []
+        with warnings.catch_warnings():
+            # nanmean() of all-NULL sector set is NaN (and a RuntimeWarning)
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for ts, counts in self.rotations(sectors, [c[2] for c in channels]):
+                timestamps.append(ts)
+                spectra.append(reduce(counts, axis = 1))
+        if spectra:
+            spectra = numpy.concatenate(spectra)
+            timestamps = numpy.concatenate(timestamps).tolist()
+        else:
+            spectra = numpy.empty((0, len(channels)))
+
+        data = {
+            "aggregate" : function,
+            "sectors"   : list(sectors),
+            "channels"  : [[c[0], c[1]] for c in channels],
+            "timestamp" : timestamps,
+            "spectra"   : [
+                [None if numpy.isnan(v) else v for v in row]
+                for row in spectra.tolist()
+            ]
+        }
+        self.args.pop('fields', None)
+        if app.config.get("DEBUG", False):
+            return (
+                200,
+                {
+                    "data"          : data,
+                    "query" : {
+                        "sql"       : self.sql,
+                        "variables" : self.args
+                    }
+                }
+            )
+        else:
+            return (200, {"data": data})
+
+
+
+    def distribution(self):
+        """Spin-phase (angular) distribution of counts over the requested range. Counts of each spinning sector (1 ... 36, 10 degree spin phases) are accumulated per channel ('class' and 'channel' selectors, default: all) into a (36 / rebin) x channels matrix.
+
+        'rebin' combines adjacent sectors (must divide 36; 2 gives 20 degree bins, etc.).
+        'normalize' is one of:
+            none        Accumulated counts (default)
+            rotation    Mean counts per rotation
+            channel     Each channel (column) sums to 1.0
+            total       Whole matrix sums to 1.0
+
+        Accumulation over time is a plain sum, which SQLite does in one scan without creating a Python object per counter. Reshaping, rebinning and normalisation are then done with NumPy."""
+        import numpy
+        normalize = self.args.normalize or 'none'
+        if normalize not in ('none', 'rotation', 'channel', 'total'):
+            raise InvalidArgument(
+                "Unsupported normalization '{}'!".format(normalize),
+                "Supported normalizations are: none, rotation, channel, total"
+            )
+        rebin = self.args.rebin or 1
+        if rebin < 1 or len(SPINNING) % rebin:
+            raise InvalidArgument(
+                "Invalid 'rebin' value '{}'!".format(rebin),
+                "Value must divide {} (sectors) evenly.".format(len(SPINNING))
+            )
+        if self.args.sector:
+            raise InvalidArgument(
+                "Argument 'sector' is not supported for distributions!",
+                "Distribution always covers all spinning sectors."
+            )
+        self.build_counter_index()
+        channels = self.selected_channels()
+
+        self.sql = "SELECT count(*), " + ", ".join(
+            "sum({})".format(self.counter_columns[sector * COUNTERS + c[2]])
+            for sector in SPINNING
+            for c in channels
+        )
+        self.sql += " FROM hitcount"
+        conditions = self.search_conditions()
+        if conditions:
+            self.sql += " WHERE " + " AND ".join(conditions)
+        try:
+            self.cursor.execute(self.sql, self.args)
+            row = self.cursor.fetchone()
+        except:
+            app.logger.exception(
+                "Query failure! SQL='{}', args='{}'"
+                .format(self.sql, self.args)
+            )
+            raise
+
+        rotations = row[0]
+        matrix = numpy.array(row[1:], dtype = float).reshape(
+            len(SPINNING), len(channels)
+        )
+        matrix = numpy.nan_to_num(matrix)
+        if rebin > 1:
+            matrix = matrix.reshape(-1, rebin, len(channels)).sum(axis = 1)
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            if normalize == 'rotation':
+                matrix = matrix / rotations
+            elif normalize == 'channel':
+                matrix = matrix / matrix.sum(axis = 0)
+            elif normalize == 'total':
+                matrix = matrix / matrix.sum()
+        matrix[~numpy.isfinite(matrix)] = numpy.nan
+
+        data = {
+            "rotations"     : rotations,
+            "normalize"     : normalize,
+            "rebin"         : rebin,
+            "phase"         : list(range(0, 360, 10 * rebin)),
+            "channels"      : [[c[0], c[1]] for c in channels],
+            "distribution"  : [
+                [None if numpy.isnan(v) else v for v in r]
+                for r in matrix.tolist()
+            ]
+        }
+        self.args.pop('fields', None)
+        if app.config.get("DEBUG", False):
+            return (
+                200,
+                {
+                    "data"          : data,
+                    "query" : {
+                        "sql"       : self.sql,
+                        "variables" : self.args
+                    }
+                }
+            )
+        else:
+            return (200, {"data": data})
+
+
+
+    def accumulate(self, begin, resolution, bins, sectors, channels, function = 'sum', end = None):
+        """Accumulate sector-reduced spectra into time bins. Time bin 'i' covers timestamps begin + i * resolution ... begin + (i + 1) * resolution - 1. If 'end' is given, rotations after it are not read and the last bin may be partial. Sectors are reduced with 'function' ('sum' or 'avg'). Sets self.args.begin and self.args.end to the covered range.
+
+        Returns (sums, rotations):tuple of NumPy arrays, shaped (bins, len(channels)) and (bins,)."""
+        import numpy
+        import warnings
+        reduce = numpy.nansum if function == 'sum' else numpy.nanmean
+        self.args.timestamp = None
+        self.args.begin     = begin
+        self.args.end       = begin + bins * resolution - 1
+        if end is not None:
+            self.args.end   = min(end, self.args.end)
+        sums      = numpy.zeros((bins, len(channels)))
+        rotations = numpy.zeros(bins, dtype = numpy.int64)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for ts, counts in self.rotations(sectors, [c[2] for c in channels]):
+                index = (ts - begin) // resolution
+                spectra = numpy.nan_to_num(reduce(counts, axis = 1))
+                numpy.add.at(sums, index, spectra)
+                rotations += numpy.bincount(index, minlength = bins)
+        return sums, rotations
+
+
+    def spectrogram(self):
+        """Time-energy spectrogram; mean sector-reduced counts per rotation, for each time bin and channel. Sectors are selected with 'sector' (default: spinning sectors 1 ... 36) and reduced with 'aggregate' ('sum' (default) or 'avg'). Channels are selected with 'class' and 'channel'. Time bins are defined by 'resolution' (seconds) or by their number ('bins', default: 512) over the requested range ('begin', 'end'; default: all data). Rotations after 'end' are not included, so the last bin may be partial.
+
+        Returns (header:dict, matrix:numpy.ndarray):tuple for api.binary_response(). Matrix is shaped (bins, channels); bins without rotations are NaN."""
+        import numpy
+        function = self.args.aggregate or 'sum'
+        if function not in ('sum', 'avg'):
+            raise InvalidArgument(
+                "Unsupported aggregate function '{}'!".format(function),
+                "Sectors can be reduced with 'sum' or 'avg'."
+            )
+        sectors  = self.selected_sectors()
+        channels = self.selected_channels()
+
+        oldest, newest = self.timestamp_range()
+        begin = self.args.begin or oldest
+        end   = self.args.end   or newest
+        if begin is None or end is None or end < begin:
+            raise NotFound(
+                "No data in the requested range!",
+                "begin='{}', end='{}'".format(begin, end)
+            )
+        span = end - begin + 1
+        if self.args.resolution:
+            resolution = self.args.resolution
+            bins = -(-span // resolution)
+        else:
+            bins = self.args.bins or 512
+            resolution = -(-span // bins)
+            bins = -(-span // resolution)
+        max_bins = int(app.config.get('SPECTROGRAM_MAX_BINS', 10000))
+        if resolution < 1 or bins < 1 or bins > max_bins:
+            raise InvalidArgument(
+                "Invalid spectrogram time binning!",
+                "Resolution must be at least 1 second and number of bins between 1 and {}."
+                .format(max_bins)
+            )
+
+        sums, rotations = self.accumulate(
+            begin, resolution, bins, sectors, channels, function, end
+        )
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            matrix = sums / rotations[:, None]
+
+        header = {
+            "axes"          : ["time", "channel"],
+            "begin"         : begin,
+            "end"           : end,
+            "resolution"    : resolution,
+            "bins"          : bins,
+            "rotations"     : int(rotations.sum()),
+            "aggregate"     : function,
+            "sectors"       : list(sectors),
+            "channels"      : [[c[0], c[1]] for c in channels],
+            "value"         : "mean counts per rotation"
+        }
+        return header, matrix
+
+
+    def tile(self):
+        """Spectrogram tile from the multi-resolution tile pyramid (api/Tiles.py). Tile is identified by 'level' (time resolution is 2**level seconds) and 'tile' (index from the epoch). Channels are selected with 'class' and 'channel'; counts are summed over the spinning sectors and all sessions.
+
+        Returns (header:dict, matrix:numpy.ndarray):tuple for api.binary_response(). Matrix is shaped (bins, channels); bins without rotations are NaN."""
+        import numpy
+        from .Tiles import SpectrogramTiles
+        for arg in ('begin', 'end', 'timestamp', 'session_id', 'sector'):
+            if self.args[arg] is not None:
+                raise InvalidArgument(
+                    "Argument '{}' is not supported for tiles!".format(arg),
+                    "Tiles cover fixed time ranges, all sessions and the spinning sectors."
+                )
+        tiles = SpectrogramTiles(self, COUNTERS)
+        if self.args.level is None or self.args.tile is None or \
+           not tiles.base_level <= self.args.level <= tiles.max_level:
+            raise InvalidArgument(
+                "Arguments 'level' and 'tile' are required!",
+                "Level must be between {} and {}."
+                .format(tiles.base_level, tiles.max_level)
+            )
+        channels = self.selected_channels()
+        rotations, sums = tiles.tile(self.args.level, self.args.tile)
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            matrix = sums[:, [c[2] for c in channels]] / rotations[:, None]
+
+        begin, end = tiles.span(self.args.level, self.args.tile)
+        header = {
+            "axes"          : ["time", "channel"],
+            "level"         : self.args.level,
+            "tile"          : self.args.tile,
+            "begin"         : begin,
+            "end"           : end,
+            "resolution"    : 2 ** self.args.level,
+            "bins"          : tiles.bins,
+            "rotations"     : int(rotations.sum()),
+            "aggregate"     : "sum",
+            "sectors"       : list(SPINNING),
+            "channels"      : [[c[0], c[1]] for c in channels],
+            "value"         : "mean counts per rotation"
+        }
+        return header, matrix
+
+
+
+    def asof(self):
+        """As-of join; each hit counter rotation in the requested range with the latest preceding housekeeping row and PSU reading. Housekeeping and PSU columns are selected with 'housekeeping' and 'psu' arguments (default: all) and matches older than 'tolerance' seconds are left empty. Rotations and both joined tables are read once, in time order (api/AsOf.py).
+
+        Returns (columns:list, rows:generator) tuple. Joined columns are prefixed with 'housekeeping.' and 'psu.'."""
+        import numpy
+        from .AsOf import AsOfSeries
+        batch = int(app.config.get('HITCOUNT_BATCH_ROWS', 1024))
+
+        def joined_columns(table, requested, exclude):
+            do = DataObject(self.cursor, table)
+            if do.missing_columns(requested):
+                raise InvalidArgument(
+                    "Non-existent {} fields defined!".format(table),
+                    "Field(s) " + ",".join(do.missing_columns(requested)) + " do not exist!"
+                )
+            return do.get_column_names(
+                include = requested or [],
+                exclude = exclude,
+                include_primarykeys = False
+            )
+        housekeeping = joined_columns(
+            'housekeeping', self.args.housekeeping, ['timestamp', 'session_id']
+        )
+        psu = joined_columns('psu', self.args.psu, ['id', 'modified'])
+
+        cols = self.get_column_objects(
+            include = self.args.fields or [],
+            exclude = ['timestamp', 'session_id'],
+            include_primarykeys = False
+        )
+        self.sql = "SELECT {} AS timestamp, session_id{} FROM hitcount".format(
+            self.where_condition('timestamp'),
+            "".join(", " + self.select_typecast(col) for col in cols)
+        )
+        conditions = self.search_conditions()
+        if conditions:
+            self.sql += " WHERE " + " AND ".join(conditions)
+        self.sql += " ORDER BY hitcount.timestamp"
+
+        if self.args.timestamp:
+            begin = end = self.args.timestamp
+        else:
+            begin, end = self.args.begin, self.args.end
+        series = (
+            AsOfSeries(
+                self.cursor, 'housekeeping', 'timestamp', housekeeping,
+                begin, end, self.args.tolerance, batch
+            ),
+            AsOfSeries(
+                self.cursor, 'psu', 'modified', psu,
+                begin, end, self.args.tolerance, batch
+            )
+        )
+        try:
+            self.cursor.execute(self.sql, self.args)
+        except:
+            app.logger.exception(
+                "Query failure! SQL='{}', args='{}'"
+                .format(self.sql, self.args)
+            )
+            raise
+
+        columns = [d[0] for d in self.cursor.description] + \
+                  ['housekeeping.timestamp'] + \
+                  ['housekeeping.' + c for c in housekeeping] + \
+                  ['psu.modified'] + \
+                  ['psu.' + c for c in psu]
+
+        if len(set(columns)) != len(columns):
+            raise InternalError(
+                "Duplicate as-of column names!",
+                ",".join(columns)
+            )
+
+        def rows(cursor):
+            while True:
+                rotations = cursor.fetchmany(batch)
+                if not rotations:
+                    break
+                timestamps = numpy.array(
+                    [r[0] for r in rotations], dtype = numpy.int64
+                )
+                for rotation, hk, supply in zip(
+                    rotations,
+                    series[0].lookup(timestamps),
+                    series[1].lookup(timestamps)
+                ):
+                    yield rotation + tuple(hk) + tuple(supply)
+
+        return columns, rows(self.cursor)
+
+
+    def asof_columns(self):
+        """As-of join (.asof()) as columnar data. Returns (code:int, payload:dict):tuple with payload {"data" : {<column> : [<value>, ...], ...}}."""
+        columns, rows = self.asof()
+        values = [[] for _ in columns]
+        for row in rows:
+            if len(row) != len(values):
+                raise InternalError(
+                    "As-of row does not match its columns!",
+                    "{} values for {} columns".format(len(row), len(values))
+                )
+            for i, value in enumerate(row):
+                values[i].append(value)
+        return (200, {"data" : dict(zip(columns, values))})
+
+
+
 # EOF
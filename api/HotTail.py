@@ -0,0 +1,181 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# In-memory buffer of the most recent time-series rows
+#
+# HotTail.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#
+#
+#   HotTail
+#
+#       Per-process buffer of the newest HOT_TAIL_ROWS (default 256) rows of
+#       each table listed in HOT_TAIL_TABLES (default: hitcount, housekeeping
+#       and pulseheight). Rows are kept sorted by timestamp, with all columns
+#       (TIMESTAMP columns as Unix timestamps, as DataObject queries return
+#       them).
+#
+#       Buffer is loaded with the newest rows (descending timestamp index
+#       seek) and then refreshed by rowid deltas; when the table's largest
+#       rowid has changed, only rows above the previously seen rowid are
+#       read. The oldest rows are evicted as new rows arrive.
+#
+#       'window' is the timestamp from which on every row of the table is in
+#       the buffer. Search requests whose 'begin' is at or after it are
+#       answered from memory. Rows inserted late with a timestamp before the
+#       window are not buffered (they are outside of it). Tables are expected
+#       to be append-only; modified rows are not detected and a shrinking
+#       table reloads the buffer.
+#
+#       Hits and misses are counted in api.metrics as
+#       'hot_tail.<table>.hit' and 'hot_tail.<table>.miss'.
+#
+import bisect
+import threading
+
+from application        import app
+from .                  import count_metric, metrics_snapshot
+
+
+class HotTail:
+
+    # {table : HotTail}
+    buffers      = {}
+    buffers_lock = threading.Lock()
+
+    def __init__(self, table, size):
+        self.table   = table
+        self.size    = size
+        self.lock    = threading.Lock()
+        self.columns = None
+        self.times   = []
+        self.rows    = []
+        self.mark    = None
+        self.window  = None
+
+
+    @classmethod
+    def enabled(cls, table):
+        return int(app.config.get('HOT_TAIL_ROWS', 256)) > 0 and \
+               table in app.config.get(
+                   'HOT_TAIL_TABLES',
+                   ('hitcount', 'housekeeping', 'pulseheight')
+               )
+
+
+    @classmethod
+    def of(cls, dataobject):
+        """Return refreshed buffer for the table of 'dataobject'."""
+        with cls.buffers_lock:
+            tail = cls.buffers.get(dataobject.table)
+            if tail is None:
+                tail = cls(
+                    dataobject.table,
+                    int(app.config.get('HOT_TAIL_ROWS', 256))
+                )
+                cls.buffers[dataobject.table] = tail
+        tail.refresh(dataobject)
+        return tail
+
+
+    def refresh(self, dataobject):
+        """Bring buffer up to date with the table (data version)."""
+        version = dataobject.data_version()
+        if version == self.mark:
+            return
+        cursor = dataobject.cursor.connection.cursor()
+        select = ", ".join(dataobject.select_typecast(col) for col in dataobject)
+        with self.lock:
+            if self.mark is None or version < self.mark or \
+               self.columns != dataobject.columns:
+                # (Re)load newest rows
+                cursor.execute(
+                    "SELECT {} FROM {} ORDER BY timestamp DESC LIMIT ?"
+                    .format(select, self.table),
+                    (self.size,)
+                )
+                self.columns = [d[0] for d in cursor.description]
+                ts = self.columns.index('timestamp')
+                self.rows    = cursor.fetchall()[::-1]
+                self.times   = [row[ts] for row in self.rows]
+                if len(self.rows) < self.size:
+                    # Whole table is buffered
+                    self.window = 0
+                else:
+                    self.window = self.times[0]
+            else:
+                # Rows added since the last refresh
+                cursor.execute(
+                    "SELECT {} FROM {} WHERE rowid > ? AND rowid <= ?"
+                    .format(select, self.table),
+                    (self.mark, version)
+                )
+                ts = self.columns.index('timestamp')
+                for row in cursor:
+                    if row[ts] is None or row[ts] < self.window:
+                        continue
+                    i = bisect.bisect_right(self.times, row[ts])
+                    if i and self.times[i - 1] == row[ts]:
+                        # Already buffered (loaded after the version read)
+                        continue
+                    self.times.insert(i, row[ts])
+                    self.rows.insert(i, row)
+                excess = len(self.rows) - self.size
+                if excess > 0:
+                    self.window = self.times[excess - 1] + 1
+                    del self.times[:excess]
+                    del self.rows[:excess]
+            self.mark = version
+        cursor.close()
+
+
+    def search(self, dataobject):
+        """Return search result (list of dicts) for the request arguments of 'dataobject', or None if 'begin' is outside of the buffered window."""
+        args = dataobject.args
+        with self.lock:
+            if self.window is None or args.begin < self.window:
+                count_metric('hot_tail.{}.miss'.format(self.table))
+                return None
+            lo = bisect.bisect_left(self.times, args.begin)
+            hi = bisect.bisect_right(self.times, args.end) \
+                 if args.end is not None else len(self.times)
+            rows    = self.rows[lo:hi]
+            columns = self.columns
+        count_metric('hot_tail.{}.hit'.format(self.table))
+        names = dataobject.get_column_names(
+            include = args.fields or [],
+            exclude = ['session_id']
+        )
+        index = [columns.index(name) for name in names]
+        if args.session_id:
+            session = columns.index('session_id')
+            rows = [row for row in rows if row[session] == args.session_id]
+        return [dict(zip(names, [row[i] for i in index])) for row in rows]
+
+
+    @classmethod
+    def status(cls):
+        """Buffer sizes, windows and hit rates by table."""
+        counters = metrics_snapshot()
+        result = {}
+        with cls.buffers_lock:
+            buffers = list(cls.buffers.values())
+        for tail in buffers:
+            hits   = counters.get('hot_tail.{}.hit'.format(tail.table), 0)
+            misses = counters.get('hot_tail.{}.miss'.format(tail.table), 0)
+            result[tail.table] = {
+                "rows"      : len(tail.rows),
+                "size"      : tail.size,
+                "window"    : tail.window,
+                "mark"      : tail.mark,
+                "hits"      : hits,
+                "misses"    : misses,
+                "hit_rate"  : hits / (hits + misses) if hits + misses else None
+            }
+        return result
+
+
+# EOF
@@ -8,6 +8,13 @@
 # Housekeeping.py - Jani Tammi <jasata@utu.fi>
 #
 #   0.1.0   2018.11.05  Initial version.
+#   0.2.0   2026.10.19  Quantile argument 'q'.
+#   0.3.0   2026.10.19  Grouped aggregates ('group_by'), session comparison.
+#   0.4.0   2026.10.19  Latest rows ('n').
+#   0.5.0   2026.10.19  Recent searches served from the hot-tail buffer.
+#   0.5.1   2026.10.19  Request arguments parsed with api.ArgumentSchema.
+#   0.5.2   2026.10.19  Optional rowid bounds in .query() (sharded exports).
+#   0.5.3   2026.10.19  'group_by' validated by DataObject.parse_arguments().
 #
 #
 #   Housekeeping data is still unspecified. TBA.
@@ -21,6 +28,7 @@ from flask              import g
 from application        import app
 from .                  import InvalidArgument, NotFound
 from .                  import DataObject
+from .                  import ArgumentSchema, field_list, integer_list, float_list, lowercase
 
 class Housekeeping(DataObject):
 
@@ -29,79 +37,25 @@ class Housekeeping(DataObject):
     args        = {}
     cursor      = None
 
-    accepted_request_arguments = (
-        'fields',
-        'begin',
-        'end',
-        'timestamp',
-        'session_id'
+    argument_schema = ArgumentSchema(
+        ('fields',      field_list),
+        ('begin',       int),
+        ('end',         int),
+        ('timestamp',   int),
+        ('session_id',  int),
+        ('q',           float_list),
+        ('group_by',    str),
+        ('sessions',    integer_list),
+        ('baseline',    int),
+        ('aggregate',   lowercase),
+        ('n',           int)
     )
 
-    class DotDict(dict):
-        """dot.notation access to dictionary attributes"""
-        __getattr__ = dict.get
-        __setattr__ = dict.__setitem__
-        __delattr__ = dict.__delitem__
-        def __missing__(self, key):
-            """Return None if non-existing key is accessed"""
-            return None
-
     def __init__(self, request):
         """Parses request arguments."""
         self.cursor = g.db.cursor()
         super().__init__(self.cursor, 'housekeeping')
-        try:
-            # build empty arg dictionary
-            self.args = self.DotDict()
-            for var in self.accepted_request_arguments:
-                setattr(self.args, var, None)
-
-            if request.args:
-                # Raise exception for request unsupported arguments
-                for key, _ in request.args.items():
-                    if key not in self.accepted_request_arguments:
-                        raise InvalidArgument(
-                            "Unsupported argument '{}'".format(key)
-                        )
-
-                try:
-                    fields      = request.args.get('fields',        None)
-                    timestamp   = request.args.get('timestamp',     None)
-                    begin       = request.args.get('begin',         None)
-                    end         = request.args.get('end',           None)
-                    session_id  = request.args.get('session_id',    None)
-                except Exception as e:
-                    # Replace with api.ApiException
-                    raise InvalidArgument(
-                        "Argument extraction failed!",
-                        {'arguments' : request.args, 'exception' : str(e)}
-                    ) from None
-
-                # Convert to desired types (or create as None's)
-                self.args.fields     = fields.split(',') if fields     else None
-                self.args.timestamp  = int(timestamp)    if timestamp  else None
-                self.args.begin      = int(begin)        if begin      else None
-                self.args.end        = int(end)          if end        else None
-                self.args.session_id = int(session_id)   if session_id else None
-
-        except InvalidArgument:
-            raise
-        except Exception as e:
-            # Replace with api.ApiException
-            raise InvalidArgument(
-                "Parameter parsing failed!",
-                str(e)
-            ) from None
-
-        #
-        # Complain if args.fields contains non-existent columns
-        #
-        if self.missing_columns(self.args.fields):
-            raise InvalidArgument(
-                "Non-existent fields defined!",
-                "Field(s) " + ","
-                .join(self.missing_columns(self.args.fields)) + " do not exist!"
-            )
+        self.parse_arguments(request)
 
 
     def query(self, aggregate=None):
@@ -132,6 +86,8 @@ class Housekeeping(DataObject):
             #
             columnlist = []
             if aggregate:
+                if self.args.group_by:
+                    columnlist.append(self.args.group_by)
                 for col in cols:
                     if not col.primarykey:
                         if col.datatype in ('INTEGER', 'REAL'):
@@ -170,9 +126,25 @@ class Housekeeping(DataObject):
                     )
                 if self.args.session_id:
                     conditions.append("session_id = :session_id")
+            if self.rowid_range:
+                conditions.append(self.rowid_condition())
             if conditions:
                 self.sql += " WHERE " + " AND ".join(conditions)
 
+            #
+            # Grouped aggregate (one pass, one result row per group)
+            #
+            if self.args.group_by:
+                if not aggregate:
+                    raise InvalidArgument(
+                        "Argument 'group_by' requires an aggregate function!"
+                    )
+                self.sql += " GROUP BY {0} ORDER BY {0}".format(
+                    self.args.group_by
+                )
+
+        except InvalidArgument:
+            raise
         except:
             app.logger.exception("Query preparations failed!")
             raise
@@ -196,24 +168,32 @@ class Housekeeping(DataObject):
 
     def get(self, aggregate=None):
         """Handle Fetch and Search requests."""
-        cursor = self.query(aggregate)
-
         #
-        # Convert to dict or list of dicts
+        # Search within the recent rows is served from memory
         #
-        if self.args.timestamp or aggregate:
-            # Fetch request - return object
-            result = cursor.fetchall()
-            if len(result) < 1:
-                raise NotFound(
-                    "Pulseheight record not found!",
-                    "Provided timestamp '{}' does not match any in the database"
-                    .format(self.args.timestamp)
-                )
-            data = dict(zip([c[0] for c in cursor.description], result[0]))
-        else:
-            # Search request - return a list of objects
-            data = [dict(zip([key[0] for key in cursor.description], row)) for row in cursor]
+        data = None if aggregate else self.search_hot_tail()
+        if data is None:
+            cursor = self.query(aggregate)
+
+            #
+            # Convert to dict or list of dicts
+            #
+            if aggregate and self.args.group_by:
+                # Grouped aggregate - return a list of objects, one per group
+                data = [dict(zip([key[0] for key in cursor.description], row)) for row in cursor]
+            elif self.args.timestamp or aggregate:
+                # Fetch request - return object
+                result = cursor.fetchall()
+                if len(result) < 1:
+                    raise NotFound(
+                        "Pulseheight record not found!",
+                        "Provided timestamp '{}' does not match any in the database"
+                        .format(self.args.timestamp)
+                    )
+                data = dict(zip([c[0] for c in cursor.description], result[0]))
+            else:
+                # Search request - return a list of objects
+                data = [dict(zip([key[0] for key in cursor.description], row)) for row in cursor]
 
         #
         # Return as tuple
@@ -8,6 +8,7 @@
 # PSU.py - Jani Tammi <jasata@utu.fi>
 #
 #   0.1.0   2018.11.08  Initial version.
+#   0.1.1   2026.10.19  Request arguments parsed with api.ArgumentSchema.
 #
 #   Accepts two request parameters (request.args):
 #   begin       Timestamp
@@ -29,7 +30,7 @@ import sqlite3
 from flask          import g, request
 from application    import app
 from .              import InvalidArgument, NotFound
-from .              import DataObject
+from .              import DataObject, ArgumentSchema
 
 
 # TODO 
@@ -46,42 +47,22 @@ class Note(DataObject):
     # Request payload
     payload_json    = None
 
+    argument_schema = ArgumentSchema(
+        ('begin',       int),
+        ('end',         int),
+        ('session_id',  int)
+    )
+
     def __init__(self, request):
         """Parse request parameters and initialize object. Primary key field 'timestamp' is not accepted as request parameter. It is expected to be provided as URI parameter and extracted by Flask framework. See member function .fetch() for example handler."""
         self.cursor = g.db.cursor()
         super().__init__(self.cursor, 'note')
-        try:
-            if request.args:
-                # Check that all args supported
-                for k, v in request.args.items():
-                    if k not in ('begin', 'end', 'session_id'):
-                        raise InvalidArgument(
-                            "Unsupported argument '{}'".format(k)
-                        )
-                # Extract values
-                try:
-                    begin       = request.args.get('begin',         None)
-                    end         = request.args.get('end',           None)
-                    session_id  = request.args.get('session_id',    None)
-                except Exception as e:
-                    raise InvalidArgument(
-                        "Argument parsing error",
-                        {'arguments' : request.args, 'exception' : str(e)}
-                    )
-
-                # Convert to desired types
-                self.begin      = int(begin)        if begin        else None
-                self.end        = int(end)          if end          else None
-                self.session_id = int(session_id)   if session_id   else None
-
-            # request JSON payload, if any (for POST method .create() calls)
-            self.payload_json = request.json
-
-        except Exception as e:
-            raise InvalidArgument(
-                "Parameter extraction failed!",
-                str(e)
-            )
+        self.parse_arguments(request)
+        self.begin      = self.args.begin
+        self.end        = self.args.end
+        self.session_id = self.args.session_id
+        # request JSON payload, if any (for POST method .create() calls)
+        self.payload_json = request.get_json(silent = True)
 
 
     def query(self):
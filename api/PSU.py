@@ -9,6 +9,7 @@
 #
 #   0.1.0   2018.10.27  Initial version.
 #   0.2.0   2018.10.29  Complies to new api.response() specs.
+#   0.2.1   2026.10.19  Request arguments parsed with api.ArgumentSchema.
 #
 #
 # Command interface
@@ -58,71 +59,22 @@ import sqlite3
 from flask              import g
 from application        import app
 from .                  import InvalidArgument, Timeout, NotFound
-from .                  import DataObject
+from .                  import DataObject, ArgumentSchema, field_list
 
 class PSU(DataObject):
 
-    accepted_request_arguments = ('fields')
-    class DotDict(dict):
-        """dot.notation access to dictionary attributes"""
-        __getattr__ = dict.get
-        __setattr__ = dict.__setitem__
-        __delattr__ = dict.__delitem__
-        def __missing__(self, key):
-            """Return None if non-existing key is accessed"""
-            return None
+    argument_schema = ArgumentSchema(
+        ('fields',      field_list)
+    )
 
     # 500 ms result polling from 'command' table, before timeout
     polling_timeout = 0.5
 
     def __init__(self, request):
-        """No need to parse - no request arguments supported"""
+        """Parses request arguments ('fields' only)."""
         self.cursor = g.db.cursor()
         super().__init__(self.cursor, 'psu')
-        try:
-            # build empty arg dictionary
-            self.args = self.DotDict()
-            for var in self.accepted_request_arguments:
-                setattr(self.args, var, None)
-
-            if request.args:
-                # Raise exception for request unsupported arguments
-                for key, _ in request.args.items():
-                    if key not in self.accepted_request_arguments:
-                        raise InvalidArgument(
-                            "Unsupported argument '{}'".format(key)
-                        )
-
-                try:
-                    fields      = request.args.get('fields',        None)
-                except Exception as e:
-                    # Replace with api.ApiException
-                    raise InvalidArgument(
-                        "Argument extraction failed!",
-                        {'arguments' : request.args, 'exception' : str(e)}
-                    ) from None
-
-                # Convert to desired types (or create as None's)
-                self.args.fields     = fields.split(',') if fields     else None
-
-        except InvalidArgument:
-            raise
-        except Exception as e:
-            # Replace with api.ApiException
-            raise InvalidArgument(
-                "Parameter parsing failed!",
-                str(e)
-            ) from None
-
-        #
-        # Complain if args.fields contains non-existent columns
-        #
-        if self.missing_columns(self.args.fields):
-            raise InvalidArgument(
-                "Non-existent fields defined!",
-                "Field(s) " + ","
-                .join(self.missing_columns(self.args.fields)) + " do not exist!"
-            )
+        self.parse_arguments(request)
 
 
 
@@ -13,8 +13,30 @@
 #   0.2.0   2018.10.29  Complies to new api.response().
 #   0.3.0   2018.11.04  Complies with new DataObject pattern.
 #   0.3.1   2018.11.10  Improved query parsing.
+#   0.4.0   2026.10.19  Grouped aggregates ('group_by'), session comparison.
+#   0.5.0   2026.10.19  Pulse height histograms (ADC spectra).
+#   0.6.0   2026.10.19  Persisted session spectra (api/Spectra.py).
+#   0.7.0   2026.10.19  Latest rows ('n').
+#   0.8.0   2026.10.19  Recent searches served from the hot-tail buffer.
+#   0.8.1   2026.10.19  Request arguments parsed with api.ArgumentSchema.
+#   0.8.2   2026.10.19  Optional rowid bounds in .query() (sharded exports).
+#   0.8.3   2026.10.19  'group_by' validated by DataObject.parse_arguments().
 #
 #
+#   Histograms
+#
+#       PulseHeight.histogram() bins the pulse heights of each selected
+#       channel (field) with shared bin edges, server-side. Rows are read in
+#       batches of PULSEHEIGHT_BATCH_ROWS (default 8192) into NumPy arrays
+#       and binned with one numpy.bincount() per batch for all channels, so
+#       memory use does not depend on the number of events in the range.
+#
+#       Bins are defined either by explicit 'edges' (comma separated,
+#       increasing) or by number of equal width 'bins' (default 256) over
+#       'range' ("lo,hi"; default: min and max of the selected data).
+#       As with numpy.histogram(), bins are half-open [lo, hi), except the
+#       last, which includes the upper edge.
+#
 import json
 import logging
 import sqlite3
@@ -28,81 +50,32 @@ from flask              import g
 from application        import app
 from .                  import InvalidArgument, NotFound
 from .                  import DataObject
+from .                  import ArgumentSchema, field_list, integer_list, float_list, lowercase
 
 class PulseHeight(DataObject):
 
-    accepted_request_arguments = (
-        'fields',
-        'begin',
-        'end',
-        'timestamp',
-        'session_id'
+    argument_schema = ArgumentSchema(
+        ('fields',      field_list),
+        ('begin',       int),
+        ('end',         int),
+        ('timestamp',   int),
+        ('session_id',  int),
+        ('group_by',    str),
+        ('sessions',    integer_list),
+        ('baseline',    int),
+        ('aggregate',   lowercase),
+        ('bins',        int),
+        ('range',       float_list),
+        ('edges',       float_list),
+        ('rebin',       int),
+        ('n',           int)
     )
-    class DotDict(dict):
-        """dot.notation access to dictionary attributes"""
-        __getattr__ = dict.get
-        __setattr__ = dict.__setitem__
-        __delattr__ = dict.__delitem__
-        def __missing__(self, key):
-            """Return None if non-existing key is accessed"""
-            return None
 
     def __init__(self, request):
         """Parses request arguments."""
         self.cursor = g.db.cursor()
         super().__init__(self.cursor, 'pulseheight')
-        try:
-            # build empty arg dictionary
-            self.args = self.DotDict()
-            for var in self.accepted_request_arguments:
-                setattr(self.args, var, None)
-
-            if request.args:
-                # Raise exception for request unsupported arguments
-                for key, _ in request.args.items():
-                    if key not in self.accepted_request_arguments:
-                        raise InvalidArgument(
-                            "Unsupported argument '{}'".format(key)
-                        )
-
-                try:
-                    fields      = request.args.get('fields',        None)
-                    timestamp   = request.args.get('timestamp',     None)
-                    begin       = request.args.get('begin',         None)
-                    end         = request.args.get('end',           None)
-                    session_id  = request.args.get('session_id',    None)
-                except Exception as e:
-                    # Replace with api.ApiException
-                    raise InvalidArgument(
-                        "Argument extraction failed!",
-                        {'arguments' : request.args, 'exception' : str(e)}
-                    ) from None
-
-                # Convert to desired types (or create as None's)
-                self.args.fields     = fields.split(',') if fields     else None
-                self.args.timestamp  = int(timestamp)    if timestamp  else None
-                self.args.begin      = int(begin)        if begin      else None
-                self.args.end        = int(end)          if end        else None
-                self.args.session_id = int(session_id)   if session_id else None
-
-        except InvalidArgument:
-            raise
-        except Exception as e:
-            # Replace with api.ApiException
-            raise InvalidArgument(
-                "Parameter parsing failed!",
-                str(e)
-            ) from None
-
-        #
-        # Complain if args.fields contains non-existent columns
-        #
-        if self.missing_columns(self.args.fields):
-            raise InvalidArgument(
-                "Non-existent fields defined!",
-                "Field(s) " + ","
-                .join(self.missing_columns(self.args.fields)) + " do not exist!"
-            )
+        self.parse_arguments(request)
 
 
     def query(self, aggregate=None):
@@ -138,6 +111,8 @@ class PulseHeight(DataObject):
             #
             columnlist = []
             if aggregate:
+                if self.args.group_by:
+                    columnlist.append(self.args.group_by)
                 for col in cols:
                     if not col.primarykey:
                         if col.datatype in ('INTEGER', 'REAL'):
@@ -176,9 +151,25 @@ class PulseHeight(DataObject):
                     )
                 if self.args.session_id:
                     conditions.append("session_id = :session_id")
+            if self.rowid_range:
+                conditions.append(self.rowid_condition())
             if conditions:
                 self.sql += " WHERE " + " AND ".join(conditions)
 
+            #
+            # Grouped aggregate (one pass, one result row per group)
+            #
+            if self.args.group_by:
+                if not aggregate:
+                    raise InvalidArgument(
+                        "Argument 'group_by' requires an aggregate function!"
+                    )
+                self.sql += " GROUP BY {0} ORDER BY {0}".format(
+                    self.args.group_by
+                )
+
+        except InvalidArgument:
+            raise
         except:
             app.logger.exception("Query preparations failed!")
             raise
@@ -202,23 +193,29 @@ class PulseHeight(DataObject):
 
     def get(self, aggregate=None):
         """Handle Fetch and Search requests."""
-        cursor = self.query(aggregate)
-        # https://medium.com/@PyGuyCharles/python-sql-to-json-and-beyond-3e3a36d32853
-        # turn result object into a list of row-dictionaries
-        # (result-)table column names are used as keys in key-value pairs.
-        if self.args.timestamp or aggregate:
-            # Fetch request - return object
-            result = cursor.fetchall()
-            if len(result) < 1:
-                raise NotFound(
-                    "Pulseheight record not found!",
-                    "Provided timestamp '{}' does not match any in the database"
-                    .format(self.args.timestamp)
-                )
-            data = dict(zip([c[0] for c in cursor.description], result[0]))
-        else:
-            # Search request - return a list of objects
-            data = [dict(zip([key[0] for key in cursor.description], row)) for row in cursor]
+        # Search within the recent rows is served from memory
+        data = None if aggregate else self.search_hot_tail()
+        if data is None:
+            cursor = self.query(aggregate)
+            # https://medium.com/@PyGuyCharles/python-sql-to-json-and-beyond-3e3a36d32853
+            # turn result object into a list of row-dictionaries
+            # (result-)table column names are used as keys in key-value pairs.
+            if aggregate and self.args.group_by:
+                # Grouped aggregate - return a list of objects, one per group
+                data = [dict(zip([key[0] for key in cursor.description], row)) for row in cursor]
+            elif self.args.timestamp or aggregate:
+                # Fetch request - return object
+                result = cursor.fetchall()
+                if len(result) < 1:
+                    raise NotFound(
+                        "Pulseheight record not found!",
+                        "Provided timestamp '{}' does not match any in the database"
+                        .format(self.args.timestamp)
+                    )
+                data = dict(zip([c[0] for c in cursor.description], result[0]))
+            else:
+                # Search request - return a list of objects
+                data = [dict(zip([key[0] for key in cursor.description], row)) for row in cursor]
 
         # pop fields out of self.args
         fields = self.args.pop('fields', None)
@@ -239,4 +236,215 @@ class PulseHeight(DataObject):
 
 
 
+    def events(self, columns, batch = None):
+        """Generator that yields NumPy arrays, shaped (events, len(columns)), of pulse heights in the requested range. NULL values become NaN."""
+        import numpy
+        batch = batch or int(app.config.get('PULSEHEIGHT_BATCH_ROWS', 8192))
+        self.sql = "SELECT {} FROM pulseheight".format(", ".join(columns))
+        conditions = self.search_conditions()
+        if conditions:
+            self.sql += " WHERE " + " AND ".join(conditions)
+        try:
+            self.cursor.execute(self.sql, self.args)
+        except:
+            app.logger.exception(
+                "Query failure! SQL='{}', args='{}'"
+                .format(self.sql, self.args)
+            )
+            raise
+        while True:
+            rows = self.cursor.fetchmany(batch)
+            if not rows:
+                break
+            yield numpy.array(rows, dtype = float).reshape(len(rows), len(columns))
+
+
+    def histogram_edges(self, columns):
+        """Return bin edges (NumPy array) from 'edges', or from 'bins' and 'range' arguments."""
+        import numpy
+        max_bins = int(app.config.get('PULSEHEIGHT_MAX_BINS', 65536))
+        if self.args.edges:
+            edges = numpy.array(self.args.edges)
+            if edges.size < 2 or edges.size > max_bins + 1 or \
+               numpy.any(numpy.diff(edges) <= 0):
+                raise InvalidArgument(
+                    "Invalid histogram 'edges'!",
+                    "Edges must be increasing and define 1 to {} bins."
+                    .format(max_bins)
+                )
+            return edges
+        bins = self.args.bins or 256
+        if not 0 < bins <= max_bins:
+            raise InvalidArgument(
+                "Invalid number of histogram 'bins'!",
+                "Number of bins must be between 1 and {}.".format(max_bins)
+            )
+        if self.args.range:
+            if len(self.args.range) != 2 or self.args.range[0] >= self.args.range[1]:
+                raise InvalidArgument(
+                    "Invalid histogram 'range'!",
+                    "Range must be given as 'lo,hi', where lo < hi."
+                )
+            lo, hi = self.args.range
+        else:
+            # Data range of the selected channels
+            sql = "SELECT {}, {} FROM pulseheight".format(
+                ", ".join("min({})".format(c) for c in columns),
+                ", ".join("max({})".format(c) for c in columns)
+            )
+            conditions = self.search_conditions()
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            row = self.cursor.execute(sql, self.args).fetchone()
+            lows  = [v for v in row[:len(columns)] if v is not None]
+            highs = [v for v in row[len(columns):] if v is not None]
+            if not lows:
+                raise NotFound(
+                    "No pulse height data in the requested range!"
+                )
+            lo, hi = min(lows), max(highs)
+            if lo == hi:
+                lo, hi = lo - 0.5, hi + 0.5
+        return numpy.linspace(lo, hi, bins + 1)
+
+
+    def histogram(self):
+        """Pulse height histograms of the selected channels ('fields', default: all) with shared bin edges. Range and session filters apply as in search requests.
+
+        Returns (200, {"data" : {"edges" : [...], "counts" : {field : [...]}, "underflow" : {...}, "overflow" : {...}, "entries" : {...}}}) tuple."""
+        import numpy
+        columns = [
+            col.name for col in self.numeric_columns()
+            if not self.args.fields or col.name in self.args.fields
+        ]
+        if not columns:
+            raise InvalidArgument(
+                "No numeric fields selected!",
+                "Histograms are available for numeric pulse height channels."
+            )
+        edges   = self.histogram_edges(columns)
+        nbins   = edges.size - 1
+        uniform = self.args.edges is None
+        offsets = numpy.arange(len(columns)) * (nbins + 2)
+        counts  = numpy.zeros(len(columns) * (nbins + 2), dtype = numpy.int64)
+        for values in self.events(columns):
+            valid = ~numpy.isnan(values)
+            if uniform:
+                index = numpy.floor(
+                    (values - edges[0]) * (nbins / (edges[-1] - edges[0]))
+                )
+            else:
+                index = numpy.searchsorted(edges, values, side = 'right') - 1.0
+            # Upper edge belongs to the last bin; 0 = underflow, nbins + 1 = overflow
+            index[values == edges[-1]] = nbins - 1
+            index = numpy.clip(index + 1, 0, nbins + 1).astype(numpy.int64)
+            counts += numpy.bincount(
+                (index + offsets)[valid],
+                minlength = counts.size
+            )
+        counts = counts.reshape(len(columns), nbins + 2)
+
+        data = {
+            "edges"     : edges.tolist(),
+            "counts"    : {c : counts[i, 1:-1].tolist() for i, c in enumerate(columns)},
+            "underflow" : {c : int(counts[i, 0]) for i, c in enumerate(columns)},
+            "overflow"  : {c : int(counts[i, -1]) for i, c in enumerate(columns)},
+            "entries"   : {c : int(counts[i].sum()) for i, c in enumerate(columns)}
+        }
+        self.args.pop('fields', None)
+        if app.config.get("DEBUG", False):
+            return (
+                200,
+                {
+                    "data"          : data,
+                    "query" : {
+                        "sql"       : self.sql,
+                        "variables" : self.args
+                    }
+                }
+            )
+        return (200, {"data" : data})
+
+
+
+    def spectrum(self):
+        """ADC spectra (one bin per ADC value) of a testing session ('session_id', default: all sessions), from the persisted histograms (api/Spectra.py). Without 'begin' and 'end', the cumulative session histogram is returned as is. For a time sub-range, stored per-bucket histograms are combined and only partial buckets at the range edges are read from the table. 'rebin' combines adjacent bins.
+
+        Returns (200, {"data" : {...}}) tuple."""
+        from .Spectra import PulseHeightSpectra, histogram
+        if self.args.timestamp:
+            raise InvalidArgument(
+                "Argument 'timestamp' is not supported for spectra!",
+                "Use 'begin' and 'end' to define a time range."
+            )
+        spectra = PulseHeightSpectra(self.cursor)
+        spectra.update()
+        missing = [f for f in (self.args.fields or []) if f not in spectra.fields]
+        if missing:
+            raise InvalidArgument(
+                "Spectra are not available for non-numeric fields!",
+                "Field(s) " + ",".join(missing)
+            )
+        rebin = self.args.rebin or 1
+        if rebin < 1 or spectra.nbins % rebin:
+            raise InvalidArgument(
+                "Invalid 'rebin' value!",
+                "Rebin factor must divide the number of ADC bins ({})."
+                .format(spectra.nbins)
+            )
+
+        def raw(lo, hi):
+            self.args.begin, self.args.end = lo, hi
+            counts = spectra.empty()
+            for values in self.events(spectra.fields):
+                counts += histogram(values, spectra.nbins)
+            return counts
+
+        if self.args.begin is None and self.args.end is None:
+            method = "session"
+            counts = spectra.session(self.args.session_id)
+        else:
+            oldest, newest = self.timestamp_range()
+            begin  = self.args.begin if self.args.begin is not None else oldest
+            end    = self.args.end   if self.args.end   is not None else newest
+            if begin is None or end is None:
+                raise NotFound("No pulse height data!")
+            length = spectra.bucket_len
+            first  = -(-begin // length) * length
+            last   = (end + 1) // length * length
+            if first >= last:
+                method = "raw"
+                counts = raw(begin, end)
+            else:
+                method = "buckets"
+                counts = spectra.buckets(first, last, self.args.session_id)
+                if begin < first:
+                    counts = counts + raw(begin, first - 1)
+                if last <= end:
+                    counts = counts + raw(last, end)
+            self.args.begin, self.args.end = begin, end
+
+        fields = [
+            (i, f) for i, f in enumerate(spectra.fields)
+            if not self.args.fields or f in self.args.fields
+        ]
+        data = {
+            "session_id"    : self.args.session_id,
+            "begin"         : self.args.begin,
+            "end"           : self.args.end,
+            "method"        : method,
+            "bins"          : spectra.nbins // rebin,
+            "width"         : rebin,
+            "counts"        : {
+                f : counts[i, 1:-1].reshape(-1, rebin).sum(axis = 1).tolist()
+                for i, f in fields
+            },
+            "underflow"     : {f : int(counts[i, 0]) for i, f in fields},
+            "overflow"      : {f : int(counts[i, -1]) for i, f in fields},
+            "entries"       : {f : int(counts[i].sum()) for i, f in fields}
+        }
+        return (200, {"data" : data})
+
+
+
 # EOF
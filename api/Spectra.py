@@ -0,0 +1,307 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# Persisted cumulative pulse height spectra
+#
+# Spectra.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#
+#
+#   PulseHeightSpectra
+#
+#       Maintains pulse height histograms (ADC spectra) of all numeric
+#       pulseheight channels in the local cache database (api.cache_db()):
+#
+#           pulseheight_spectrum    Cumulative histograms, one row per
+#                                   testing session.
+#           pulseheight_partial     Histograms per (session, time bucket),
+#                                   PULSEHEIGHT_BUCKET_SECONDS (default
+#                                   3600) long buckets.
+#           pulseheight_mark        High-water mark; the largest pulseheight
+#                                   rowid already included, and the list of
+#                                   channels the histograms were built for.
+#
+#       Histograms have one bin per ADC value 0 ... 2**PULSEHEIGHT_ADC_BITS - 1
+#       (default 12 bits), preceded by an underflow bin and followed by an
+#       overflow bin. Each row holds all channels as a little-endian int64
+#       array shaped (channels, bins + 2).
+#
+#       update() is called before histograms are served. It reads only rows
+#       added after the high-water mark (WHERE rowid > mark), so the cost of
+#       keeping spectra current is proportional to new data. Rows without a
+#       testing session are kept under session -1. Pulseheight table is
+#       expected to be append-only; rows modified or deleted after they were
+#       included require a rebuild ('flask rebuild-spectra').
+#
+import json
+
+import numpy
+
+from application        import app
+from .                  import cache_db, DataObject
+
+
+def adc_index(values, nbins):
+    """Return bin indices (int64 array, same shape as 'values') of ADC values; 0 is underflow and nbins + 1 overflow. NaN's (NULL values) are returned as -1."""
+    index = numpy.floor(values)
+    index = numpy.clip(index + 1, 0, nbins + 1)
+    index[numpy.isnan(values)] = -1
+    return index.astype(numpy.int64)
+
+
+def histogram(values, nbins):
+    """Histogram (int64 array shaped (channels, nbins + 2)) of a (rows, channels) array of ADC values."""
+    index   = adc_index(values, nbins)
+    offsets = numpy.arange(values.shape[1]) * (nbins + 2)
+    valid   = index >= 0
+    return numpy.bincount(
+        (index + offsets)[valid],
+        minlength = values.shape[1] * (nbins + 2)
+    ).reshape(values.shape[1], nbins + 2)
+
+
+
+class PulseHeightSpectra:
+
+    # Tables for the local cache database
+    schema = (
+        """
+        CREATE TABLE IF NOT EXISTS pulseheight_mark
+        (
+            id              INTEGER     PRIMARY KEY CHECK (id = 0),
+            rowid_mark      INTEGER     NOT NULL,
+            fields          TEXT        NOT NULL,
+            bins            INTEGER     NOT NULL,
+            bucket_seconds  INTEGER     NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS pulseheight_spectrum
+        (
+            session_id      INTEGER     PRIMARY KEY,
+            counts          BLOB        NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS pulseheight_partial
+        (
+            session_id      INTEGER     NOT NULL,
+            bucket          INTEGER     NOT NULL,
+            counts          BLOB        NOT NULL,
+            PRIMARY KEY (session_id, bucket)
+        )
+        """
+    )
+
+    def __init__(self, cursor):
+        """Spectra of the pulseheight table in the database of 'cursor'."""
+        self.cursor     = cursor
+        self.table      = DataObject(cursor, 'pulseheight')
+        self.nbins      = 2 ** int(app.config.get('PULSEHEIGHT_ADC_BITS', 12))
+        self.bucket_len = int(app.config.get('PULSEHEIGHT_BUCKET_SECONDS', 3600))
+        self.batch      = int(app.config.get('PULSEHEIGHT_BATCH_ROWS', 8192))
+        self.fields     = [
+            col.name for col in self.table
+            if not col.primarykey
+            and col.name != 'session_id'
+            and col.datatype in ('INTEGER', 'REAL')
+        ]
+        self.cache      = cache_db()
+        for sql in self.schema:
+            self.cache.execute(sql)
+        self.cache.commit()
+
+
+    def empty(self):
+        return numpy.zeros((len(self.fields), self.nbins + 2), dtype = numpy.int64)
+
+
+    def decode(self, blob):
+        return numpy.frombuffer(blob, dtype = '<i8').reshape(
+            len(self.fields), self.nbins + 2
+        )
+
+
+    def mark(self):
+        """Return the high-water rowid, or None if the stored histograms are missing or were built with different channels or binning."""
+        row = self.cache.execute(
+            "SELECT rowid_mark, fields, bins, bucket_seconds FROM pulseheight_mark"
+        ).fetchone()
+        if row is None or \
+           json.loads(row[1]) != self.fields or \
+           row[2] != self.nbins or \
+           row[3] != self.bucket_len:
+            return None
+        return row[0]
+
+
+    def accumulate(self, conditions, bvars):
+        """Read pulseheight rows matching 'conditions' (list of SQL conditions). Returns ({(session_id, bucket) : histogram}, number of rows read)."""
+        cursor = self.cursor.connection.cursor()
+        sql = "SELECT {} AS ts, ifnull(session_id, -1), {} FROM pulseheight".format(
+            self.table.where_condition('timestamp'),
+            ", ".join(self.fields)
+        )
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        cursor.execute(sql, bvars)
+        partials = {}
+        count    = 0
+        while True:
+            rows = cursor.fetchmany(self.batch)
+            if not rows:
+                break
+            count += len(rows)
+            a = numpy.array(rows, dtype = float).reshape(len(rows), len(self.fields) + 2)
+            keys = numpy.stack(
+                (a[:, 1], a[:, 0] // self.bucket_len * self.bucket_len)
+            ).T.astype(numpy.int64)
+            groups, inverse = numpy.unique(keys, axis = 0, return_inverse = True)
+            inverse = inverse.reshape(-1)
+            size    = len(self.fields) * (self.nbins + 2)
+            index   = adc_index(a[:, 2:], self.nbins)
+            flat    = index + numpy.arange(len(self.fields)) * (self.nbins + 2) \
+                      + (inverse * size)[:, None]
+            counts  = numpy.bincount(
+                flat[index >= 0],
+                minlength = len(groups) * size
+            ).reshape(len(groups), len(self.fields), self.nbins + 2)
+            for (session, bucket), histogram in zip(groups.tolist(), counts):
+                if (session, bucket) in partials:
+                    partials[(session, bucket)] += histogram
+                else:
+                    partials[(session, bucket)] = histogram
+        cursor.close()
+        return partials, count
+
+
+    def store(self, partials, replace = False):
+        """Add (or with 'replace', write) partial histograms to stored bucket and session histograms."""
+        sessions = {}
+        for (session, bucket), histogram in partials.items():
+            sessions[session] = sessions.get(session, 0) + histogram
+            if not replace:
+                row = self.cache.execute(
+                    "SELECT counts FROM pulseheight_partial WHERE session_id = ? AND bucket = ?",
+                    (session, bucket)
+                ).fetchone()
+                if row:
+                    histogram = histogram + self.decode(row[0])
+            self.cache.execute(
+                "INSERT OR REPLACE INTO pulseheight_partial VALUES (?, ?, ?)",
+                (session, bucket, histogram.astype('<i8').tobytes())
+            )
+        for session, histogram in sessions.items():
+            if not replace:
+                row = self.cache.execute(
+                    "SELECT counts FROM pulseheight_spectrum WHERE session_id = ?",
+                    (session,)
+                ).fetchone()
+                if row:
+                    histogram = histogram + self.decode(row[0])
+            self.cache.execute(
+                "INSERT OR REPLACE INTO pulseheight_spectrum VALUES (?, ?)",
+                (session, histogram.astype('<i8').tobytes())
+            )
+
+
+    def set_mark(self, rowid):
+        self.cache.execute(
+            "INSERT OR REPLACE INTO pulseheight_mark VALUES (0, ?, ?, ?, ?)",
+            (rowid, json.dumps(self.fields), self.nbins, self.bucket_len)
+        )
+
+
+    def update(self):
+        """Include pulseheight rows added since the last update. Returns the number of rows included."""
+        self.cursor.execute("SELECT ifnull(max(rowid), 0) FROM pulseheight")
+        newest = self.cursor.fetchone()[0]
+        mark   = self.mark()
+        if mark is not None and mark >= newest:
+            return 0
+        #
+        # Write lock serializes concurrent updaters; re-read the mark under it
+        #
+        self.cache.commit()
+        self.cache.execute("BEGIN IMMEDIATE")
+        try:
+            mark = self.mark()
+            if mark is None:
+                # Missing or incompatible histograms; start over
+                self.cache.execute("DELETE FROM pulseheight_spectrum")
+                self.cache.execute("DELETE FROM pulseheight_partial")
+                mark = 0
+            partials, count = self.accumulate(
+                ["rowid > :mark", "rowid <= :newest"],
+                {'mark' : mark, 'newest' : newest}
+            )
+            self.store(partials)
+            self.set_mark(max(mark, newest))
+            self.cache.commit()
+        except:
+            self.cache.rollback()
+            raise
+        return count
+
+
+    def rebuild(self, session_id = None):
+        """Rebuild histograms of one testing session, or all (if 'session_id' is None)."""
+        if session_id is None:
+            self.cache.execute("DELETE FROM pulseheight_mark")
+            self.cache.commit()
+            return self.update()
+        self.update()
+        self.cache.execute("BEGIN IMMEDIATE")
+        try:
+            mark = self.mark()
+            self.cache.execute(
+                "DELETE FROM pulseheight_spectrum WHERE session_id = ?",
+                (session_id,)
+            )
+            self.cache.execute(
+                "DELETE FROM pulseheight_partial WHERE session_id = ?",
+                (session_id,)
+            )
+            partials, count = self.accumulate(
+                ["ifnull(session_id, -1) = :session_id", "rowid <= :mark"],
+                {'session_id' : session_id, 'mark' : mark}
+            )
+            self.store(partials, replace = True)
+            self.cache.commit()
+        except:
+            self.cache.rollback()
+            raise
+        return count
+
+
+    def session(self, session_id = None):
+        """Return cumulative histogram of a testing session (all sessions, if None)."""
+        if session_id is not None:
+            row = self.cache.execute(
+                "SELECT counts FROM pulseheight_spectrum WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+            return self.decode(row[0]) if row else self.empty()
+        result = self.empty()
+        for row in self.cache.execute("SELECT counts FROM pulseheight_spectrum"):
+            result += self.decode(row[0])
+        return result
+
+
+    def buckets(self, first, last, session_id = None):
+        """Return sum of stored histograms for buckets first <= bucket < last."""
+        sql   = "SELECT counts FROM pulseheight_partial WHERE bucket >= ? AND bucket < ?"
+        bvars = [first, last]
+        if session_id is not None:
+            sql += " AND session_id = ?"
+            bvars.append(session_id)
+        result = self.empty()
+        for row in self.cache.execute(sql, bvars):
+            result += self.decode(row[0])
+        return result
+
+
+# EOF
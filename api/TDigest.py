@@ -0,0 +1,332 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# Mergeable quantile sketches for time-series tables
+#
+# TDigest.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#   0.1.1   2026.10.19  Rebuilt buckets replace digests without a session.
+#
+#
+#   TDigest
+#
+#       Merging t-digest (Dunning & Ertl), implemented with NumPy. Values are
+#       kept as (mean, weight) centroids whose size is limited by the k1
+#       scale function; small at the tails and larger around the median.
+#       Compression is done vectorised: centroids falling into the same
+#       integer k-bin are merged. Digests are mergeable, which allows
+#       combining per-bucket digests into a digest for any longer range.
+#
+#   BucketSketches
+#
+#       Maintains t-digests per (table, time bucket, session, field) in the
+#       local cache database (api.cache_db()). Buckets are built lazily,
+#       when a quantile request first needs them, and only once the bucket
+#       is complete (newer data exists beyond its end). Completed buckets
+#       are recorded per field (table 'quantile_built'), because a request
+#       sketches only the fields it asks for. Rows are read in timestamp
+#       order with one query for all missing buckets, so building does not
+#       scan the table once per bucket.
+#
+#       Quantile request for a long range then reads stored digests for
+#       complete buckets and raw rows only for partial buckets at the edges
+#       of the range (and the fresh, still incomplete, tail).
+#
+import numpy
+
+from application        import app
+from .                  import cache_db
+
+
+class TDigest:
+
+    __slots__ = ('compression', 'means', 'weights', 'min', 'max')
+
+    def __init__(self, compression = 100, means = None, weights = None):
+        self.compression = compression
+        self.means   = numpy.empty(0) if means   is None else means
+        self.weights = numpy.empty(0) if weights is None else weights
+        self.min     = self.means.min() if self.means.size else numpy.inf
+        self.max     = self.means.max() if self.means.size else -numpy.inf
+
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+
+    def update(self, values):
+        """Add array of values (NaN's are ignored)."""
+        values = numpy.asarray(values, dtype = float)
+        values = values[~numpy.isnan(values)]
+        if not values.size:
+            return self
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.means   = numpy.concatenate((self.means, values))
+        self.weights = numpy.concatenate((self.weights, numpy.ones(values.size)))
+        if self.means.size > 10 * self.compression:
+            self.compress()
+        return self
+
+
+    def merge(self, other):
+        """Merge another TDigest into this one."""
+        if other.means.size:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self.means   = numpy.concatenate((self.means, other.means))
+            self.weights = numpy.concatenate((self.weights, other.weights))
+            if self.means.size > 10 * self.compression:
+                self.compress()
+        return self
+
+
+    def compress(self):
+        """Merge centroids that fall into the same integer k1 scale bin."""
+        if self.means.size <= 1:
+            return self
+        order   = numpy.argsort(self.means, kind = 'mergesort')
+        means   = self.means[order]
+        weights = self.weights[order]
+        cumulative = numpy.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = numpy.floor(
+            self.compression * (numpy.arcsin(2 * q - 1) / numpy.pi + 0.5)
+        )
+        starts  = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(k)) + 1))
+        weights_merged = numpy.add.reduceat(weights, starts)
+        self.means   = numpy.add.reduceat(means * weights, starts) / weights_merged
+        self.weights = weights_merged
+        return self
+
+
+    def quantile(self, q):
+        """Return array of estimated values for the quantiles in 'q'."""
+        q = numpy.asarray(q, dtype = float)
+        if not self.means.size:
+            return numpy.full(q.shape, numpy.nan)
+        self.compress()
+        cumulative = numpy.cumsum(self.weights)
+        positions  = (cumulative - self.weights / 2) / cumulative[-1]
+        return numpy.interp(
+            q,
+            numpy.concatenate(([0.0], positions, [1.0])),
+            numpy.concatenate(([self.min], self.means, [self.max]))
+        )
+
+
+    def to_bytes(self):
+        """Serialize as little-endian float64 array [min, max, means..., weights...]."""
+        self.compress()
+        return numpy.concatenate(
+            ([self.min, self.max], self.means, self.weights)
+        ).astype('<f8').tobytes()
+
+
+    @classmethod
+    def from_bytes(cls, blob, compression = 100):
+        a = numpy.frombuffer(blob, dtype = '<f8')
+        n = (a.size - 2) // 2
+        digest = cls(compression, a[2:2 + n].copy(), a[2 + n:].copy())
+        digest.min, digest.max = a[0], a[1]
+        return digest
+
+
+
+class BucketSketches:
+
+    # Tables for the local cache database
+    schema = (
+        """
+        CREATE TABLE IF NOT EXISTS quantile_built
+        (
+            tablename       TEXT        NOT NULL,
+            bucket          INTEGER     NOT NULL,
+            field           TEXT        NOT NULL,
+            rows            INTEGER     NOT NULL,
+            PRIMARY KEY (tablename, bucket, field)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS quantile_sketch
+        (
+            tablename       TEXT        NOT NULL,
+            bucket          INTEGER     NOT NULL,
+            session_id      INTEGER,
+            field           TEXT        NOT NULL,
+            sketch          BLOB        NOT NULL,
+            PRIMARY KEY (tablename, bucket, session_id, field)
+        )
+        """
+    )
+
+    def __init__(self, dataobject, columns):
+        """Sketches for the table of the 'dataobject', for its numeric 'columns' (the requested fields)."""
+        self.do          = dataobject
+        self.columns     = columns
+        self.bucket_len  = int(app.config.get('QUANTILE_BUCKET_SECONDS', 3600))
+        self.compression = int(app.config.get('QUANTILE_COMPRESSION', 100))
+        self.cache       = cache_db()
+        for sql in self.schema:
+            self.cache.execute(sql)
+
+
+    def rows(self, begin, end, columns = None):
+        """Generator yielding (timestamps, session_ids, values) array tuples for rows begin <= timestamp < end, in timestamp order. Values are of 'columns' (default: self.columns)."""
+        columns = columns or self.columns
+        ts  = self.do.where_condition('timestamp')
+        sql = "SELECT {} AS ts, session_id, {} FROM {} WHERE {} >= :begin AND {} < :end".format(
+            ts,
+            ", ".join(col.name for col in columns),
+            self.do.table,
+            ts,
+            ts
+        )
+        if self.do.args.session_id:
+            sql += " AND session_id = :session_id"
+        sql += " ORDER BY timestamp"
+        cursor = self.do.cursor.connection.cursor()
+        cursor.execute(
+            sql,
+            {'begin' : begin, 'end' : end, 'session_id' : self.do.args.session_id}
+        )
+        while True:
+            batch = cursor.fetchmany(2048)
+            if not batch:
+                break
+            a = numpy.array(batch, dtype = float)
+            yield a[:, 0], a[:, 1], a[:, 2:]
+        cursor.close()
+
+
+    def build(self, buckets, columns):
+        """Build and store digests of 'columns' for the listed (complete) buckets."""
+        if not buckets or not columns:
+            return
+        wanted  = set(buckets)
+        digests = {}            # {(bucket, session_id) : [TDigest, ...]}
+        counts  = {}            # {bucket : rows}
+        session_id = self.do.args.session_id
+        # All sessions are always sketched, regardless of the request filter
+        self.do.args.session_id = None
+        try:
+            for ts, sessions, values in self.rows(
+                min(buckets),
+                max(buckets) + self.bucket_len,
+                columns
+            ):
+                bucket   = (ts // self.bucket_len * self.bucket_len).astype(int)
+                sessions = numpy.nan_to_num(sessions, nan = -1).astype(int)
+                for b, s in numpy.unique(numpy.stack((bucket, sessions)).T, axis = 0):
+                    b, s = int(b), int(s)
+                    if b not in wanted:
+                        continue
+                    mask = (bucket == b) & (sessions == s)
+                    if (b, s) not in digests:
+                        digests[(b, s)] = [TDigest(self.compression) for _ in columns]
+                    for digest, column in zip(digests[(b, s)], values[mask].T):
+                        digest.update(column)
+                    counts[b] = counts.get(b, 0) + int(mask.sum())
+        finally:
+            self.do.args.session_id = session_id
+
+        # Rebuilt digests replace the stored ones. Rows without a session
+        # (NULL session_id) are never replaced by INSERT OR REPLACE, because
+        # NULLs are distinct in the primary key; delete them explicitly.
+        self.cache.executemany(
+            "DELETE FROM quantile_sketch WHERE tablename = ? AND bucket = ? AND field = ?",
+            (
+                (self.do.table, b, column.name)
+                for b in buckets
+                for column in columns
+            )
+        )
+        self.cache.executemany(
+            "INSERT OR REPLACE INTO quantile_sketch VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    self.do.table,
+                    bucket,
+                    None if session == -1 else session,
+                    column.name,
+                    digest.to_bytes()
+                )
+                for (bucket, session), lst in digests.items()
+                for column, digest in zip(columns, lst)
+            )
+        )
+        self.cache.executemany(
+            "INSERT OR REPLACE INTO quantile_built VALUES (?, ?, ?, ?)",
+            (
+                (self.do.table, b, column.name, counts.get(b, 0))
+                for b in buckets
+                for column in columns
+            )
+        )
+        self.cache.commit()
+
+
+    def digests(self, begin, end, newest):
+        """Return {field : TDigest} for range begin <= timestamp <= end. 'newest' is the timestamp of the newest row in the table; buckets ending after it are incomplete and always read from the table."""
+        first = -(-begin // self.bucket_len) * self.bucket_len
+        last  = min(end + 1, newest) // self.bucket_len * self.bucket_len
+        result = {col.name : TDigest(self.compression) for col in self.columns}
+
+        def add_raw(lo, hi):
+            for _, _, values in self.rows(lo, hi):
+                for column, values_column in zip(self.columns, values.T):
+                    result[column.name].update(values_column)
+
+        if first >= last:
+            # No complete buckets within the range
+            add_raw(begin, end + 1)
+            return result
+
+        #
+        # Build missing (bucket, field) digests. Fields missing from any
+        # bucket are built for all buckets that miss any of them, in one
+        # pass (rebuilding an existing digest only replaces it).
+        #
+        built = set(
+            self.cache.execute(
+                "SELECT bucket, field FROM quantile_built WHERE tablename = ? AND bucket >= ? AND bucket < ?",
+                (self.do.table, first, last)
+            )
+        )
+        missing = [
+            (b, col.name) for b in range(first, last, self.bucket_len)
+            for col in self.columns if (b, col.name) not in built
+        ]
+        fields = set(name for _, name in missing)
+        self.build(
+            sorted(set(b for b, _ in missing)),
+            [col for col in self.columns if col.name in fields]
+        )
+
+        #
+        # Merge stored digests (collect centroids, compress once per field)
+        #
+        sql = "SELECT field, sketch FROM quantile_sketch WHERE tablename = ? AND bucket >= ? AND bucket < ?"
+        bvars = [self.do.table, first, last]
+        if self.do.args.session_id:
+            sql += " AND session_id = ?"
+            bvars.append(self.do.args.session_id)
+        for field, blob in self.cache.execute(sql, bvars):
+            if field in result:
+                result[field].merge(TDigest.from_bytes(blob, self.compression))
+
+        #
+        # Partial buckets at the edges
+        #
+        if begin < first:
+            add_raw(begin, first)
+        if last <= end:
+            add_raw(last, end + 1)
+        return result
+
+
+# EOF
@@ -0,0 +1,215 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# Multi-resolution spectrogram tile pyramid
+#
+# Tiles.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#
+#
+#   SpectrogramTiles
+#
+#       Precomputed spectrogram tiles, stored in the local cache database
+#       (api.cache_db()). Tile at 'level' has time resolution of 2**level
+#       seconds and TILE_BINS (default 256) time bins, so that tile 'index'
+#       covers timestamps
+#
+#           index * TILE_BINS * 2**level ... (index + 1) * TILE_BINS * 2**level - 1
+#
+#       Each tile holds, for every time bin, counts of all 27 counters summed
+#       over the spinning sectors (1 ... 36) and the number of rotations.
+#       Channel selection and the per-rotation mean are applied when a tile
+#       is served, so one stored tile serves all channel selections.
+#
+#       Tiles at the base level (TILE_BASE_LEVEL, default 4 = 16 seconds,
+#       roughly one rotation) are accumulated from hitcount rotations; missing
+#       base tiles are built with one streamed pass per contiguous run. Tiles
+#       of coarser levels are composed from their two children at the level
+#       below (pairs of bins summed), so each rotation is read from the
+#       database only once and zooming out never re-reads raw data.
+#
+#       Invalidation
+#
+#       Tile is stored with the newest data timestamp at the time it was
+#       built. Tiles that extend beyond that timestamp are incomplete and are
+#       deleted (at all levels) as soon as newer rotations appear. Complete
+#       tiles are never rebuilt. Tiles entirely outside the data range are
+#       not stored at all.
+#
+import numpy
+
+from application        import app
+from .                  import cache_db
+
+
+class SpectrogramTiles:
+
+    # Table for the local cache database
+    schema = (
+        """
+        CREATE TABLE IF NOT EXISTS spectrogram_tile
+        (
+            bins            INTEGER     NOT NULL,
+            level           INTEGER     NOT NULL,
+            tile            INTEGER     NOT NULL,
+            newest          INTEGER     NOT NULL,
+            complete        INTEGER     NOT NULL,
+            rotations       BLOB        NOT NULL,
+            sums            BLOB        NOT NULL,
+            PRIMARY KEY (bins, level, tile)
+        )
+        """,
+    )
+
+    def __init__(self, hitcount, counters):
+        """Tiles for 'hitcount' (api.HitCount.HitCount) object, holding 'counters' (number of counters per sector)."""
+        self.hitcount   = hitcount
+        self.counters   = counters
+        self.bins       = int(app.config.get('TILE_BINS', 256))
+        self.base_level = int(app.config.get('TILE_BASE_LEVEL', 4))
+        self.max_level  = int(app.config.get('TILE_MAX_LEVEL', 24))
+        self.cache      = cache_db()
+        for sql in self.schema:
+            self.cache.execute(sql)
+        self.oldest, self.newest = hitcount.timestamp_range()
+
+
+    def span(self, level, index):
+        """Return (begin, end) timestamps (inclusive) covered by tile."""
+        length = self.bins * 2 ** level
+        return index * length, (index + 1) * length - 1
+
+
+    def invalidate(self):
+        """Delete incomplete tiles that were built before the newest data."""
+        if self.newest is None:
+            return
+        cursor = self.cache.execute(
+            "DELETE FROM spectrogram_tile WHERE complete = 0 AND newest < ?",
+            (self.newest,)
+        )
+        if cursor.rowcount:
+            self.cache.commit()
+
+
+    def empty(self):
+        return (
+            numpy.zeros(self.bins, dtype = numpy.int64),
+            numpy.zeros((self.bins, self.counters))
+        )
+
+
+    def load(self, level, index):
+        row = self.cache.execute(
+            "SELECT rotations, sums FROM spectrogram_tile WHERE bins = ? AND level = ? AND tile = ?",
+            (self.bins, level, index)
+        ).fetchone()
+        if row is None:
+            return None
+        return (
+            numpy.frombuffer(row[0], dtype = '<i8'),
+            numpy.frombuffer(row[1], dtype = '<f8').reshape(self.bins, self.counters)
+        )
+
+
+    def store(self, level, index, rotations, sums):
+        self.cache.execute(
+            "INSERT OR REPLACE INTO spectrogram_tile VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.bins,
+                level,
+                index,
+                self.newest,
+                int(self.span(level, index)[1] <= self.newest),
+                rotations.astype('<i8').tobytes(),
+                sums.astype('<f8').tobytes()
+            )
+        )
+
+
+    def outside(self, level, index):
+        """True if tile does not overlap the data range."""
+        begin, end = self.span(level, index)
+        return self.newest is None or end < self.oldest or begin > self.newest
+
+
+    def build_base(self, first, last):
+        """Build missing base level tiles first ... last - 1 (within the data range)."""
+        lo, hi = self.span(self.base_level, 0)
+        length = hi - lo + 1
+        first  = max(first, self.oldest // length)
+        last   = min(last, self.newest // length + 1)
+        if first >= last:
+            return
+        built = set(
+            row[0] for row in self.cache.execute(
+                "SELECT tile FROM spectrogram_tile WHERE bins = ? AND level = ? AND tile >= ? AND tile < ?",
+                (self.bins, self.base_level, first, last)
+            )
+        )
+        missing = [i for i in range(first, last) if i not in built]
+        chunk   = int(app.config.get('TILE_BUILD_CHUNK', 64))
+        channels  = [(None, None, i) for i in range(self.counters)]
+        resolution = 2 ** self.base_level
+        #
+        # Contiguous runs of missing tiles, at most 'chunk' tiles per pass
+        #
+        runs = []
+        for i in missing:
+            if runs and runs[-1][1] == i and runs[-1][1] - runs[-1][0] < chunk:
+                runs[-1][1] = i + 1
+            else:
+                runs.append([i, i + 1])
+        for start, stop in runs:
+            sums, rotations = self.hitcount.accumulate(
+                self.span(self.base_level, start)[0],
+                resolution,
+                (stop - start) * self.bins,
+                self.hitcount.selected_sectors(),
+                channels,
+                'sum'
+            )
+            sums      = sums.reshape(stop - start, self.bins, self.counters)
+            rotations = rotations.reshape(stop - start, self.bins)
+            for n, index in enumerate(range(start, stop)):
+                self.store(self.base_level, index, rotations[n], sums[n])
+        self.cache.commit()
+
+
+    def compose(self, level, index):
+        """Return (rotations, sums) of a tile, building it (and any missing tiles below it) as needed."""
+        if self.outside(level, index):
+            return self.empty()
+        tile = self.load(level, index)
+        if tile is not None:
+            return tile
+        if level == self.base_level:
+            self.build_base(index, index + 1)
+            return self.load(level, index) or self.empty()
+        halves = [self.compose(level - 1, 2 * index + n) for n in (0, 1)]
+        rotations = numpy.concatenate(
+            [r.reshape(-1, 2).sum(axis = 1) for r, _ in halves]
+        )
+        sums = numpy.concatenate(
+            [s.reshape(-1, 2, self.counters).sum(axis = 1) for _, s in halves]
+        )
+        self.store(level, index, rotations, sums)
+        return rotations, sums
+
+
+    def tile(self, level, index):
+        """Return (rotations, sums) arrays of a tile, shaped (bins,) and (bins, counters)."""
+        self.invalidate()
+        if not self.outside(level, index) and level > self.base_level:
+            # Build all missing base tiles below this tile in as few passes as possible
+            scale = 2 ** (level - self.base_level)
+            self.build_base(index * scale, (index + 1) * scale)
+        rotations, sums = self.compose(level, index)
+        self.cache.commit()
+        return rotations, sums
+
+
+# EOF
@@ -13,6 +13,27 @@
 #   0.3.0   2018.10.29  Enhanced Flask.Response creation.
 #   0.4.0   2018.11.04  Changes for CSV streaming support.
 #   0.4.1   2018.11.05  Documentation update.
+#   0.5.0   2026.10.19  Response encoder registry (JSON, MessagePack, CBOR).
+#   0.5.1   2026.10.19  DataObject.stats() (single pass descriptive statistics).
+#   0.5.2   2026.10.19  DataObject.quantile(), local cache database.
+#   0.5.3   2026.10.19  Grouped statistics, DataObject.compare().
+#   0.5.4   2026.10.19  api.binary_response() for typed array payloads.
+#   0.5.5   2026.10.19  api.stream_rows_as_csv(), CSV stream owns the connection.
+#   0.5.6   2026.10.19  DataObject.latest() with per-process memo.
+#   0.5.7   2026.10.19  Hot-tail buffer searches, api.metrics counters.
+#   0.5.8   2026.10.19  api.prepared_response() for pre-encoded payloads.
+#   0.5.9   2026.10.19  api.coalesced_response(), single-flight GET requests.
+#   0.5.10  2026.10.19  api.ArgumentRequest, 'Allow' header values cached per rule.
+#   0.5.11  2026.10.19  Declarative request argument schema (api.ArgumentSchema).
+#   0.5.12  2026.10.19  Immutable __slots__ column descriptors, cached table layouts.
+#   0.5.13  2026.10.19  DataObject.rowid_range, rowid bounded .query() (sharded exports).
+#   0.5.14  2026.10.19  Pipelined CSV streams (api.RowPipeline producer thread).
+#   0.5.15  2026.10.19  DataObject.paged_query(), short keyset bounded read transactions.
+#   0.5.16  2026.10.19  Per endpoint query time budget (api.QueryBudget).
+#   0.5.17  2026.10.19  DataObject.stats() in column chunks, shifted variance sums.
+#   0.5.18  2026.10.19  'group_by' validated in DataObject.parse_arguments().
+#   0.5.19  2026.10.19  api.csv_error_response() for CSV routes.
+#   0.5.20  2026.10.19  DataObject.latest() memo invalidated by api.DatabaseVersion poller.
 #
 #
 #   Module for PATE Monitor Resource Objects/Classes and API
@@ -29,6 +50,32 @@
 #       into a Flask.Response object (which is the expected return type
 #       for route handles).
 #
+#       Payload is serialized by the encoder that best matches request's
+#       'Accept' header (see "Response encoders" below). JSON is the default.
+#
+#       api.prepared_response()
+#
+#       Turns a dictionary of payloads already encoded by every registered
+#       encoder ({mimetype : bytes}) into a Flask.Response. Used for
+#       snapshots that are built once and served many times.
+#
+#       api.coalesced_response()
+#
+#       As api.response(), but identical concurrent requests (same path,
+#       arguments and negotiated mimetype) share one computation and its
+#       serialized result (see "Single-flight requests" below).
+#
+#       api.csv_error_response()
+#
+#       Turns an exception raised by a CSV route into a plain text error
+#       response (ApiException and query time budget aborts only).
+#
+#       api.binary_response()
+#
+#       Turns (header:dict, array:numpy.ndarray) into a Flask.Response that
+#       carries the array as little-endian typed array, prefixed with a small
+#       JSON header. Intended for large numeric matrices (spectrograms).
+#
 #   Resource Objects/Classes
 #
 #       Objects may implement following public JSON CRUD functions:
@@ -43,6 +90,11 @@
 #       DataObjects may also implement a CSV extraction method by means of
 #       .query() -> SQLite.Cursor method and
 #       api.stream_result_as_csv(result:SQLite.Cursor)
+#       (or api.stream_rows_as_csv(columns:list, rows:iterable) for rows
+#       that are not a plain query result).
+#       Rows are fetched by a producer thread (api.RowPipeline) in batches
+#       of STREAM_BATCH_ROWS (default 256), at most STREAM_QUEUE_DEPTH
+#       (default 4) batches ahead of the CSV encoding.
 #       Implementation belongs into the 'route.py':
 #
 #       @app.route('/csv/classifieddata', methods=['GET'])
@@ -67,12 +119,119 @@
 
 import time
 import json
+import sqlite3
+import functools
+import threading
+import collections
 
 from flask          import request
 from flask          import g
+from werkzeug.datastructures import ImmutableMultiDict
 from application    import app
 
 
+###############################################################################
+#
+# Request argument schema
+#
+#   Resource classes declare their request arguments as a class variable:
+#
+#       argument_schema = ArgumentSchema(
+#           ('fields',      field_list),
+#           ('begin',       int),
+#           ('class',       lowercase,  'particle'),
+#           ...
+#       )
+#
+#   Each argument is (name, converter) or (name, converter, attribute); the
+#   converted value is stored as 'attribute' (default: same as name).
+#   Converters receive the (non-empty) argument string. Schema is compiled
+#   into a dictionary once, when the class is defined.
+#
+#   ArgumentSchema.parse(request.args) -> ArgumentDict
+#       Every declared attribute is present; missing or empty arguments are
+#       None. Undeclared arguments raise InvalidArgument ("Unsupported
+#       argument"), converter failures InvalidArgument ("Parameter parsing
+#       failed!").
+#
+#   DataObject.parse_arguments(request) does the above for self.argument_schema
+#   and also validates 'fields' against the table columns.
+#
+class ArgumentDict(dict):
+    """dot.notation access to dictionary attributes"""
+    __getattr__ = dict.get
+    __setattr__ = dict.__setitem__
+    __delattr__ = dict.__delitem__
+    def __missing__(self, key):
+        """Return None if non-existing key is accessed"""
+        return None
+
+
+@functools.lru_cache(maxsize = 256)
+def split_fields(value):
+    """Comma separated field names as a tuple (cached by argument string)."""
+    return tuple(value.split(','))
+
+def field_list(value):
+    """Comma separated names into a list."""
+    return list(split_fields(value))
+
+def integer_list(value):
+    """Comma separated integers into a list."""
+    return [int(x) for x in value.split(',')]
+
+def float_list(value):
+    """Comma separated numbers into a list of floats."""
+    return [float(x) for x in value.split(',')]
+
+def lowercase(value):
+    return value.lower()
+
+
+class ArgumentSchema:
+
+    def __init__(self, *arguments):
+        """Compile (name, converter[, attribute]) tuples."""
+        self.arguments = {}
+        for argument in arguments:
+            name, converter = argument[0], argument[1]
+            attribute = argument[2] if len(argument) > 2 else name
+            self.arguments[name] = (attribute, converter)
+        self.attributes = tuple(
+            attribute for attribute, _ in self.arguments.values()
+        )
+
+
+    def __iter__(self):
+        """Iterate accepted argument names."""
+        return iter(self.arguments)
+
+
+    def parse(self, args):
+        """Convert request arguments (MultiDict) into ArgumentDict."""
+        result = ArgumentDict.fromkeys(self.attributes)
+        if not args:
+            return result
+        for key in args.keys():
+            if key not in self.arguments:
+                raise InvalidArgument(
+                    "Unsupported argument '{}'".format(key)
+                )
+        try:
+            for key, value in args.items():
+                if value:
+                    attribute, converter = self.arguments[key]
+                    result[attribute] = converter(value)
+        except Exception as e:
+            raise InvalidArgument(
+                "Parameter parsing failed!",
+                str(e)
+            ) from None
+        return result
+
+
+
+
 ###############################################################################
 #
 # DataObject class (SQLite3 utilities)
@@ -89,69 +248,164 @@ from application    import app
 #       except the columns that were specified in 'exclude' list during
 #       initialization.
 #
-#   DataObject().keys: list
+#   DataObject().primarykeys: list
 #       List of primary key columns in the <table>.
 #
+#   DataObject().column(name: str) -> DataObject.Column
+#       Column descriptor by name (None if no such column).
+#
+#   DataObject().layout: DataObject.Layout
+#       Column descriptors ('columns'), 'names', name lookup ('by_name'),
+#       primary key names and numeric non-key columns as tuples. Layouts
+#       are read once per process and table, and re-read when the database
+#       schema_version changes.
+#
 #   DataObject().select_columns(exclude: list) -> str
 #       Returns a string for SELECT clause where special formatting is
 #       applied to datatypes that need it (namely, TIMESTAMP and DATETIME).
 #       Optional exclude list may be supplied for columns that are not
 #       needed among selected items.
 #
+#   DataObject().parse_arguments(request)
+#       Parse request arguments with the class variable 'argument_schema'
+#       into self.args and verify that requested 'fields' exist and that
+#       'group_by' (if any) is 'session_id'.
+#
 #   DataObject().where_condition(column: str) -> str
 #       Parse needed conversions and casts according to the datatype.
 #
+#   DataObject().timestamp_range() -> (oldest:int, newest:int):tuple
+#       Timestamps of the oldest and the newest rows in the table.
+#
+#   DataObject().search_conditions() -> list
+#       WHERE conditions for the common time-series request arguments
+#       ('timestamp', 'begin', 'end', 'session_id') found in self.args.
+#
+#   DataObject().rowid_bounds() -> (first:int, last:int):tuple
+#       Smallest and largest rowid of the table. If 'rowid_range' is set
+#       to (first, last), .query() is limited to that rowid range
+#       (DataObject().rowid_condition()).
+#
+#   DataObject().paged_query() -> (columns:list, rows:generator):tuple
+#       As .query(), but executed as a sequence of short queries, each for
+#       STREAM_PAGE_ROWS (default 2000) consecutive rowids, up to the
+#       largest rowid at the time of the call. Each page is read in full
+#       before the next one is executed, so no read transaction stays
+#       open for the duration of a long stream and WAL checkpoints can
+#       proceed.
+#
+#   DataObject().stats() -> (code:int, payload:dict):tuple
+#       Count, sum, min, max, mean, variance and standard deviation of
+#       numeric columns, computed with one table scan per
+#       STATS_CHUNK_COLUMNS (default 300) columns.
+#
+#   DataObject().quantile() -> (code:int, payload:dict):tuple
+#       Quantiles (self.args.q) of numeric columns. Exact for short ranges,
+#       estimated from stored t-digest sketches for long ranges.
+#
+#   DataObject().compare() -> (code:int, payload:dict):tuple
+#       Aggregate values per testing session, their differences and ratios
+#       against a baseline session.
+#
+#   DataObject().data_version() -> int
+#       Largest rowid of the table. Changes whenever rows are inserted.
+#
+#   DataObject().latest() -> (code:int, payload:dict):tuple
+#       Newest self.args.n rows (ORDER BY timestamp DESC LIMIT n), memoized
+#       per process until api.DatabaseVersion changes.
+#
+#   DataObject().search_hot_tail() -> list | None
+#       Search request result from the in-memory buffer of recent rows
+#       (api/HotTail.py), or None if it cannot be served from there.
+#
 #   NOTE:
 #   SQLite natively supports only the types TEXT, INTEGER, REAL, BLOB and NULL.
 #
 class DataObject(list):
-    # class Column:
-    #     __slots__ = ('name', 'datatype', 'nullable', 'default', 'primarykey')
-    #     def __init__(
-    #         self,
-    #         name,
-    #         datatype,
-    #         nullable,
-    #         default,
-    #         primarykey
-    #     ):
-    #         self.name       = name
-    #         self.datatype   = datatype
-    #         self.nullable   = nullable
-    #         self.default    = default
-    #         self.primarykey = primarykey
-
-    class DotDict(dict):
-        """dot.notation access to dictionary attributes"""
-        __getattr__ = dict.get
-        __setattr__ = dict.__setitem__
-        __delattr__ = dict.__delitem__
-        def __missing__(self, key):
-            """Return None if non-existing key is accessed"""
-            return None
+
+    class Column:
+        """Immutable column descriptor."""
+        __slots__ = ('name', 'datatype', 'nullable', 'default', 'primarykey', 'position')
+        def __init__(
+            self,
+            name,
+            datatype,
+            nullable,
+            default,
+            primarykey,
+            position
+        ):
+            setattr_ = object.__setattr__
+            setattr_(self, 'name',       name)
+            setattr_(self, 'datatype',   datatype)
+            setattr_(self, 'nullable',   nullable)
+            setattr_(self, 'default',    default)
+            setattr_(self, 'primarykey', primarykey)
+            setattr_(self, 'position',   position)
+        def __setattr__(self, name, value):
+            raise AttributeError("Column descriptors are immutable")
         def __str__(self):
-            return self.getattr('name', '(null)')
+            return self.name
+        def __repr__(self):
+            return "Column({!r}, {!r})".format(self.name, self.datatype)
+
+    class Layout:
+        """Column descriptors of a table and the lookups derived from them."""
+        __slots__ = ('version', 'columns', 'names', 'by_name', 'primarykeys', 'numeric')
+        def __init__(self, version, columns):
+            self.version     = version
+            self.columns     = columns
+            self.names       = tuple(col.name for col in columns)
+            self.by_name     = {col.name : col for col in columns}
+            self.primarykeys = tuple(col.name for col in columns if col.primarykey)
+            self.numeric     = tuple(
+                col for col in columns
+                if not col.primarykey and col.datatype in ('INTEGER', 'REAL')
+            )
+
+    # Per process, {(table, excluded columns) : DataObject.Layout}
+    layouts = {}
+
+    # Optional (first, last) rowid bounds for .query(). Used by sharded
+    # exports (api/Export.py) to split one query into independent ranges.
+    rowid_range = None
 
     def __init__(self, cursor, table, exclude = []):
-        # pragma_table_info() columns:
-        # cid           Column ID number
-        # name          Column name
-        # type          INTEGER | DATETIME | ...
-        # notnull       1 = NOT NULL, 0 = NULL
-        # dflt_value    Default value
-        # pk            1 = PRIMARY KEY, 0 = not
-        cursor.execute("SELECT * FROM pragma_table_info('{}')".format(table))
-        for row in cursor:
-            if row[1] not in exclude:
-                self.append(
-                    self.DotDict(
-                        name        = row[1],
-                        datatype    = row[2],
-                        nullable    = True if row[3] == 0 else False,
-                        default     = row[4],
-                        primarykey  = True if row[5] == 1 else False
+        #
+        # Column metadata is read once per process and re-read only if the
+        # database schema has changed (PRAGMA schema_version).
+        #
+        cursor.execute("PRAGMA schema_version")
+        version = cursor.fetchone()[0]
+        key     = (table, tuple(exclude))
+        layout  = DataObject.layouts.get(key)
+        if layout is None or layout.version != version:
+            # pragma_table_info() columns:
+            # cid           Column ID number
+            # name          Column name
+            # type          INTEGER | DATETIME | ...
+            # notnull       1 = NOT NULL, 0 = NULL
+            # dflt_value    Default value
+            # pk            1 = PRIMARY KEY, 0 = not
+            cursor.execute("SELECT * FROM pragma_table_info('{}')".format(table))
+            columns = []
+            for row in cursor:
+                if row[1] not in exclude:
+                    columns.append(
+                        self.Column(
+                            name        = row[1],
+                            datatype    = row[2],
+                            nullable    = True if row[3] == 0 else False,
+                            default     = row[4],
+                            primarykey  = True if row[5] == 1 else False,
+                            position    = len(columns)
+                        )
                     )
-                )
+            layout = self.Layout(version, tuple(columns))
+            DataObject.layouts[key] = layout
+        self.extend(layout.columns)
+        self.layout = layout
+        self.table = table
         # Get active session_id or None
         app.logger.critical("Fix to REAL session mgmt!!")
         cursor.execute("SELECT max(id) FROM testing_session")
@@ -161,25 +415,44 @@ class DataObject(list):
     @property
     def columns(self):
         """Returns a list of column names."""
-        return [col.name for col in self]
+        return list(self.layout.names)
 
 
     @property
     def primarykeys(self):
         """Returns a list of primary key columns."""
-        return [col.name for col in self if col.primarykey]
+        return list(self.layout.primarykeys)
+
+
+    def column(self, name):
+        """Return column object by name, or None if no such column."""
+        return self.layout.by_name.get(name)
 
 
     def missing_columns(self, columns):
-        """Returns False if provided list of column names contain any that do not exist in the database table."""
+        """Returns a list of those provided column names that do not exist in the database table."""
         if not columns:
             return []
-        existing = self.columns
-        missing = []
-        for column in columns:
-            if column not in existing:
-                missing.append(column)
-        return missing
+        existing = self.layout.by_name
+        return [column for column in columns if column not in existing]
+
+
+    def parse_arguments(self, request):
+        """Parse request arguments into self.args according to self.argument_schema. Raises InvalidArgument for unsupported or malformed arguments, for non-existent 'fields' and for 'group_by' other than 'session_id'."""
+        self.args = self.argument_schema.parse(request.args)
+        missing = self.missing_columns(self.args.fields)
+        if missing:
+            raise InvalidArgument(
+                "Non-existent fields defined!",
+                "Field(s) " + ",".join(missing) + " do not exist!"
+            )
+
+        # Only grouping by testing session is supported
+        if self.args.group_by and self.args.group_by != 'session_id':
+            raise InvalidArgument(
+                "Unsupported 'group_by' value '{}'!".format(self.args.group_by),
+                "Only 'session_id' grouping is supported."
+            )
 
 
     def get_column_objects(
@@ -188,7 +461,7 @@ class DataObject(list):
         exclude = [],
         include_primarykeys = True
     ):
-        """Get a list of column objects.
+        """Get a list of column objects, in table order.
 
         All arguments are optional.
         include - list of column names to include
@@ -198,23 +471,25 @@ class DataObject(list):
         If optional 'include' list can be provided, the result list to specified. However, if 'include_primary_keys' is True, the parsed string will always contain also the primary key columns - even if they are not defined in the 'include' and excluded in the 'exclude' list.
         
         If a column is defined in both 'include' and 'exclude', exclude list will take precedence and column is not included. Only exception to this rule are primary key columns (when 'include_primarykeys' is True)."""
+        layout  = self.layout
+        exclude = set(exclude)
         # Purge primary keys from exclude list, if 'include_primarykeys'
         if exclude and include_primarykeys:
-            exclude = [col for col in exclude if col not in self.primarykeys]
-        # Compile list of column objects/dicts
+            exclude.difference_update(layout.primarykeys)
+        # Compile list of column objects
         if not include:
             # empty 'include' equals ALL fields (except 'excluded')
-            flist = [col for col in self if col.name not in exclude]
-        else:
-            flist = []
-            for col in self:
-                app.logger.debug(col.name)
-                if col.primarykey and include_primarykeys:
-                    # Forced inclusion for pk
-                    flist.append(col)
-                elif col.name in include and col.name not in exclude:
-                    flist.append(col)
-        return flist
+            if not exclude:
+                return list(layout.columns)
+            return [col for col in layout.columns if col.name not in exclude]
+        selected = {
+            layout.by_name[name] for name in include
+            if name in layout.by_name and name not in exclude
+        }
+        if include_primarykeys:
+            # Forced inclusion for pk
+            selected.update(layout.by_name[name] for name in layout.primarykeys)
+        return sorted(selected, key = lambda col: col.position)
 
 
     def get_column_names(
@@ -247,20 +522,7 @@ class DataObject(list):
         """Provide datatype specific formatting for SQL queries. Optional 'include' list can be provided, limiting the parsing to specified. However, if 'include_primary_keys' is True, the parsed string will always contain also the primary key columns - even if they are not defined in the 'include' and excluded in the 'exclude' list.
         
         If a column is defined in both 'include' and 'exclude', exclude list will take precedence and column is not included. Only exception to this rule are primary key columns (when 'include_primarykeys' is True)."""
-        # Purge primary keys from exclude list, if 'include_primarykeys'
-        if exclude and include_primarykeys:
-            exclude = [col for col in exclude if col not in self.primarykeys]
-        # Compile list of column objects/dicts
-        if not include:
-            # empty 'include' equals ALL fields (except 'excluded')
-            flist = [col for col in self if col.name not in exclude]
-        else:
-            flist = []
-            for col in self:
-                if col.primarykey and include_primarykeys:
-                    flist.append(col)
-                elif col.name in include and col.name not in exclude:
-                    flist.append(col)
+        flist = self.get_column_objects(include, exclude, include_primarykeys)
 
         slist = []
         # NOTE: Fractional timestamp (Warning - fractional inaccuracy!)
@@ -284,11 +546,7 @@ class DataObject(list):
 
     def where_condition(self, column):
         """Return formatting for condition column based on datatype."""
-        col = None
-        for c in self:
-            if c.name == column:
-                col = c
-                break
+        col = self.layout.by_name.get(column)
         if not col:
             raise ValueError("Non-existent column specified")
         # return suitable conversion
@@ -300,12 +558,747 @@ class DataObject(list):
             return "{}".format(col.name)
 
 
+    def search_conditions(self):
+        """Return a list of WHERE conditions for time-series search arguments ('timestamp', 'begin', 'end' and 'session_id') in self.args. Fetch request ('timestamp') ignores other conditions. Conditions use named parameters, bind self.args when executing."""
+        conditions = []
+        if self.args.timestamp:
+            conditions.append(
+                self.where_condition('timestamp') + " = :timestamp"
+            )
+        else:
+            if self.args.begin:
+                conditions.append(
+                    self.where_condition('timestamp') + " >= :begin"
+                )
+            if self.args.end:
+                conditions.append(
+                    self.where_condition('timestamp') + " <= :end"
+                )
+            if self.args.session_id:
+                conditions.append("session_id = :session_id")
+        return conditions
+
+
+    def rowid_condition(self):
+        """Return WHERE condition for self.rowid_range and bind its values into self.args."""
+        self.args['rowid_first'], self.args['rowid_last'] = self.rowid_range
+        return "rowid BETWEEN :rowid_first AND :rowid_last"
+
+
+    def rowid_bounds(self):
+        """Return (first, last) rowid of the table, or (None, None) if the table is empty."""
+        self.cursor.execute(
+            "SELECT (SELECT min(rowid) FROM {0}), (SELECT max(rowid) FROM {0})"
+            .format(self.table)
+        )
+        return self.cursor.fetchone()
+
+
+    def paged_query(self):
+        """Execute .query() as a sequence of short rowid bounded queries, up to the current largest rowid (high-water mark). Returns (columns:list, rows:generator) tuple."""
+        first, last = self.rowid_bounds()
+        page = max(1, int(app.config.get('STREAM_PAGE_ROWS', 2000)))
+        # Prepare the statement (and its bindings) with an empty rowid range
+        self.rowid_range = (0, -1)
+        cursor   = self.query()
+        columns  = [c[0] for c in cursor.description]
+        sql      = self.sql
+        bindings = dict(self.args)
+
+        def rows():
+            if first is None:
+                return
+            for lo in range(first, last + 1, page):
+                bindings['rowid_first'] = lo
+                bindings['rowid_last']  = min(lo + page - 1, last)
+                # fetchall() completes the statement, which ends its read
+                # transaction before the rows are passed on
+                yield from cursor.execute(sql, bindings).fetchall()
+
+        return columns, rows()
+
+
+    def timestamp_range(self):
+        """Return (oldest, newest) timestamps (Unix timestamps) in the table, or (None, None) if the table is empty. Separate min() and max() subqueries are used, because SQLite answers each with an index seek."""
+        self.cursor.execute(
+            "SELECT CAST(strftime('%s', (SELECT min(timestamp) FROM {0})) as integer), "
+            "CAST(strftime('%s', (SELECT max(timestamp) FROM {0})) as integer)"
+            .format(self.table)
+        )
+        return self.cursor.fetchone()
+
+
+    def numeric_columns(self):
+        """Return a list of numeric (INTEGER, REAL) non-key column objects listed in self.args.fields (all, if not specified). Column 'session_id' is never included."""
+        if not self.args.fields:
+            return [
+                col for col in self.layout.numeric if col.name != 'session_id'
+            ]
+        return [
+            col for col in self.get_column_objects(
+                include = self.args.fields,
+                exclude = ['session_id'],
+                include_primarykeys = False
+            )
+            if col.datatype in ('INTEGER', 'REAL')
+        ]
+
+
+    def stats(self):
+        """Descriptive statistics for numeric (INTEGER, REAL) columns listed in self.args.fields (all, if not specified). Returns (code:int, payload:dict):tuple with one object per field:
+        {
+            "count"     : (int),    non-NULL values
+            "sum"       : (number),
+            "min"       : (number),
+            "max"       : (number),
+            "mean"      : (float),
+            "variance"  : (float),  sample variance (n - 1)
+            "stddev"    : (float)
+        }
+
+        With self.args.group_by ('session_id'), a list of such objects is returned, one per group and each including the group column.
+
+        Basic aggregates are computed by SQLite, with a table scan per STATS_CHUNK_COLUMNS (default 300) fields; SQLite allows at most 2000 aggregate terms per statement. Each column's aggregates are packed into one JSON array, because six result columns per field would exceed SQLITE_MAX_COLUMN (2000) for 'hitcount'. Sums for the variance are taken around a per column reference value (the first selected row), so that large offsets do not cancel out the precision. Moments that SQLite lacks (mean, variance, stddev) are then derived vectorised with NumPy, for all fields at once. Requires SQLite with JSON1 extension (built-in since 3.38)."""
+        import numpy
+        cols = self.numeric_columns()
+        if not cols:
+            raise InvalidArgument(
+                "No numeric fields selected!",
+                "Statistics can be calculated only for INTEGER and REAL fields."
+            )
+
+        group_by   = self.args.group_by
+        conditions = self.search_conditions()
+        where      = " WHERE " + " AND ".join(conditions) if conditions else ""
+        chunk      = max(1, int(app.config.get('STATS_CHUNK_COLUMNS', 300)))
+
+        def execute(sql, bindings):
+            try:
+                self.cursor.execute(sql, bindings)
+                return self.cursor.fetchall()
+            except:
+                app.logger.exception(
+                    "Query failure! SQL='{}', args='{}'"
+                    .format(sql, bindings)
+                )
+                raise
+
+        # Reference values (shift) for the sums of deviations
+        reference = execute(
+            "SELECT " + ", ".join(col.name for col in cols) +
+            " FROM " + self.table + where + " LIMIT 1",
+            self.args
+        )
+        reference = [
+            v if v is not None else 0 for v in
+            (reference[0] if reference else [None] * len(cols))
+        ]
+
+        # [[[count, sum, min, max, sum(x - ref), sum((x - ref)^2)], ...], ...]
+        statements = []
+        aggregates = None
+        groups     = None
+        for first in range(0, len(cols), chunk):
+            part = cols[first:first + chunk]
+            bindings = dict(self.args)
+            terms = []
+            for i, col in enumerate(part, first):
+                bindings['ref_{}'.format(i)] = reference[i]
+                terms.append(
+                    "json_array(count({0}), sum({0}), min({0}), max({0}), "
+                    "total({0} - :ref_{1}), total(({0} - :ref_{1}) * ({0} - :ref_{1})))"
+                    .format(col.name, i)
+                )
+            sql = "SELECT "
+            if group_by:
+                sql += group_by + ", "
+            sql += ", ".join(terms) + " FROM " + self.table + where
+            if group_by:
+                sql += " GROUP BY {0} ORDER BY {0}".format(group_by)
+            statements.append(sql)
+            rows = execute(sql, bindings)
+            if group_by:
+                groups = [row[0] for row in rows]
+                rows   = [row[1:] for row in rows]
+            # One JSON parse for all columns and groups of the chunk
+            parsed = json.loads(
+                "[" + ",".join("[" + ",".join(row) + "]" for row in rows) + "]"
+            )
+            if aggregates is None:
+                aggregates = parsed
+            else:
+                for merged, row in zip(aggregates, parsed):
+                    merged.extend(row)
+        self.sql = ";\n".join(statements)
+
+        # None (SQL NULL) becomes NaN
+        a   = numpy.array(aggregates, dtype = float).reshape(len(aggregates), len(cols), 6)
+        n   = a[:, :, 0]
+        d1  = a[:, :, 4]
+        d2  = a[:, :, 5]
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            mean     = numpy.array(reference, dtype = float) + d1 / n
+            # Rounding can leave tiny negative values for constant columns
+            variance = numpy.maximum(d2 - d1 * d1 / n, 0.0) / (n - 1)
+        variance[n < 2] = numpy.nan
+        stddev = numpy.sqrt(variance)
+
+        def value(v):
+            return None if numpy.isnan(v) else float(v)
+        results = []
+        for i_group in range(len(aggregates)):
+            result = {group_by : groups[i_group]} if group_by else {}
+            for i, col in enumerate(cols):
+                count, total, minimum, maximum, _, _ = aggregates[i_group][i]
+                result[col.name] = {
+                    "count"     : count,
+                    "sum"       : total,
+                    "min"       : minimum,
+                    "max"       : maximum,
+                    "mean"      : value(mean[i_group, i]),
+                    "variance"  : value(variance[i_group, i]),
+                    "stddev"    : value(stddev[i_group, i])
+                }
+            results.append(result)
+        # Grouped statistics are a list of objects, one per group
+        data = results if group_by else results[0]
+
+        fields = self.args.pop('fields', None)
+        if app.config.get("DEBUG", False):
+            return (
+                200,
+                {
+                    "data"          : data,
+                    "query" : {
+                        "sql"       : self.sql,
+                        "variables" : self.args,
+                        "fields"    : fields or "ALL"
+                    }
+                }
+            )
+        else:
+            return (200, {"data": data})
+
+
+    def quantile(self):
+        """Quantiles, listed in self.args.q (default: median), of numeric (INTEGER, REAL) columns listed in self.args.fields (all, if not specified). Returns (code:int, payload:dict):tuple with one object per field: {"<q>" : (float), ...}.
+
+        Ranges up to QUANTILE_EXACT_SECONDS (default: one day) are calculated exactly, by fetching the values into NumPy. Longer ranges are estimated from mergeable t-digest sketches, which are maintained per time bucket in the local cache database (see api/TDigest.py). Only the partial buckets at the edges of the range are read from the table."""
+        import numpy
+        import warnings
+        q = self.args.q or [0.5]
+        if self.args.group_by:
+            raise InvalidArgument(
+                "Argument 'group_by' is not supported for quantiles!"
+            )
+        if any(not 0.0 <= x <= 1.0 for x in q):
+            raise InvalidArgument(
+                "Invalid quantile specified!",
+                "Quantiles must be within [0.0, 1.0]."
+            )
+        cols = self.numeric_columns()
+        if not cols:
+            raise InvalidArgument(
+                "No numeric fields selected!",
+                "Quantiles can be calculated only for INTEGER and REAL fields."
+            )
+
+        oldest, newest = self.timestamp_range()
+        begin = self.args.begin or oldest or 0
+        end   = self.args.end   or newest or 0
+
+        if self.args.timestamp or \
+           end - begin <= int(app.config.get('QUANTILE_EXACT_SECONDS', 86400)):
+            method = "exact"
+            self.sql = "SELECT " + ", ".join(col.name for col in cols)
+            self.sql += " FROM " + self.table
+            conditions = self.search_conditions()
+            if conditions:
+                self.sql += " WHERE " + " AND ".join(conditions)
+            try:
+                self.cursor.execute(self.sql, self.args)
+            except:
+                app.logger.exception(
+                    "Query failure! SQL='{}', args='{}'"
+                    .format(self.sql, self.args)
+                )
+                raise
+            chunks = []
+            while True:
+                rows = self.cursor.fetchmany(4096)
+                if not rows:
+                    break
+                chunks.append(numpy.array(rows, dtype = float))
+            if chunks:
+                with warnings.catch_warnings():
+                    # All-NULL columns produce NaN (and a RuntimeWarning)
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    values = numpy.nanquantile(
+                        numpy.vstack(chunks), q, axis = 0
+                    ).T
+            else:
+                values = numpy.full((len(cols), len(q)), numpy.nan)
+        else:
+            from .TDigest import BucketSketches
+            method = "t-digest"
+            self.sql = None
+            digests = BucketSketches(self, cols).digests(begin, end, newest)
+            values = numpy.array([digests[col.name].quantile(q) for col in cols])
+
+        data = {
+            col.name : {
+                "{:g}".format(x) : None if numpy.isnan(v) else float(v)
+                for x, v in zip(q, values[i])
+            }
+            for i, col in enumerate(cols)
+        }
+
+        fields = self.args.pop('fields', None)
+        if app.config.get("DEBUG", False):
+            return (
+                200,
+                {
+                    "data"          : data,
+                    "method"        : method,
+                    "query" : {
+                        "sql"       : self.sql,
+                        "variables" : self.args,
+                        "fields"    : fields or "ALL"
+                    }
+                }
+            )
+        else:
+            return (200, {"data": data, "method": method})
+
+
+    def compare(self):
+        """Compare testing sessions. Aggregate function self.args.aggregate (default: 'avg') is calculated for each session listed in self.args.sessions (all sessions, if not specified) in one grouped pass. Differences (session - baseline) and ratios (session / baseline) against the baseline session (self.args.baseline, default: first session) are then calculated with NumPy, for all sessions and fields at once.
+
+        Returns (code:int, payload:dict):tuple. Results are columnar; each matrix has one row per session and one column per field:
+        {
+            "aggregate"     : (str),
+            "baseline"      : (int),
+            "sessions"      : [(int), ...],
+            "fields"        : [(str), ...],
+            "values"        : [[(float), ...], ...],
+            "difference"    : [[(float), ...], ...],
+            "ratio"         : [[(float), ...], ...]
+        }
+        Undefined values (no data, division by zero) are null."""
+        import numpy
+        aggregate = self.args.aggregate or 'avg'
+        if aggregate not in ('avg', 'sum', 'min', 'max', 'count'):
+            raise InvalidArgument(
+                "Unsupported aggregate function specified!",
+                "Aggregate function '{}' is not supported"
+                .format(aggregate)
+            )
+        if self.args.session_id:
+            raise InvalidArgument(
+                "Use 'sessions' argument to select compared sessions!"
+            )
+        cols = self.numeric_columns()
+        if not cols:
+            raise InvalidArgument(
+                "No numeric fields selected!",
+                "Sessions can be compared only by INTEGER and REAL fields."
+            )
+
+        self.sql = "SELECT session_id, "
+        self.sql += ", ".join(
+            "{0}({1}) AS {1}".format(aggregate, col.name) for col in cols
+        )
+        self.sql += " FROM " + self.table
+        conditions = self.search_conditions()
+        if self.args.sessions:
+            conditions.append(
+                "session_id IN ({})".format(
+                    ", ".join(str(int(s)) for s in self.args.sessions)
+                )
+            )
+        if conditions:
+            self.sql += " WHERE " + " AND ".join(conditions)
+        self.sql += " GROUP BY session_id ORDER BY session_id"
+        try:
+            self.cursor.execute(self.sql, self.args)
+            rows = self.cursor.fetchall()
+        except:
+            app.logger.exception(
+                "Query failure! SQL='{}', args='{}'"
+                .format(self.sql, self.args)
+            )
+            raise
+
+        sessions = [row[0] for row in rows]
+        baseline = self.args.baseline
+        if baseline is None:
+            baseline = (self.args.sessions or sessions or [None])[0]
+        if baseline not in sessions:
+            raise NotFound(
+                "Baseline session has no data!",
+                "Session '{}' has no rows in the requested range."
+                .format(baseline)
+            )
+
+        # sessions x fields matrix, None (SQL NULL) becomes NaN
+        values = numpy.array([row[1:] for row in rows], dtype = float)
+        base   = values[sessions.index(baseline)]
+        difference = values - base
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            ratio = values / base
+        ratio[~numpy.isfinite(ratio)] = numpy.nan
+
+        def matrix(a):
+            # NaN -> None, row by row
+            return [
+                [None if numpy.isnan(v) else v for v in row]
+                for row in a.tolist()
+            ]
+        data = {
+            "aggregate"     : aggregate,
+            "baseline"      : baseline,
+            "sessions"      : sessions,
+            "fields"        : [col.name for col in cols],
+            "values"        : matrix(values),
+            "difference"    : matrix(difference),
+            "ratio"         : matrix(ratio)
+        }
+
+        fields = self.args.pop('fields', None)
+        if app.config.get("DEBUG", False):
+            return (
+                200,
+                {
+                    "data"          : data,
+                    "query" : {
+                        "sql"       : self.sql,
+                        "variables" : self.args,
+                        "fields"    : fields or "ALL"
+                    }
+                }
+            )
+        else:
+            return (200, {"data": data})
+
+
+    def data_version(self):
+        """Return the largest rowid of the table (0 if empty). SQLite finds it from the end of the table b-tree, without a scan."""
+        self.cursor.execute(
+            "SELECT ifnull(max(rowid), 0) FROM {}".format(self.table)
+        )
+        return self.cursor.fetchone()[0]
+
+
+    def latest(self):
+        """Newest self.args.n rows (default: 1) of the table, optionally limited to self.args.session_id, with a descending index seek on the timestamp. Results are memoized in the process (api.latest_memo) and reused until api.DatabaseVersion changes; a memo hit does not query the database.
+
+        Returns newest row as an object, or if 'n' was given, a list of rows (newest first)."""
+        n = 1 if self.args.n is None else self.args.n
+        max_rows = int(app.config.get('LATEST_MAX_ROWS', 1000))
+        if not 0 < n <= max_rows:
+            raise InvalidArgument(
+                "Invalid number of rows 'n'!",
+                "Value must be between 1 and {}.".format(max_rows)
+            )
+        cols = self.get_column_objects(
+            include = self.args.fields or [],
+            exclude = ['session_id']
+        )
+        self.sql = "SELECT {} FROM {}".format(
+            ", ".join(self.select_typecast(col) for col in cols),
+            self.table
+        )
+        if self.args.session_id:
+            self.sql += " WHERE session_id = :session_id"
+        self.sql += " ORDER BY timestamp DESC LIMIT {}".format(n)
+
+        version = DatabaseVersion.current()
+        key     = (self.table, self.sql, self.args.session_id)
+        with latest_memo_lock:
+            memoized = latest_memo.get(key)
+        if memoized and memoized[0] == version:
+            rows = memoized[1]
+        else:
+            try:
+                self.cursor.execute(self.sql, self.args)
+            except:
+                app.logger.exception(
+                    "Query failure! SQL='{}', args='{}'"
+                    .format(self.sql, self.args)
+                )
+                raise
+            names = [d[0] for d in self.cursor.description]
+            rows  = [dict(zip(names, row)) for row in self.cursor]
+            with latest_memo_lock:
+                if len(latest_memo) >= int(app.config.get('LATEST_MEMO_SIZE', 256)):
+                    latest_memo.pop(next(iter(latest_memo)))
+                latest_memo[key] = (version, rows)
+
+        if self.args.n is not None:
+            data = rows
+        elif rows:
+            data = rows[0]
+        else:
+            raise NotFound(
+                "No rows in table '{}'!".format(self.table)
+            )
+
+        fields = self.args.pop('fields', None)
+        if app.config.get("DEBUG", False):
+            return (
+                200,
+                {
+                    "data"          : data,
+                    "query" : {
+                        "sql"       : self.sql,
+                        "variables" : self.args,
+                        "fields"    : fields or "ALL",
+                        "version"   : version
+                    }
+                }
+            )
+        else:
+            return (200, {"data": data})
+
+
+    def search_hot_tail(self):
+        """Return search result (list of dicts) from the hot-tail buffer (api/HotTail.py), if the request is a plain search whose 'begin' falls within the buffered window. Otherwise returns None and the request is to be served from the database."""
+        from .HotTail import HotTail
+        if self.args.timestamp or self.args.group_by or \
+           self.args.begin is None or not HotTail.enabled(self.table):
+            return None
+        result = HotTail.of(self).search(self)
+        if result is not None:
+            self.sql = "(hot-tail buffer)"
+        return result
+
+
     def __str__(self):
         return "\n".join([str(c) for c in self])
 
 
 
 
+#
+# api.latest_memo
+#
+#   Per-process memo of DataObject.latest() results,
+#   {(table, sql, session_id) : (version, rows)}. Entries are replaced when
+#   api.DatabaseVersion changes; oldest entries are evicted when
+#   LATEST_MEMO_SIZE (default 256) is reached.
+#
+latest_memo      = {}
+latest_memo_lock = threading.Lock()
+
+
+#
+# api.DatabaseVersion
+#
+#   Per-process counter of database changes. A background thread polls
+#   'PRAGMA data_version' on a connection of its own every
+#   DATABASE_VERSION_POLL_INTERVAL (default 0.5) seconds and increments the
+#   counter whenever another connection has committed (INSERT, UPDATE and
+#   DELETE alike). Reading the counter does not touch the database, so
+#   results keyed to it may lag behind a commit by one poll interval.
+#
+#   The thread is started by the first call in each worker process
+#   (threads do not survive uWSGI's fork). Starting it also increments the
+#   counter, as changes made before it are not known.
+#
+class DatabaseVersion:
+
+    lock    = threading.Lock()
+    thread  = None
+    pid     = None
+    counter = 0
+
+    @classmethod
+    def current(cls):
+        """Return the database change counter of this process, starting the poller thread if necessary."""
+        import os
+        if cls.thread is None or cls.pid != os.getpid() or \
+           not cls.thread.is_alive():
+            with cls.lock:
+                if cls.thread is None or cls.pid != os.getpid() or \
+                   not cls.thread.is_alive():
+                    monitor = sqlite3.connect(
+                        app.config.get('SQLITE3_DATABASE_FILE', 'pmapi.sqlite3'),
+                        check_same_thread = False
+                    )
+                    # Baseline is read before the counter is published
+                    version = monitor.execute("PRAGMA data_version").fetchone()[0]
+                    cls.counter += 1
+                    cls.pid    = os.getpid()
+                    cls.thread = threading.Thread(
+                        target  = cls.run,
+                        args    = (monitor, version),
+                        name    = 'database-version-poller',
+                        daemon  = True
+                    )
+                    cls.thread.start()
+        return cls.counter
+
+
+    @classmethod
+    def run(cls, monitor, version):
+        """Poller thread main loop."""
+        interval = float(app.config.get('DATABASE_VERSION_POLL_INTERVAL', 0.5))
+        while True:
+            time.sleep(interval)
+            try:
+                current = monitor.execute("PRAGMA data_version").fetchone()[0]
+            except Exception:
+                app.logger.exception("Database version poll failed!")
+                continue
+            if current != version:
+                version      = current
+                cls.counter += 1
+
+
+#
+# api.metrics
+#
+#   Per-process event counters (buffer hits and misses, etc.), exposed by
+#   '/sys/metrics'. Use count_metric() to increment and metrics_snapshot()
+#   to read.
+#
+metrics      = collections.Counter()
+metrics_lock = threading.Lock()
+
+def count_metric(name, n = 1):
+    """Increment counter 'name' by 'n'."""
+    with metrics_lock:
+        metrics[name] += n
+
+def metrics_snapshot():
+    """Return a copy of the counters as a dict."""
+    with metrics_lock:
+        return dict(metrics)
+
+
+#
+# api.cache_db() -> sqlite3.Connection
+#
+#   Local cache database holds derived data (sketches, histograms, tiles)
+#   that can always be rebuilt from the primary database. Connection is
+#   opened on first use during the request and closed in the
+#   @app.teardown_request handler (application.py).
+#
+def cache_db():
+    """Return the request's connection to the local cache database."""
+    if not hasattr(g, 'cache'):
+        g.cache = sqlite3.connect(
+            app.config.get('CACHE_DATABASE_FILE', 'cache.sqlite3')
+        )
+    return g.cache
+
+
+
+#
+# api.ArgumentRequest(args:dict = None)
+#
+#   Stand-in for flask.request, for creating resource objects outside of an
+#   HTTP request (background snapshots, batch sub-requests, fast-path
+#   dispatch). Carries only request arguments; no JSON payload.
+#
+class ArgumentRequest:
+    """Minimal flask.request replacement; 'args' and 'json' only."""
+    def __init__(self, args = None):
+        self.args = ImmutableMultiDict(args or {})
+        self.json = None
+
+
+
+###############################################################################
+#
+# Response encoders
+#
+#   __make_response() serializes the payload dictionary with the encoder
+#   that best matches the request 'Accept' header. JSON is always available
+#   and it is also the default, if the client does not express a preference
+#   (or accepts anything, "*/*"). MessagePack and CBOR encoders are registered
+#   only if their modules ('msgpack', 'cbor2') can be imported.
+#
+#   JSON encoding uses the fastest available backend; 'orjson', 'rapidjson'
+#   or the standard library 'json' module (in that order of preference).
+#
+#   api.encoders: OrderedDict
+#       Registered encoders, {mimetype : function}. The order matters only
+#       when client accepts several types with equal quality - first wins.
+#
+#   api.register_encoder(mimetype: str, function: callable)
+#       Add (or replace) an encoder. Function receives the payload dictionary
+#       and must return bytes (or str).
+#
+#   NOTE: 'default=str' equivalent is used by all encoders to handle obscure
+#         data (for example; "datetime.timedelta(31) is not JSON serializable").
+#
+encoders = collections.OrderedDict()
+
+def register_encoder(mimetype, function):
+    """Register response encoder function for the specified mimetype."""
+    encoders[mimetype] = function
+
+
+try:
+    import orjson
+    json_backend = 'orjson'
+    def encode_json(payload):
+        """Encode payload into JSON (orjson backend)."""
+        return orjson.dumps(
+            payload,
+            default = str,
+            option  = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+except ImportError:
+    try:
+        import rapidjson
+        json_backend = 'rapidjson'
+        def encode_json(payload):
+            """Encode payload into JSON (rapidjson backend)."""
+            return rapidjson.dumps(payload, default = str)
+    except ImportError:
+        json_backend = 'json'
+        def encode_json(payload):
+            """Encode payload into JSON (standard library backend)."""
+            return json.dumps(payload, default = str)
+
+register_encoder('application/json', encode_json)
+
+
+try:
+    import msgpack
+    def encode_msgpack(payload):
+        """Encode payload into MessagePack."""
+        return msgpack.packb(payload, default = str, use_bin_type = True)
+    register_encoder('application/msgpack', encode_msgpack)
+    register_encoder('application/x-msgpack', encode_msgpack)
+except ImportError:
+    pass
+
+
+try:
+    import cbor2
+    def encode_cbor(payload):
+        """Encode payload into CBOR (RFC 7049)."""
+        return cbor2.dumps(
+            payload,
+            default = lambda encoder, value: encoder.encode(str(value))
+        )
+    register_encoder('application/cbor', encode_cbor)
+except ImportError:
+    pass
+
+
+def negotiate_mimetype():
+    """Return the registered encoder mimetype that best matches the request 'Accept' header."""
+    return request.accept_mimetypes.best_match(
+        encoders,
+        default = 'application/json'
+    )
+
+
+
 #
 # __make_response(code, payload)
 # API internal / Generate Flask.Response from HTTP response code and data
@@ -329,24 +1322,16 @@ def __make_response(code, payload):
             't_cpu'     : time.process_time() - g.t_cpu_start,
             't_real'    : time.perf_counter() - g.t_real_start
         }
-        # NOTE: PLEASE remove 'indent' and 'sort_keys' when developing is done!!!
-        # 'default=str' is useful setting to handle obscure data, leave it.
-        # (for example; "datetime.timedelta(31) is not JSON serializable")
         # https://stackoverflow.com/questions/7907596/json-dumps-vs-flask-jsonify
+        mimetype = negotiate_mimetype()
         t = time.perf_counter()
-        #payload = json.dumps(payload, indent=4, sort_keys=True, default=str)
-        payload = json.dumps(payload, default=str)
-        app.logger.debug("REMOVE SORT! json.dumps(): {:.1f}ms".format((time.perf_counter() - t) * 1000))
-
-        response = app.response_class(
-            response    = payload,
-            status      = code,
-            mimetype    = 'application/json'
+        payload = encoders[mimetype](payload)
+        app.logger.debug(
+            "Response encoded as '{}': {:.1f}ms"
+            .format(mimetype, (time.perf_counter() - t) * 1000)
         )
-        allow = [method for method in request.url_rule.methods if method not in ('HEAD', 'OPTIONS')]
-        response.headers['Allow']        = ", ".join(allow)
-        response.headers['Content-Type'] = 'application/json'
-        return response
+
+        return __encoded_response(code, payload, mimetype)
     except Exception as e:
         # VERY IMPORTANT! Do NOT re-raise the exception!
         app.logger.exception("Internal __make_response() error!")
@@ -358,6 +1343,43 @@ def __make_response(code, payload):
 
 
 
+#
+# __encoded_response(code, body, mimetype)
+# API internal / Flask.Response for an already encoded body
+#
+def __encoded_response(code, body, mimetype):
+    """Generate Flask.Response from encoded body and set the common headers."""
+    response = app.response_class(
+        response    = body,
+        status      = code,
+        mimetype    = mimetype
+    )
+    response.headers['Allow']        = allow_header(request.url_rule)
+    response.headers['Content-Type'] = mimetype
+    response.headers['Vary']         = 'Accept'
+    return response
+
+
+#
+# allow_header(rule:werkzeug.routing.Rule) -> str
+# 'Allow' header value for a URL rule (cached, rules do not change)
+#
+allow_headers = {}
+
+def allow_header(rule):
+    """Return 'Allow' header value listing the methods of 'rule'."""
+    try:
+        return allow_headers[rule.rule]
+    except KeyError:
+        allow = ", ".join(
+            method for method in rule.methods
+            if method not in ('HEAD', 'OPTIONS')
+        )
+        allow_headers[rule.rule] = allow
+        return allow
+
+
+
 #
 # api.response((code:int, payload:dict):tuple) -> Flask.Response
 # JSON Flask.Response create function for Flask route handlers
@@ -367,6 +1389,146 @@ def response(response_tuple):
     return __make_response(response_tuple[0], response_tuple[1])
 
 
+#
+# api.prepared_response(encoded:dict, etag:str = None) -> Flask.Response
+# Response from a payload that has been encoded in advance
+#
+#   'encoded' must contain the payload for every registered encoder
+#   ({mimetype : bytes}). Encoded payloads cannot carry the per request
+#   timing information of the common 'api' element. If 'etag' is given,
+#   conditional requests (If-None-Match) are answered with 304.
+#
+def prepared_response(encoded, etag = None):
+    """Create Flask.Response from pre-encoded payloads ({mimetype : bytes})."""
+    mimetype = negotiate_mimetype()
+    response = __encoded_response(200, encoded[mimetype], mimetype)
+    if etag:
+        response.set_etag(etag)
+        response = response.make_conditional(request)
+    return response
+
+
+###############################################################################
+#
+# Single-flight requests
+#
+#   When several consoles refresh at the same time, they send identical
+#   requests. api.coalesced_response(function) lets only the first of them
+#   (the leader) call 'function' and encode the result; requests with the
+#   same key that arrive while the leader is still working wait for it and
+#   receive a copy of the encoded response body. Key is the request path,
+#   the sorted request arguments and the negotiated response mimetype.
+#
+#   Nothing is cached; once the leader finishes, the next request starts a
+#   new computation. Exceptions raised by the leader are raised for the
+#   waiting requests as well. Waiting is limited to COALESCE_WAIT (default
+#   30) seconds, after which the request computes its own response. Shared
+#   responses carry the leader's 'api' timing values. Coalescing can be
+#   disabled with COALESCE_ENABLED = False.
+#
+#   Counted in api.metrics as 'coalesce.leader' and 'coalesce.shared'.
+#
+class SingleFlight:
+    """In-flight computation shared by identical concurrent requests."""
+    def __init__(self):
+        self.done     = threading.Event()
+        self.response = None        # (code, body, mimetype)
+        self.error    = None
+
+inflight      = {}
+inflight_lock = threading.Lock()
+
+
+def coalesced_response(function):
+    """Create Flask.Response from the (code:int, payload:dict):tuple returned by 'function', sharing the result with identical concurrent requests."""
+    if not app.config.get('COALESCE_ENABLED', True):
+        return __make_response(*function())
+    mimetype = negotiate_mimetype()
+    key = (
+        request.path,
+        tuple(sorted(request.args.items(multi = True))),
+        mimetype
+    )
+    with inflight_lock:
+        flight = inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = inflight[key] = SingleFlight()
+
+    if not leader:
+        if flight.done.wait(float(app.config.get('COALESCE_WAIT', 30.0))):
+            count_metric('coalesce.shared')
+            if flight.error is not None:
+                raise flight.error
+            if flight.response is not None:
+                return __encoded_response(*flight.response)
+        # Leader too slow (or failed to encode); compute our own
+        return __make_response(*function())
+
+    count_metric('coalesce.leader')
+    try:
+        response = __make_response(*function())
+        flight.response = (
+            response.status_code,
+            response.get_data(),
+            response.mimetype
+        )
+        return response
+    except Exception as e:
+        flight.error = timeout_error(e)
+        raise
+    finally:
+        with inflight_lock:
+            del inflight[key]
+        flight.done.set()
+
+
+#
+# api.binary_response(header:dict, array:numpy.ndarray) -> Flask.Response
+# Typed array response for large numeric matrices
+#
+#   Response body layout (all little-endian):
+#
+#       uint32      Length (H) of the JSON header, in bytes
+#       H bytes     JSON header (UTF-8), padded with spaces so that the data
+#                   begins at an offset divisible by 8
+#       ...         Array data, row-major ("C" order)
+#
+#   JSON header contains the provided 'header' dictionary, plus 'dtype'
+#   (NumPy type string, e.g. "<f4"), 'shape' and the common 'api' element.
+#   In a browser, the data can be used directly:
+#
+#       var view   = new DataView(buffer);
+#       var length = view.getUint32(0, true);
+#       var header = JSON.parse(new TextDecoder().decode(
+#                        new Uint8Array(buffer, 4, length)));
+#       var data   = new Float32Array(buffer, 4 + length);
+#
+def binary_response(header, array, dtype = '<f4'):
+    """Create Flask.Response carrying 'array' as little-endian typed array, prefixed with JSON 'header'."""
+    import struct
+    import numpy
+    array  = numpy.ascontiguousarray(array, dtype = dtype)
+    header = dict(header)
+    header['dtype'] = array.dtype.str
+    header['shape'] = list(array.shape)
+    header['api']   = {
+        'version'   : app.apiversion,
+        't_cpu'     : time.process_time() - g.t_cpu_start,
+        't_real'    : time.perf_counter() - g.t_real_start
+    }
+    encoded = json.dumps(header, default = str).encode('utf-8')
+    encoded += b' ' * (-(4 + len(encoded)) % 8)
+    response = app.response_class(
+        response    = struct.pack('<I', len(encoded)) + encoded + array.tobytes(),
+        status      = 200,
+        mimetype    = 'application/octet-stream'
+    )
+    response.headers['Allow'] = allow_header(request.url_rule)
+    return response
+
+
+
 #
 # api.exception_response(ApiException | Exception)
 # Exception handling function for Flask route handlers
@@ -386,7 +1548,8 @@ def exception_response(ex):
                 "details" : "api.exception_response() received: None!"
             }
         )
-    # 
+    # Statement aborted by the request's query budget
+    ex = timeout_error(ex)
     try:
         if isinstance(ex, Exception):
             # Member variable '.ApiException' reveals the type
@@ -428,6 +1591,20 @@ def exception_response(ex):
         )
 
 
+def csv_error_response(ex):
+    """Generate plain text error response for CSV routes from ApiException, or from a statement aborted by the request's query budget (api.Timeout). Other exceptions are logged and re-raised."""
+    ex = timeout_error(ex)
+    if getattr(ex, 'ApiException', None):
+        app.logger.warning(str(ex))
+        return app.response_class(
+            response = str(ex),
+            status   = ex.code,
+            mimetype = "text/plain"
+        )
+    app.logger.exception("CSV generation failure! " + str(ex))
+    raise ex
+
+
 #
 # UNDER TESTING (Seems to fail before streaming out 3 GB)
 # https://stackoverflow.com/questions/28011341/create-and-download-a-csv-file-from-a-flask-view
@@ -435,28 +1612,132 @@ def exception_response(ex):
 # Takes queried cursor and streams it out as CSV file
 def stream_result_as_csv(cursor):
     """Takes one argument, SQLite3 query result, which is streamed out as CSV file."""
+    return stream_rows_as_csv(
+        [key[0] for key in cursor.description],
+        cursor
+    )
+
+
+class RowPipeline:
+    """Iterate 'rows' (cursor or iterable of sequences) as lists of up to 'batch' rows, fetched ahead by a producer thread into a queue of at most 'depth' batches. Producer blocks while the queue is full (backpressure). close() stops the producer; if it is busy in a database call, 'interrupt' (for example sqlite3.Connection.interrupt) is called to abort it."""
+
+    END = object()
+
+    def __init__(self, rows, batch = 256, depth = 4, interrupt = None):
+        import queue
+        import threading
+        self.rows      = rows
+        self.batch     = batch
+        self.queue     = queue.Queue(maxsize = max(1, depth))
+        self.stop      = threading.Event()
+        self.interrupt = interrupt
+        self.thread    = threading.Thread(
+            target  = self.produce,
+            name    = 'stream-producer',
+            daemon  = True
+        )
+        self.thread.start()
+
+
+    def put(self, item):
+        """Queue 'item', waiting for space. Returns False if stopped."""
+        import queue
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout = 0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+
+    def produce(self):
+        """Producer thread; fetch batches until exhausted or stopped."""
+        import itertools
+        try:
+            if hasattr(self.rows, 'fetchmany'):
+                fetch = self.rows.fetchmany
+            else:
+                iterator = iter(self.rows)
+                fetch = lambda n: list(itertools.islice(iterator, n))
+            while not self.stop.is_set():
+                chunk = fetch(self.batch)
+                if not chunk:
+                    break
+                if not self.put(chunk):
+                    return
+            self.put(self.END)
+        except BaseException as e:
+            self.put(e)
+
+
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is self.END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+    def close(self):
+        """Stop the producer and wait for it to exit."""
+        self.stop.set()
+        self.thread.join(0.1)
+        if self.thread.is_alive() and self.interrupt:
+            self.interrupt()
+        self.thread.join()
+
+
+
+def stream_rows_as_csv(columns, rows):
+    """Stream out a CSV file with header 'columns' and data from 'rows' iterable (of sequences)."""
     import io       # for StringIO
     import csv
-    # Generator object for the Response() to use
-    def generate(cursor):
-        data = io.StringIO()
-        writer = csv.writer(data)
+    # Response body is iterated after the request has been torn down
+    # (teardown_request closes g.db). Generator takes over the database
+    # connection and closes it once the stream ends.
+    connection = g.pop('db', None)
+    # Stream duration depends on the client; no query time budget
+    budget = g.pop('budget', None)
+    if budget:
+        budget.remove()
+    batch = int(app.config.get('STREAM_BATCH_ROWS', 256))
+    depth = int(app.config.get('STREAM_QUEUE_DEPTH', 4))
 
-        # Yield header
-        writer.writerow(
-            (key[0] for key in cursor.description)
+    # Generator object for the Response() to use
+    def generate(rows):
+        # Rows are fetched by a producer thread while this thread encodes
+        # and the server writes to the socket. If the client disconnects,
+        # the server closes this generator and the producer is stopped.
+        pipeline = RowPipeline(
+            rows,
+            batch,
+            depth,
+            connection.interrupt if connection else None
         )
-        yield data.getvalue()
-        data.seek(0)
-        data.truncate(0)
+        try:
+            data = io.StringIO()
+            writer = csv.writer(data)
 
-        # Yeild data
-        for row in cursor:
-            writer.writerow(row)
+            # Yield header
+            writer.writerow(columns)
             yield data.getvalue()
             data.seek(0)
             data.truncate(0)
 
+            # Yield data, one batch per chunk
+            for chunk in pipeline:
+                writer.writerows(chunk)
+                yield data.getvalue()
+                data.seek(0)
+                data.truncate(0)
+        finally:
+            pipeline.close()
+            if connection:
+                connection.close()
+
     from werkzeug.datastructures    import Headers
     from werkzeug.wrappers          import Response
     from flask                      import stream_with_context
@@ -478,13 +1759,105 @@ def stream_result_as_csv(cursor):
     #
     # Stream the response using the local generate() -generator function.
     return Response(
-        stream_with_context(generate(cursor)),
+        stream_with_context(generate(rows)),
         mimetype='text/csv',
         headers=headers
     )
 
 
 
+###############################################################################
+#
+# Query time budget
+#
+#   Each request connection gets a time budget (before_request() in
+#   application.py). SQLite calls the budget's progress handler every
+#   QUERY_BUDGET_STEPS (default 10000) virtual machine instructions. When
+#   the budget is used up, the handler aborts the running statement, which
+#   then raises sqlite3.OperationalError ("interrupted").
+#   api.exception_response() reports that as api.Timeout.
+#
+#   Limit is QUERY_TIME_LIMITS[<endpoint>] if the endpoint (route function
+#   name) is listed in that dictionary, QUERY_TIME_LIMIT (default 30.0)
+#   seconds otherwise. None means no limit. Time is counted from the start
+#   of the request, as wall clock time ('real') or as the CPU time of the
+#   request thread ('cpu'), selected by QUERY_BUDGET_CLOCK (default 'real').
+#
+#   Streamed responses (api.stream_rows_as_csv()) remove the budget, because
+#   their duration depends on the client. Their queries are stopped when
+#   the client disconnects (api.RowPipeline).
+#
+class QueryBudget:
+
+    clocks = {
+        'real'  : time.perf_counter,
+        'cpu'   : time.thread_time
+    }
+
+    def __init__(self, connection, endpoint, limit, clock = 'real'):
+        """Install progress handler on 'connection' that aborts statements after 'limit' seconds."""
+        self.connection = connection
+        self.endpoint   = endpoint
+        self.limit      = limit
+        self.clockname  = clock
+        self.clock      = self.clocks[clock]
+        self.deadline   = self.clock() + limit
+        self.exceeded   = False
+        connection.set_progress_handler(
+            self.check,
+            int(app.config.get('QUERY_BUDGET_STEPS', 10000))
+        )
+
+
+    @classmethod
+    def install(cls, connection, endpoint):
+        """Install the budget configured for 'endpoint'. Returns QueryBudget, or None if the endpoint has no limit."""
+        limits = app.config.get('QUERY_TIME_LIMITS', {})
+        if endpoint in limits:
+            limit = limits[endpoint]
+        else:
+            limit = app.config.get('QUERY_TIME_LIMIT', 30.0)
+        if limit is None:
+            return None
+        return cls(
+            connection,
+            endpoint,
+            float(limit),
+            app.config.get('QUERY_BUDGET_CLOCK', 'real')
+        )
+
+
+    def check(self):
+        """Progress handler; non-zero return value aborts the statement."""
+        if self.clock() > self.deadline:
+            self.exceeded = True
+            return 1
+        return 0
+
+
+    def remove(self):
+        """Remove the progress handler (no limit)."""
+        self.connection.set_progress_handler(None, 0)
+
+
+    def error(self):
+        return Timeout(
+            "Query exceeded the time limit!",
+            "Endpoint '{}' allows {} seconds ({} time). Narrow the request."
+            .format(self.endpoint, self.limit, self.clockname)
+        )
+
+
+
+def timeout_error(ex):
+    """Return api.Timeout if exception 'ex' was caused by the request's query budget, otherwise 'ex'."""
+    budget = g.get('budget')
+    if budget and budget.exceeded and isinstance(ex, sqlite3.OperationalError):
+        return budget.error()
+    return ex
+
+
+
 ###############################################################################
 #
 #
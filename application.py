@@ -11,6 +11,11 @@
 #   0.1.1   2018.10.14  Fixed the version output in the logging message.
 #   0.1.2   2018.10.23  Entire Flash application moved into this file.
 #   0.1.3   2018.10.29  Print lapsed ms in @app.teardown_request debug message.
+#   0.1.4   2026.10.19  Close local cache database connection on teardown.
+#   0.1.5   2026.10.19  'flask rebuild-spectra' command.
+#   0.1.6   2026.10.19  Optional fast-path WSGI dispatch (FASTPATH_ENABLED).
+#   0.1.7   2026.10.19  Request connection may be used by a stream producer thread.
+#   0.1.8   2026.10.19  Query time budget on request connections.
 #
 #
 # Code in this file gets executed ONLY ONCE, when the uWSGI is started.
@@ -29,11 +34,13 @@ import os
 import time
 import logging
 import sqlite3
+import click
 
 from logging.handlers       import RotatingFileHandler
 from logging                import Formatter
 from flask                  import Flask
 from flask                  import g
+from flask                  import request
 
 
 # For some reason, if Flask() is given 'debug=True',
@@ -200,12 +207,18 @@ def before_request():
     #
     # Ensure database connection
     #
+    # CSV streams fetch rows in a producer thread (api.RowPipeline), which
+    # takes over the connection from the request thread.
     if not hasattr(g, 'db'):
         g.db = sqlite3.connect(
-            app.config.get('SQLITE3_DATABASE_FILE', 'pmapi.sqlite3')
+            app.config.get('SQLITE3_DATABASE_FILE', 'pmapi.sqlite3'),
+            check_same_thread = False
         )
         cursor = g.db.cursor()
         cursor.execute("PRAGMA foreign_keys = 1")
+        # Endpoint's query time budget (api.QueryBudget)
+        from api import QueryBudget
+        g.budget = QueryBudget.install(g.db, request.endpoint)
 
     return
 
@@ -214,6 +227,13 @@ def before_request():
 #
 import routes
 
+#
+# Optional fast-path dispatch for hot GET endpoints (api/FastPath.py)
+#
+if app.config.get('FASTPATH_ENABLED', False):
+    from api.FastPath import FastPath
+    app.wsgi_app = FastPath(app, routes.fastpath_handlers)
+
 #
 # Executed each time application context tears down
 # (request ends)
@@ -229,6 +249,32 @@ def teardown_request(error):
     )
     if hasattr(g, 'db'):
         g.db.close()
+    if hasattr(g, 'cache'):
+        g.cache.close()
+
+
+
+###############################################################################
+#
+# COMMAND LINE
+#
+###############################################################################
+
+@app.cli.command('rebuild-spectra')
+@click.option('--session', type = int, default = None, help = 'Testing session ID (default: all)')
+def rebuild_spectra(session):
+    """Rebuild persisted pulse height spectra in the cache database."""
+    from api.Spectra import PulseHeightSpectra
+    g.db = sqlite3.connect(
+        app.config.get('SQLITE3_DATABASE_FILE', 'pmapi.sqlite3')
+    )
+    try:
+        rows = PulseHeightSpectra(g.db.cursor()).rebuild(session)
+    finally:
+        g.db.close()
+        if hasattr(g, 'cache'):
+            g.cache.close()
+    click.echo("{} pulse height rows processed.".format(rows))
 
 
 # EOF
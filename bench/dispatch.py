@@ -0,0 +1,124 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# Request dispatch benchmark
+#
+# bench/dispatch.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#
+#
+#   Measures requests per second of the fast-path endpoints (api/FastPath.py)
+#   through the normal Flask dispatch and through the fast-path dispatch.
+#   Requests are made by calling the WSGI applications directly (no HTTP
+#   server, no network), so the numbers show the cost of dispatch, database
+#   query and encoding only. Payloads of both paths are compared (excluding
+#   the 'api' timing element).
+#
+#   Needs the instance configuration and must be executed in the
+#   application root directory:
+#
+#       cd /srv/nginx-root
+#       python3 bench/dispatch.py --seconds 2
+#
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.test  import EnvironBuilder
+
+from application    import app
+from api.FastPath   import FastPath
+import routes
+
+
+def call(wsgi, environ):
+    """Execute one request. Returns (status, body)."""
+    status = []
+    def start_response(s, headers, exc_info = None):
+        status.append(s)
+    iterable = wsgi(dict(environ), start_response)
+    try:
+        body = b''.join(iterable)
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+    return status[0], body
+
+
+def rate(wsgi, environ, seconds):
+    """Return requests per second of 'wsgi' for 'environ'."""
+    count = 0
+    t0 = time.perf_counter()
+    while True:
+        for _ in range(20):
+            call(wsgi, environ)
+        count += 20
+        t = time.perf_counter() - t0
+        if t >= seconds:
+            return count / t
+
+
+def data(body):
+    """Payload without the 'api' element (which has request timing)."""
+    payload = json.loads(body)
+    payload.pop('api', None)
+    return payload
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description = "PMAPI request dispatch benchmark"
+    )
+    parser.add_argument(
+        'endpoints',
+        nargs   = '*',
+        help    = 'fast-path endpoints to measure (default: all)'
+    )
+    parser.add_argument(
+        '--seconds',
+        type    = float,
+        default = 2.0,
+        help    = 'measurement time per endpoint and dispatch path'
+    )
+    args = parser.parse_args()
+
+    # Flask dispatch, regardless of FASTPATH_ENABLED
+    if isinstance(app.wsgi_app, FastPath):
+        app.wsgi_app = app.wsgi_app.wsgi_app
+    flask_wsgi = app.wsgi_app
+    fast_wsgi  = FastPath(app, routes.fastpath_handlers)
+
+    print(
+        "{:<28} {:>12} {:>12} {:>8}  {}"
+        .format("Endpoint", "Flask req/s", "Fast req/s", "Speedup", "Payload")
+    )
+    for path in args.endpoints or routes.fastpath_handlers:
+        environ = EnvironBuilder(
+            path    = path,
+            headers = {'Accept' : 'application/json'}
+        ).get_environ()
+        s1, b1 = call(flask_wsgi, environ)
+        s2, b2 = call(fast_wsgi, environ)
+        same = s1 == s2 and data(b1) == data(b2)
+        r1 = rate(flask_wsgi, environ, args.seconds)
+        r2 = rate(fast_wsgi, environ, args.seconds)
+        print(
+            "{:<28} {:>12.0f} {:>12.0f} {:>7.2f}x  {}"
+            .format(
+                path,
+                r1,
+                r2,
+                r2 / r1,
+                "identical" if same else "DIFFERENT ({} / {})".format(s1, s2)
+            )
+        )
+
+# EOF
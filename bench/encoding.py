@@ -0,0 +1,133 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# Response encoder benchmark
+#
+# bench/encoding.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#
+#
+#   Measures encode time and payload size of each registered response
+#   encoder (api.encoders) for the payloads of the listed API endpoints.
+#
+#   Payloads are produced by the actual route handlers, against the actual
+#   database, so this script needs the instance configuration and must be
+#   executed in the application root directory:
+#
+#       cd /srv/nginx-root
+#       python3 bench/encoding.py --begin 1541400000 --end 1541486400
+#
+#   Payload is captured by registering a temporary encoder for a private
+#   mimetype and requesting each endpoint with that 'Accept' header.
+#
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from application    import app
+import api
+
+CAPTURE_MIMETYPE = 'application/x-pmapi-benchmark-capture'
+
+DEFAULT_ENDPOINTS = (
+    '/api/psu',
+    '/api/psu/power',
+    '/api/housekeeping?{range}',
+    '/api/housekeeping/avg?{range}',
+    '/api/hitcount?{range}',
+    '/api/hitcount/avg?{range}',
+    '/api/pulseheight?{range}',
+    '/api/pulseheight/avg?{range}'
+)
+
+
+def capture_payload(url):
+    """Execute request through Flask and return the payload dictionary."""
+    captured = {}
+    def capture(payload):
+        captured['payload'] = payload
+        return b''
+    api.register_encoder(CAPTURE_MIMETYPE, capture)
+    try:
+        with app.test_request_context(
+            url,
+            headers = {'Accept' : CAPTURE_MIMETYPE}
+        ):
+            app.full_dispatch_request()
+    finally:
+        del api.encoders[CAPTURE_MIMETYPE]
+    return captured.get('payload')
+
+
+def measure(function, payload, repeat):
+    """Returns (best time in seconds, encoded size in bytes)."""
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        encoded = function(payload)
+        t = time.perf_counter() - t
+        best = t if best is None or t < best else best
+    if isinstance(encoded, str):
+        encoded = encoded.encode('utf-8')
+    return best, len(encoded)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description = "PMAPI response encoder benchmark"
+    )
+    parser.add_argument(
+        'endpoints',
+        nargs   = '*',
+        help    = 'endpoint URLs ("{range}" is replaced with begin/end arguments)'
+    )
+    parser.add_argument(
+        '--begin',
+        type    = int,
+        help    = 'range begin (Unix timestamp)'
+    )
+    parser.add_argument(
+        '--end',
+        type    = int,
+        help    = 'range end (Unix timestamp)'
+    )
+    parser.add_argument(
+        '--repeat',
+        type    = int,
+        default = 5,
+        help    = 'encode repetitions per format, best time is reported'
+    )
+    args = parser.parse_args()
+
+    timerange = "&".join(
+        "{}={}".format(k, v)
+        for k, v in (('begin', args.begin), ('end', args.end))
+        if v is not None
+    )
+
+    print("JSON backend: {}".format(api.json_backend))
+    print(
+        "{:<40} {:<24} {:>10} {:>12}"
+        .format("Endpoint", "Format", "ms", "bytes")
+    )
+    for endpoint in args.endpoints or DEFAULT_ENDPOINTS:
+        url = endpoint.format(range = timerange).rstrip('?')
+        payload = capture_payload(url)
+        if payload is None:
+            print("{:<40} (no payload captured)".format(url))
+            continue
+        for mimetype, function in api.encoders.items():
+            t, size = measure(function, payload, args.repeat)
+            print(
+                "{:<40} {:<24} {:>10.2f} {:>12}"
+                .format(url[:40], mimetype, t * 1000, size)
+            )
+
+# EOF
@@ -0,0 +1,118 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# Descriptive statistics check
+#
+# bench/stats.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#
+#
+#   Requests '/api/<table>/stats' for all fields (for 'hitcount', all 999
+#   counters) and compares count, sum, min, max, mean and variance of every
+#   field against NumPy (two-pass variance) over the same rows, read
+#   directly from the database. Prints the request time and the number of
+#   fields that differ.
+#
+#   Needs the instance configuration and must be executed in the
+#   application root directory:
+#
+#       cd /srv/nginx-root
+#       python3 bench/stats.py hitcount housekeeping
+#
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from application    import app
+import routes
+
+
+def reference(database, table, fields):
+    """NumPy statistics {field : {...}} of 'fields' in 'table'."""
+    connection = sqlite3.connect(database)
+    try:
+        rows = connection.execute(
+            "SELECT {} FROM {}".format(", ".join(fields), table)
+        ).fetchall()
+    finally:
+        connection.close()
+    values = numpy.array(rows, dtype = float).reshape(len(rows), len(fields))
+    result = {}
+    for i, field in enumerate(fields):
+        x = values[:, i]
+        x = x[~numpy.isnan(x)]
+        result[field] = {
+            "count"     : len(x),
+            "sum"       : x.sum() if len(x) else None,
+            "min"       : x.min() if len(x) else None,
+            "max"       : x.max() if len(x) else None,
+            "mean"      : x.mean() if len(x) else None,
+            "variance"  : x.var(ddof = 1) if len(x) > 1 else None
+        }
+    return result
+
+
+def differs(a, b):
+    if a is None or b is None:
+        return a is not b
+    return not numpy.isclose(a, b, rtol = 1e-9, atol = 1e-9)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description = "PMAPI descriptive statistics check"
+    )
+    parser.add_argument(
+        'tables',
+        nargs   = '*',
+        default = ['hitcount'],
+        help    = "tables to check (default: hitcount)"
+    )
+    args = parser.parse_args()
+
+    database = app.config.get('SQLITE3_DATABASE_FILE', 'pmapi.sqlite3')
+    client   = app.test_client()
+    failures = 0
+    for table in args.tables:
+        t0 = time.perf_counter()
+        response = client.get(
+            '/api/{}/stats'.format(table),
+            headers = {'Accept' : 'application/json'}
+        )
+        t = time.perf_counter() - t0
+        if response.status_code != 200:
+            print("{:<14} HTTP {}".format(table, response.status_code))
+            failures += 1
+            continue
+        data = json.loads(response.get_data())['data']
+        expected = reference(database, table, list(data))
+        wrong = [
+            field for field in data
+            if any(
+                differs(data[field][key], value)
+                for key, value in expected[field].items()
+            )
+        ]
+        failures += len(wrong)
+        print(
+            "{:<14} {:>4} fields {:>8.3f} s  {}".format(
+                table,
+                len(data),
+                t,
+                "OK" if not wrong else "DIFFERENT: " + ", ".join(wrong[:10])
+            )
+        )
+    sys.exit(1 if failures else 0)
+
+# EOF
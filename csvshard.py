@@ -0,0 +1,58 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Turku University (2018) Department of Future Technologies
+# Foresail-1 / PATE Monitor / Middleware (PMAPI)
+# CSV export shard writer (process pool worker)
+#
+# csvshard.py - Jani Tammi <jasata@utu.fi>
+#
+#   0.1.0   2026.10.19  Initial version.
+#
+#
+#   Executed in the export process pool (api/Export.py). Each call reads
+#   one shard (rowid range) of an export query through its own read-only
+#   database connection and writes the rows, CSV formatted, into a file
+#   of its own. Export job concatenates the files in shard order.
+#
+#   This module is deliberately standalone: pool processes are started
+#   with the 'spawn' method and import only this module, not the
+#   application (Flask, configuration, logging) or the 'api' package.
+#
+import os
+import csv
+import sqlite3
+import urllib.request
+
+
+def connect_readonly(database):
+    """Open a read-only connection to SQLite3 database file 'database'."""
+    return sqlite3.connect(
+        "file:{}?mode=ro".format(
+            urllib.request.pathname2url(os.path.abspath(database))
+        ),
+        uri = True
+    )
+
+
+def write_shard(database, sql, bindings, path, batch = 1024):
+    """Execute 'sql' with 'bindings' and write result rows into CSV file 'path'. Returns (rows:int, bytes:int)."""
+    connection = connect_readonly(database)
+    try:
+        cursor = connection.execute(sql, bindings)
+        count  = 0
+        with open(path, 'w', encoding = 'utf-8', newline = '') as file:
+            writer = csv.writer(file)
+            while True:
+                rows = cursor.fetchmany(batch)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                count += len(rows)
+            size = file.tell()
+    finally:
+        connection.close()
+    return count, size
+
+
+# EOF
@@ -15,6 +15,31 @@
 #   0.3.3   2018.10.31  HTML brackets converted for HTML output only.
 #   0.3.4   2018.11.05  Comments and docstrings.
 #   0.3.5   2018.11.11  ClassifiedData renamed to Hitcount
+#   0.4.0   2026.10.19  Statistics endpoints ('/api/<resource>/stats').
+#   0.4.1   2026.10.19  Quantile endpoints ('/api/<resource>/quantile').
+#   0.4.2   2026.10.19  Grouped aggregates, session comparison endpoints.
+#   0.4.3   2026.10.19  Hit counter selectors documented.
+#   0.4.4   2026.10.19  Sector reduced hit counter spectra.
+#   0.4.5   2026.10.19  Spin-phase distribution.
+#   0.4.6   2026.10.19  Binary spectrogram endpoint.
+#   0.4.7   2026.10.19  Spectrogram tile endpoint.
+#   0.4.8   2026.10.19  Pulse height histogram endpoint.
+#   0.4.9   2026.10.19  Persisted pulse height spectra endpoint.
+#   0.4.10  2026.10.19  As-of join of hit counters, housekeeping and PSU.
+#   0.4.11  2026.10.19  Latest row endpoints.
+#   0.4.12  2026.10.19  '/sys/metrics'.
+#   0.4.13  2026.10.19  Dashboard snapshot endpoint.
+#   0.4.14  2026.10.19  Single-flight coalescing of search, statistics and PSU requests.
+#   0.4.15  2026.10.19  Multi-resource batch endpoint.
+#   0.4.16  2026.10.19  Fast-path handlers, log_request() formats only when debugging.
+#   0.4.17  2026.10.19  Background export jobs.
+#   0.4.18  2026.10.19  CSV streams read in short keyset bounded pages.
+#   0.4.19  2026.10.19  Pulse height histogram and spectrum routes in pulse height section.
+#   0.4.20  2026.10.19  As-of payload built by HitCount.asof_columns().
+#   0.4.21  2026.10.19  CSV routes report query time budget aborts as api.Timeout.
+#   0.4.22  2026.10.19  Spectrogram header reports the requested 'end'.
+#   0.4.23  2026.10.19  Batch functions and aggregates documented per resource.
+#   0.4.24  2026.10.19  CSV route errors handled by api.csv_error_response().
 #
 #
 #   Actual processing is to be done API resource classes/objects. HTTP response
@@ -24,6 +49,8 @@
 #   Normal return should be done with:
 #
 #       api.response()              Normal JSON replies
+#       api.coalesced_response()    Read-only replies shared by identical
+#                                   concurrent requests
 #       api.exception_response()    Any exception into JSON error reply
 #       api.stream_result_as_csv()  Stream SQLite3.Cursor out as CSV
 #
@@ -52,6 +79,7 @@
 #
 #
 #
+import os
 import sys
 import time
 import json
@@ -73,6 +101,8 @@ import api
 #       Store HTTP request path and the rule that triggered.
 #
 def log_request(request):
+    if not app.logger.isEnabledFor(logging.DEBUG):
+        return
     app.logger.debug(
         "{} '{}' (rule: '{}')"
         .format(
@@ -154,7 +184,36 @@ def pulseheight():
     log_request(request)
     try:
         from api.PulseHeight import PulseHeight
-        return api.response(PulseHeight(request).get())
+        return api.coalesced_response(lambda: PulseHeight(request).get())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/pulseheight/latest', methods=['GET'])
+def pulseheight_latest():
+    """Newest PATE pulse height data.
+
+    GET /api/pulseheight/latest
+    Query parameters:
+    n - Number of newest rows to return (default: 1)
+    session_id - Testing session ID
+    fields - A comma separated list of fields to return
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            <fields according to query parameter 'fields'>
+        },
+        ...
+    }
+    If 'n' is given, "data" is a list of objects, newest first. Rows are
+    found with a descending index seek and the result is reused until new
+    rows are inserted."""
+    log_request(request)
+    try:
+        from api.PulseHeight import PulseHeight
+        return api.response(PulseHeight(request).latest())
     except Exception as e:
         return api.exception_response(e)
 
@@ -170,6 +229,7 @@ def pulseheight_aggregate(function):
     begin - PATE timestamp (Unix timestamp)
     end - PATE timestamp (Unix timestamp)
     fields - A comma separated list of fields to return
+    group_by - 'session_id' returns a list of objects, one per testing session
     API returns 200 OK and:
     {
         ...,
@@ -189,7 +249,160 @@ def pulseheight_aggregate(function):
             raise api.InvalidArgument(
                 "Function '{}' is not supported!".format(function)
             )
-        return api.response(PulseHeight(request).get(function))
+        return api.coalesced_response(lambda: PulseHeight(request).get(function))
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/pulseheight/stats', methods=['GET'])
+def pulseheight_stats():
+    """Descriptive statistics of raw PATE pulse height data.
+
+    GET /api/pulseheight/stats
+    Query parameters:
+    begin - PATE timestamp (Unix timestamp)
+    end - PATE timestamp (Unix timestamp)
+    session_id - Testing session ID
+    fields - A comma separated list of fields to return
+    group_by - 'session_id' returns a list of objects, one per testing session
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            <field> : {
+                "count"     : (int),
+                "sum"       : (number),
+                "min"       : (number),
+                "max"       : (number),
+                "mean"      : (float),
+                "variance"  : (float),
+                "stddev"    : (float)
+            },
+            ...
+        },
+        ...
+    }
+
+    All statistics are calculated in one pass over the requested range. Only numeric fields are included. Variance is the sample variance (n - 1). Mean, variance and stddev are null when there are too few values to define them."""
+    log_request(request)
+    try:
+        from api.PulseHeight import PulseHeight
+        return api.coalesced_response(lambda: PulseHeight(request).stats())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/pulseheight/compare', methods=['GET'])
+def pulseheight_compare():
+    """Compare testing sessions by aggregated raw PATE pulse height data.
+
+    GET /api/pulseheight/compare
+    Query parameters:
+    sessions - A comma separated list of session IDs (default: all)
+    baseline - Session ID to compare against (default: first session)
+    aggregate - avg, sum, min, max or count (default: avg)
+    begin - PATE timestamp (Unix timestamp)
+    end - PATE timestamp (Unix timestamp)
+    fields - A comma separated list of fields to compare
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            "aggregate"     : (str),
+            "baseline"      : (int),
+            "sessions"      : [(int), ...],
+            "fields"        : [(str), ...],
+            "values"        : [[(float), ...], ...],
+            "difference"    : [[(float), ...], ...],
+            "ratio"         : [[(float), ...], ...]
+        },
+        ...
+    }
+
+    Matrices have one row per session (in the order of "sessions") and one column per field (in the order of "fields"). Difference is (session - baseline) and ratio is (session / baseline). All sessions are aggregated in one grouped pass over the data. If the baseline session has no data in the range, 404 Not Found is returned."""
+    log_request(request)
+    try:
+        from api.PulseHeight import PulseHeight
+        return api.coalesced_response(lambda: PulseHeight(request).compare())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/pulseheight/histogram', methods=['GET'])
+def pulseheight_histogram():
+    """Pulse height histograms (ADC spectra) of PATE pulse height data.
+
+    GET /api/pulseheight/histogram
+    Query parameters:
+    begin - PATE timestamp (Unix timestamp)
+    end - PATE timestamp (Unix timestamp)
+    session_id - Testing session ID
+    fields - A comma separated list of channels (default: all)
+    edges - A comma separated list of increasing bin edges
+    bins - Number of equal width bins, if 'edges' is not given (default: 256)
+    range - Histogram range 'lo,hi' for 'bins' (default: data min and max)
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            "edges"     : [(float), ...],
+            "counts"    : {<field> : [(int), ...], ...},
+            "underflow" : {<field> : (int), ...},
+            "overflow"  : {<field> : (int), ...},
+            "entries"   : {<field> : (int), ...}
+        },
+        ...
+    }
+    Bins are half-open [lo, hi), except the last, which includes its upper
+    edge. NULL values are not counted."""
+    log_request(request)
+    try:
+        from api.PulseHeight import PulseHeight
+        return api.response(PulseHeight(request).histogram())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/pulseheight/spectrum', methods=['GET'])
+def pulseheight_spectrum():
+    """Cumulative ADC spectra of PATE pulse height data.
+
+    GET /api/pulseheight/spectrum
+    Query parameters:
+    session_id - Testing session ID (default: all sessions)
+    begin - PATE timestamp (Unix timestamp, optional)
+    end - PATE timestamp (Unix timestamp, optional)
+    fields - A comma separated list of channels (default: all)
+    rebin - Number of adjacent ADC bins to combine (default: 1)
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            "session_id" : (int),
+            "begin"      : (int),
+            "end"        : (int),
+            "method"     : "session" | "buckets" | "raw",
+            "bins"       : (int),
+            "width"      : (int),
+            "counts"     : {<field> : [(int), ...], ...},
+            "underflow"  : {<field> : (int), ...},
+            "overflow"   : {<field> : (int), ...},
+            "entries"    : {<field> : (int), ...}
+        },
+        ...
+    }
+    Bin i counts ADC values i * width ... (i + 1) * width - 1. Histograms
+    are maintained incrementally in the local cache database; session
+    spectrum without 'begin' and 'end' is a single row lookup. Stored
+    histograms can be rebuilt with 'flask rebuild-spectra'."""
+    log_request(request)
+    try:
+        from api.PulseHeight import PulseHeight
+        return api.response(PulseHeight(request).spectrum())
     except Exception as e:
         return api.exception_response(e)
 
@@ -207,6 +420,9 @@ def hitcount():
     begin - PATE timestamp (Unix timestamp)
     end - PATE timestamp (Unix timestamp)
     fields - A comma separated list of fields to return
+    sector - Sectors to return, list and/or ranges (0 ... 36), e.g. "1-36"
+    class - Particle classes to return (proton, electron, ac, dx, trash)
+    channel - Channels to return, list and/or ranges (1 ... 12), e.g. "1,3"
     API returns 200 OK and:
     {
         ...,
@@ -224,11 +440,229 @@ def hitcount():
 
     Parameters 'begin' and 'end' are integers, although the 'rotation' field they are compared to, is a decimal number. NOTE: This datetime format is placeholder, because instrument development has not formally specified the one used in the actual satellite. Internally, Python timestamp is used.
 
+    Counters can be selected with 'sector', 'class' and 'channel' arguments instead of listing their names in 'fields'. For example "sector=5&class=proton" selects all proton channels of sector 5 and "class=electron&channel=3" selects electron channel 3 of all 37 sectors. Omitted selector means "all". Selectors are also accepted by all other hitcount endpoints.
+
     A JSON list of objects is returned. Among object properties, primary key 'timestamp' is always included, regardless what 'fields' argument specifies. Data exceeding 7 days should not be requested. For more data, CSV services should be used."""
     log_request(request)
     try:
         from api.HitCount import HitCount
-        return api.response(HitCount(request).get())
+        return api.coalesced_response(lambda: HitCount(request).get())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/hitcount/spectrum', methods=['GET'])
+def hitcount_spectrum():
+    """Per-rotation energy spectra, reduced over a set of sectors.
+
+    GET /api/hitcount/spectrum
+    Query parameters:
+    begin - PATE timestamp (Unix timestamp)
+    end - PATE timestamp (Unix timestamp)
+    session_id - Testing session ID
+    sector - Sectors to reduce over, list and/or ranges (default: 1-36)
+    class - Particle classes to include (default: all)
+    channel - Channels to include (default: all)
+    aggregate - Reduction function, 'sum' (default) or 'avg'
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            "aggregate" : ("sum" | "avg"),
+            "sectors"   : [(int), ...],
+            "channels"  : [[(str) class, (int) channel], ...],
+            "timestamp" : [(int), ...],
+            "spectra"   : [[(float), ...], ...]
+        },
+        ...
+    }
+
+    Each row of "spectra" is one rotation (timestamp at the same position in "timestamp") and each column one channel (as listed in "channels"). By default, the omnidirectional spectrum of the 36 spinning sectors is returned; the sun-pointing sector 0 is excluded unless selected with 'sector'.
+
+    Rotations are read and reduced in batches, so long ranges are processed in one pass with bounded memory."""
+    log_request(request)
+    try:
+        from api.HitCount import HitCount
+        return api.response(HitCount(request).spectrum())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/hitcount/distribution', methods=['GET'])
+def hitcount_distribution():
+    """Spin-phase (pitch-angle) distribution of hit counts.
+
+    GET /api/hitcount/distribution
+    Query parameters:
+    begin - PATE timestamp (Unix timestamp)
+    end - PATE timestamp (Unix timestamp)
+    session_id - Testing session ID
+    class - Particle classes to include (default: all)
+    channel - Channels to include (default: all)
+    rebin - Number of adjacent sectors to combine; 1 (default), 2, 3, 4, 6, 9, 12, 18 or 36
+    normalize - 'none' (default), 'rotation', 'channel' or 'total'
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            "rotations"     : (int),
+            "normalize"     : (str),
+            "rebin"         : (int),
+            "phase"         : [(int), ...],
+            "channels"      : [[(str) class, (int) channel], ...],
+            "distribution"  : [[(float), ...], ...]
+        },
+        ...
+    }
+
+    Counts of the 36 spinning sectors are accumulated over the range. Each row of "distribution" is one angular bin, starting at the spin phase (degrees) listed at the same position in "phase", and each column is one channel. Normalization 'rotation' gives mean counts per rotation, 'channel' scales each channel column to sum 1.0 and 'total' scales the whole matrix to sum 1.0."""
+    log_request(request)
+    try:
+        from api.HitCount import HitCount
+        return api.response(HitCount(request).distribution())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/hitcount/spectrogram', methods=['GET'])
+def hitcount_spectrogram():
+    """Time-energy spectrogram as a binary typed array.
+
+    GET /api/hitcount/spectrogram
+    Query parameters:
+    begin - PATE timestamp (Unix timestamp, default: oldest data)
+    end - PATE timestamp (Unix timestamp, default: newest data)
+    session_id - Testing session ID
+    resolution - Time bin length in seconds
+    bins - Number of time bins, if 'resolution' is not given (default: 512)
+    sector - Sectors to reduce over, list and/or ranges (default: 1-36)
+    class - Particle classes to include (default: all)
+    channel - Channels to include (default: all)
+    aggregate - Sector reduction, 'sum' (default) or 'avg'
+    API returns 200 OK and 'application/octet-stream':
+
+        uint32 (LE)         Length of the JSON header
+        JSON header         {
+                                "axes"       : ["time", "channel"],
+                                "begin"      : (int),
+                                "end"        : (int),
+                                "resolution" : (int),
+                                "bins"       : (int),
+                                "rotations"  : (int),
+                                "aggregate"  : (str),
+                                "sectors"    : [(int), ...],
+                                "channels"   : [[(str), (int)], ...],
+                                "value"      : "mean counts per rotation",
+                                "dtype"      : "<f4",
+                                "shape"      : [bins, channels],
+                                "api"        : {...}
+                            }
+        float32 (LE)        bins x channels matrix, row-major
+
+    Time bin i starts at begin + i * resolution. Rotations after 'end' are not included, so the last bin may be partial. Bins without rotations are NaN. Data begins at an offset divisible by 8, so it can be used directly as a Float32Array in the browser. Errors are reported as JSON."""
+    log_request(request)
+    try:
+        from api.HitCount import HitCount
+        return api.binary_response(*HitCount(request).spectrogram())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/hitcount/tile', methods=['GET'])
+def hitcount_tile():
+    """Spectrogram tile from the multi-resolution tile pyramid.
+
+    GET /api/hitcount/tile
+    Query parameters:
+    level - Zoom level; bin length is 2**level seconds (default range: 4 - 24)
+    tile - Tile index; tile covers timestamps
+           tile * bins * 2**level ... (tile + 1) * bins * 2**level - 1
+    class - Particle classes to include (default: all)
+    channel - Channels to include (default: all)
+    API returns 200 OK and 'application/octet-stream', in the same format
+    as /api/hitcount/spectrogram, with additional header values 'level',
+    'tile' and 'end'. Number of bins per tile is TILE_BINS (default 256).
+
+    Counts are summed over the spinning sectors (1 - 36) and all sessions.
+    Tiles are built once and served from the local cache database; tiles
+    overlapping data newer than when they were built are rebuilt."""
+    log_request(request)
+    try:
+        from api.HitCount import HitCount
+        return api.binary_response(*HitCount(request).tile())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/hitcount/asof', methods=['GET'])
+def hitcount_asof():
+    """Hit counter rotations joined with preceding housekeeping and PSU data.
+
+    GET /api/hitcount/asof
+    Query parameters:
+    begin - PATE timestamp (Unix timestamp)
+    end - PATE timestamp (Unix timestamp)
+    session_id - Testing session ID
+    fields - A comma separated list of hit counter fields
+    sector, class, channel - Counter selectors
+    housekeeping - A comma separated list of housekeeping fields (default: all)
+    psu - A comma separated list of PSU fields (default: all)
+    tolerance - Maximum age (seconds) of a joined row (default: unlimited)
+    API returns 200 OK and columnar data:
+    {
+        ...,
+        "data" : {
+            "timestamp"              : [(int), ...],
+            "session_id"             : [(int), ...],
+            <hit counter field>      : [...],
+            "housekeeping.timestamp" : [(int), ...],
+            "housekeeping.<field>"   : [...],
+            "psu.modified"           : [(int), ...],
+            "psu.<field>"            : [...]
+        },
+        ...
+    }
+    Each rotation gets the latest housekeeping row and PSU reading at or
+    before its timestamp (null if none). Same data is available as a
+    streamed CSV file from '/csv/hitcount/asof'."""
+    log_request(request)
+    try:
+        from api.HitCount import HitCount
+        return api.response(HitCount(request).asof_columns())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/hitcount/latest', methods=['GET'])
+def hitcount_latest():
+    """Newest PATE hit counter rotation(s).
+
+    GET /api/hitcount/latest
+    Query parameters:
+    n - Number of newest rows to return (default: 1)
+    session_id - Testing session ID
+    fields - A comma separated list of fields to return
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            <fields according to query parameter 'fields'>
+        },
+        ...
+    }
+    If 'n' is given, "data" is a list of objects, newest first. Rows are
+    found with a descending index seek and the result is reused until new
+    rows are inserted."""
+    log_request(request)
+    try:
+        from api.HitCount import HitCount
+        return api.response(HitCount(request).latest())
     except Exception as e:
         return api.exception_response(e)
 
@@ -244,6 +678,7 @@ def hitcount_aggregate(function):
     begin - PATE timestamp (Unix timestamp)
     end - PATE timestamp (Unix timestamp)
     fields - A comma separated list of fields to return
+    group_by - 'session_id' returns a list of objects, one per testing session
     API returns 200 OK and:
     {
         ...,
@@ -265,12 +700,125 @@ def hitcount_aggregate(function):
             raise api.InvalidArgument(
                 "Function '{}' is not supported!".format(function)
             )
-        return api.response(HitCount(request).get(function))
+        return api.coalesced_response(lambda: HitCount(request).get(function))
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+
+@app.route('/api/hitcount/stats', methods=['GET'])
+def hitcount_stats():
+    """Descriptive statistics of classified PATE hit counters.
+
+    GET /api/hitcount/stats
+    Query parameters:
+    begin - PATE timestamp (Unix timestamp)
+    end - PATE timestamp (Unix timestamp)
+    session_id - Testing session ID
+    fields - A comma separated list of fields to return
+    group_by - 'session_id' returns a list of objects, one per testing session
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            <field> : {
+                "count"     : (int),
+                "sum"       : (number),
+                "min"       : (number),
+                "max"       : (number),
+                "mean"      : (float),
+                "variance"  : (float),
+                "stddev"    : (float)
+            },
+            ...
+        },
+        ...
+    }
+
+    All statistics are calculated in one pass over the requested range. Only numeric fields are included. Variance is the sample variance (n - 1). Mean, variance and stddev are null when there are too few values to define them."""
+    log_request(request)
+    try:
+        from api.HitCount import HitCount
+        return api.coalesced_response(lambda: HitCount(request).stats())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/hitcount/quantile', methods=['GET'])
+def hitcount_quantile():
+    """Quantiles (percentiles) of classified PATE hit counters.
+
+    GET /api/hitcount/quantile
+    Query parameters:
+    q - A comma separated list of quantiles, 0.0 ... 1.0 (default: 0.5)
+    begin - PATE timestamp (Unix timestamp)
+    end - PATE timestamp (Unix timestamp)
+    session_id - Testing session ID
+    fields - A comma separated list of fields to return
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            <field> : {
+                <q> : (float),
+                ...
+            },
+            ...
+        },
+        "method" : ("exact" | "t-digest"),
+        ...
+    }
+
+    Example: GET /api/hitcount/quantile?q=0.5,0.95 returns median and 95th percentile of each numeric field.
+
+    Ranges up to one day (configurable) are calculated exactly. Longer ranges are estimated from t-digest sketches that are stored per time bucket, which makes the response time practically independent of the range length. Estimation error is smallest at the tails (p01, p99) and largest around the median (typically well below 1% of the value range)."""
+    log_request(request)
+    try:
+        from api.HitCount import HitCount
+        return api.coalesced_response(lambda: HitCount(request).quantile())
     except Exception as e:
         return api.exception_response(e)
 
 
 
+@app.route('/api/hitcount/compare', methods=['GET'])
+def hitcount_compare():
+    """Compare testing sessions by aggregated classified PATE hit counters.
+
+    GET /api/hitcount/compare
+    Query parameters:
+    sessions - A comma separated list of session IDs (default: all)
+    baseline - Session ID to compare against (default: first session)
+    aggregate - avg, sum, min, max or count (default: avg)
+    begin - PATE timestamp (Unix timestamp)
+    end - PATE timestamp (Unix timestamp)
+    fields - A comma separated list of fields to compare
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            "aggregate"     : (str),
+            "baseline"      : (int),
+            "sessions"      : [(int), ...],
+            "fields"        : [(str), ...],
+            "values"        : [[(float), ...], ...],
+            "difference"    : [[(float), ...], ...],
+            "ratio"         : [[(float), ...], ...]
+        },
+        ...
+    }
+
+    Matrices have one row per session (in the order of "sessions") and one column per field (in the order of "fields"). Difference is (session - baseline) and ratio is (session / baseline). All sessions are aggregated in one grouped pass over the data. If the baseline session has no data in the range, 404 Not Found is returned."""
+    log_request(request)
+    try:
+        from api.HitCount import HitCount
+        return api.coalesced_response(lambda: HitCount(request).compare())
+    except Exception as e:
+        return api.exception_response(e)
+
+
 
 #
 # Housekeeping
@@ -302,7 +850,36 @@ def housekeeping():
     log_request(request)
     try:
         from api.Housekeeping import Housekeeping
-        return api.response(Housekeeping(request).get())
+        return api.coalesced_response(lambda: Housekeeping(request).get())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/housekeeping/latest', methods=['GET'])
+def housekeeping_latest():
+    """Newest PATE housekeeping data.
+
+    GET /api/housekeeping/latest
+    Query parameters:
+    n - Number of newest rows to return (default: 1)
+    session_id - Testing session ID
+    fields - A comma separated list of fields to return
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            <fields according to query parameter 'fields'>
+        },
+        ...
+    }
+    If 'n' is given, "data" is a list of objects, newest first. Rows are
+    found with a descending index seek and the result is reused until new
+    rows are inserted."""
+    log_request(request)
+    try:
+        from api.Housekeeping import Housekeeping
+        return api.response(Housekeeping(request).latest())
     except Exception as e:
         return api.exception_response(e)
 
@@ -318,6 +895,7 @@ def housekeeping_aggregate(function):
     begin - PATE timestamp (Unix timestamp)
     end - PATE timestamp (Unix timestamp)
     fields - A comma separated list of fields to return
+    group_by - 'session_id' returns a list of objects, one per testing session
     API returns 200 OK and:
     {
         ...,
@@ -338,16 +916,227 @@ def housekeeping_aggregate(function):
             raise api.InvalidArgument(
                 "Function '{}' is not supported!".format(function)
             )
-        return api.response(Housekeeping(request).get(function))
+        return api.coalesced_response(lambda: Housekeeping(request).get(function))
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+
+@app.route('/api/housekeeping/stats', methods=['GET'])
+def housekeeping_stats():
+    """Descriptive statistics of PATE housekeeping data.
+
+    GET /api/housekeeping/stats
+    Query parameters:
+    begin - PATE timestamp (Unix timestamp)
+    end - PATE timestamp (Unix timestamp)
+    session_id - Testing session ID
+    fields - A comma separated list of fields to return
+    group_by - 'session_id' returns a list of objects, one per testing session
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            <field> : {
+                "count"     : (int),
+                "sum"       : (number),
+                "min"       : (number),
+                "max"       : (number),
+                "mean"      : (float),
+                "variance"  : (float),
+                "stddev"    : (float)
+            },
+            ...
+        },
+        ...
+    }
+
+    All statistics are calculated in one pass over the requested range. Only numeric fields are included. Variance is the sample variance (n - 1). Mean, variance and stddev are null when there are too few values to define them."""
+    log_request(request)
+    try:
+        from api.Housekeeping import Housekeeping
+        return api.coalesced_response(lambda: Housekeeping(request).stats())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/housekeeping/quantile', methods=['GET'])
+def housekeeping_quantile():
+    """Quantiles (percentiles) of PATE housekeeping data.
+
+    GET /api/housekeeping/quantile
+    Query parameters:
+    q - A comma separated list of quantiles, 0.0 ... 1.0 (default: 0.5)
+    begin - PATE timestamp (Unix timestamp)
+    end - PATE timestamp (Unix timestamp)
+    session_id - Testing session ID
+    fields - A comma separated list of fields to return
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            <field> : {
+                <q> : (float),
+                ...
+            },
+            ...
+        },
+        "method" : ("exact" | "t-digest"),
+        ...
+    }
+
+    Example: GET /api/housekeeping/quantile?q=0.5,0.95 returns median and 95th percentile of each numeric field.
+
+    Ranges up to one day (configurable) are calculated exactly. Longer ranges are estimated from t-digest sketches that are stored per time bucket, which makes the response time practically independent of the range length. Estimation error is smallest at the tails (p01, p99) and largest around the median (typically well below 1% of the value range)."""
+    log_request(request)
+    try:
+        from api.Housekeeping import Housekeeping
+        return api.coalesced_response(lambda: Housekeeping(request).quantile())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+@app.route('/api/housekeeping/compare', methods=['GET'])
+def housekeeping_compare():
+    """Compare testing sessions by aggregated PATE housekeeping data.
+
+    GET /api/housekeeping/compare
+    Query parameters:
+    sessions - A comma separated list of session IDs (default: all)
+    baseline - Session ID to compare against (default: first session)
+    aggregate - avg, sum, min, max or count (default: avg)
+    begin - PATE timestamp (Unix timestamp)
+    end - PATE timestamp (Unix timestamp)
+    fields - A comma separated list of fields to compare
+    API returns 200 OK and:
+    {
+        ...,
+        "data" : {
+            "aggregate"     : (str),
+            "baseline"      : (int),
+            "sessions"      : [(int), ...],
+            "fields"        : [(str), ...],
+            "values"        : [[(float), ...], ...],
+            "difference"    : [[(float), ...], ...],
+            "ratio"         : [[(float), ...], ...]
+        },
+        ...
+    }
+
+    Matrices have one row per session (in the order of "sessions") and one column per field (in the order of "fields"). Difference is (session - baseline) and ratio is (session / baseline). All sessions are aggregated in one grouped pass over the data. If the baseline session has no data in the range, 404 Not Found is returned."""
+    log_request(request)
+    try:
+        from api.Housekeeping import Housekeeping
+        return api.coalesced_response(lambda: Housekeeping(request).compare())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+#
+# Dashboard snapshot
+#
+@app.route('/api/dashboard', methods=['GET'])
+def dashboard():
+    """Snapshot of PSU values and the latest housekeeping and hit counter data.
+
+    GET /api/dashboard
+    No query parameters supported.
+    API returns 200 OK and:
+    {
+        "data" : {
+            "psu"           : {<as '/api/psu'>} | null,
+            "housekeeping"  : {<as '/api/housekeeping/latest'>} | null,
+            "hitcount"      : {<as '/api/hitcount/latest'>} | null
+        },
+        "api" : {
+            "version"  : (int),
+            "snapshot" : {
+                "data_version" : (int),
+                "built"        : (float)
+            }
+        }
+    }
+    Snapshot is rebuilt by a background thread whenever the database
+    changes, and served pre-encoded. Responses carry an ETag; conditional
+    requests get 304 Not Modified until the snapshot changes."""
+    log_request(request)
+    try:
+        from api.Dashboard import Dashboard
+        snapshot = Dashboard.current()
+        return api.prepared_response(snapshot['encoded'], snapshot['etag'])
     except Exception as e:
         return api.exception_response(e)
 
 
 
+#
+# Batch of sub-requests
+#
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """Execute several read-only sub-requests in one request.
+
+    POST /api/batch
+    No query parameters supported.
+    Required payload:
+    {
+        "parallel" : (bool, optional, default false),
+        "requests" : [
+            {
+                "resource"  : "hitcount" | "housekeeping" | "pulseheight" | "psu",
+                "function"  : "get" | "latest" | "stats" | "quantile" (optional, default "get"),
+                "aggregate" : "avg" | "sum" | "min" | "max" | "count" (optional, "get" only),
+                <other keys as query parameters of the resource's GET endpoint>
+            },
+            ...
+        ]
+    }
+    Resource "psu" supports only function "get", without "aggregate". Other
+    combinations are rejected with 406.
+    API returns 200 OK and:
+    {
+        "data" : [
+            {
+                "code" : (int),
+                "data" : <as the resource's GET endpoint>
+            } | {
+                "code"    : (int),
+                "message" : (str),
+                "details" : (any, optional)
+            },
+            ...
+        ],
+        ...
+    }
+
+    Results are listed in the order of the sub-requests. A failing sub-request does not fail the batch.
+
+    By default, sub-requests are executed on one database connection, inside one read transaction, so the results are a consistent snapshot. With "parallel" : true, they are executed in a thread pool, each with its own connection; results may then reflect different database states."""
+    log_request(request)
+    try:
+        from api.Batch import Batch
+        return api.response(Batch(request).post())
+    except Exception as e:
+        return api.exception_response(e)
+
+
 
 #
 # PSU
 #
+#   Fields of the PSU subset endpoints (also used by fast-path dispatch)
+#
+psu_fields = {
+    'voltage'       : ['measured_voltage', 'voltage_setting', 'modified'],
+    'current'       : ['measured_current', 'current_limit', 'modified'],
+    'current_limit' : ['current_limit', 'modified'],
+    'power'         : ['power', 'modified']
+}
+
 @app.route('/api/psu', methods=['GET'])
 def psu():
     """Read PSU values.
@@ -374,7 +1163,7 @@ def psu():
     log_request(request)
     try:
         from api.PSU import PSU
-        return api.response(PSU(request).get())
+        return api.coalesced_response(lambda: PSU(request).get())
     except Exception as e:
         return api.exception_response(e)
 
@@ -412,14 +1201,10 @@ def psu_voltage():
     """
     log_request(request)
     try:
-        include = [
-            'measured_voltage',
-            'voltage_setting',
-            'modified'
-        ]
+        include = psu_fields['voltage']
         if request.method == 'GET':
             from api.PSU import PSU
-            return api.response(PSU(request).get(include))
+            return api.coalesced_response(lambda: PSU(request).get(include))
         else:
             from api.Command import Command
             return api.response(Command(request).post("PSU", "SET VOLTAGE"))
@@ -445,13 +1230,9 @@ def psu_current():
     }"""
     log_request(request)
     try:
-        include = [
-            'measured_current',
-            'current_limit',
-            'modified'
-        ]
+        include = psu_fields['current']
         from api.PSU import PSU
-        return api.response(PSU(request).get(include))
+        return api.coalesced_response(lambda: PSU(request).get(include))
     except Exception as e:
         return api.exception_response(e)
 
@@ -488,13 +1269,10 @@ def psu_current_limit():
     """
     log_request(request)
     try:
-        include = [
-            'current_limit',
-            'modified'
-        ]
+        include = psu_fields['current_limit']
         if request.method == 'GET':
             from api.PSU import PSU
-            return api.response(PSU(request).get(include))
+            return api.coalesced_response(lambda: PSU(request).get(include))
         else:
             from api.Command import Command
             return api.response(Command(request).post("PSU", "SET CURRENT LIMIT"))
@@ -536,13 +1314,10 @@ def psu_power():
 
     log_request(request)
     try:
-        include = [
-            'power',
-            'modified'
-        ]
+        include = psu_fields['power']
         if request.method == 'GET':
             from api.PSU import PSU
-            return api.response(PSU(request).get(include))
+            return api.coalesced_response(lambda: PSU(request).get(include))
         else:
             from api.Command import Command
             return api.response(Command(request).post("PSU", "SET POWER"))
@@ -551,6 +1326,128 @@ def psu_power():
 
 
 
+#
+# Background CSV export jobs
+#
+@app.route('/api/export', methods=['GET', 'POST'])
+def export():
+    """List or create background CSV export jobs.
+
+    GET /api/export
+    No query parameters supported.
+    API returns 200 OK and a list of jobs (newest first), as below.
+
+    POST /api/export
+    Required payload:
+    {
+        "resource" : "hitcount" | "hitcount/asof" | "housekeeping" | "pulseheight",
+        <other keys as query parameters of the corresponding '/csv/...' endpoint>
+    }
+    API will respond with 202 Accepted and:
+    {
+        ...,
+        "data" : {
+            "id"        : (int),
+            "resource"  : (str),
+            "arguments" : {...},
+            "state"     : "queued" | "running" | "done" | "failed" | "cancelled",
+            "rows"      : (int),
+            "bytes"     : (int),
+            "progress"  : (float, 0 ... 1) | null,
+            "error"     : (str) | null,
+            "created"   : (float),
+            "started"   : (float) | null,
+            "finished"  : (float) | null,
+            "file"      : "/api/export/<id>/file" | null
+        },
+        ...
+    }
+
+    File is written by a background worker. Poll '/api/export/<id>' until "state" is "done" (or "failed"), then download "file". Jobs and files expire after EXPORT_MAX_AGE seconds."""
+    log_request(request)
+    try:
+        from api.Export import Export
+        if request.method == 'POST':
+            return api.response(Export(request).post())
+        else:
+            return api.response(Export(request).get())
+    except Exception as e:
+        return api.exception_response(e)
+
+
+@app.route('/api/export/<int:job_id>', methods=['GET', 'DELETE'])
+def export_job(job_id):
+    """Status of an export job, or cancel and remove it.
+
+    GET /api/export/<int:job_id>
+    No query parameters supported.
+    API returns 200 OK and the job object (see '/api/export').
+
+    DELETE /api/export/<int:job_id>
+    Unfinished job is cancelled; finished job is removed with its file.
+    API returns 200 OK and:
+    {
+        "data" : {
+            "id" : (int)
+        },
+        ...
+    }"""
+    log_request(request)
+    try:
+        from api.Export import Export
+        if request.method == 'DELETE':
+            return api.response(Export(request).delete(job_id))
+        else:
+            return api.response(Export(request).get(job_id))
+    except Exception as e:
+        return api.exception_response(e)
+
+
+@app.route('/api/export/<int:job_id>/file', methods=['GET'])
+def export_file(job_id):
+    """Download the CSV file of a finished export job.
+
+    GET /api/export/<int:job_id>/file
+    No query parameters supported.
+    Supports HTTP Range requests, so interrupted downloads can be resumed. If EXPORT_ACCEL_REDIRECT is configured, the file is sent by nginx ('X-Accel-Redirect'). Responds with 409 Conflict if the job has not finished."""
+    log_request(request)
+    try:
+        from api.Export import Export
+        return Export(request).download(job_id)
+    except Exception as e:
+        return api.exception_response(e)
+
+
+
+#
+# Fast-path dispatch (api/FastPath.py, FASTPATH_ENABLED)
+#
+#   Hot GET endpoints served without Flask's request handling, when no
+#   query parameters are given. Each handler must return the same payload
+#   as the route above it does.
+#
+def fastpath_resource(module, name, method, *args):
+    """Return handler function calling 'method' of resource class 'name'."""
+    def handler(request):
+        import importlib
+        resource = getattr(importlib.import_module(module), name)(request)
+        return getattr(resource, method)(*args)
+    return handler
+
+fastpath_handlers = {
+    '/api/psu'                  : fastpath_resource('api.PSU', 'PSU', 'get'),
+    '/api/psu/voltage'          : fastpath_resource('api.PSU', 'PSU', 'get', psu_fields['voltage']),
+    '/api/psu/current'          : fastpath_resource('api.PSU', 'PSU', 'get', psu_fields['current']),
+    '/api/psu/current/limit'    : fastpath_resource('api.PSU', 'PSU', 'get', psu_fields['current_limit']),
+    '/api/psu/power'            : fastpath_resource('api.PSU', 'PSU', 'get', psu_fields['power']),
+    '/api/hitcount/latest'      : fastpath_resource('api.HitCount', 'HitCount', 'latest'),
+    '/api/housekeeping/latest'  : fastpath_resource('api.Housekeeping', 'Housekeeping', 'latest'),
+    '/api/pulseheight/latest'   : fastpath_resource('api.PulseHeight', 'PulseHeight', 'latest')
+}
+
+
+
+
 #
 # Register
 #
@@ -669,6 +1566,7 @@ def hitcount_csv():
     begin - PATE timestamp
     end - PATE timestamp
     fields - A comma separated list of fields to return
+    sector, class, channel - Counter selectors (see '/api/hitcount')
 
     All request parameters are optional. 'being' and 'end' timestamps limit the
     result set and 'fields' limits the columns to the listed (and primary key,
@@ -677,16 +1575,24 @@ def hitcount_csv():
     log_request(request)
     try:
         from api.HitCount import HitCount
-        # Use .query() method which returns sqlite3.Cursor object
-        return api.stream_result_as_csv(HitCount(request).query())
-    except api.ApiException as e:
-        app.logger.warning(str(e))
-        return flask.Response(str(e), status=e.code, mimetype="text/plain")
-    except Exception as e:
-        app.logger.exception(
-            "CSV generation failure! " + str(e)
-        )
-        raise
+        # Short rowid bounded queries, see DataObject.paged_query()
+        return api.stream_rows_as_csv(*HitCount(request).paged_query())
+    except Exception as e:
+        return api.csv_error_response(e)
+
+
+
+@app.route('/csv/hitcount/asof', methods=['GET'])
+def hitcount_asof_csv():
+    """Export hit counter rotations, joined with preceding housekeeping and PSU data, into CSV file.
+
+    Request parameters are the same as for '/api/hitcount/asof'."""
+    log_request(request)
+    try:
+        from api.HitCount import HitCount
+        return api.stream_rows_as_csv(*HitCount(request).asof())
+    except Exception as e:
+        return api.csv_error_response(e)
 
 
 
@@ -697,15 +1603,9 @@ def pulseheight_csv():
     log_request(request)
     try:
         from api.PulseHeight import PulseHeight
-        return api.stream_result_as_csv(PulseHeight(request).query())
-    except api.ApiException as e:
-        app.logger.warning(str(e))
-        return flask.Response(str(e), status=e.code, mimetype="text/plain")
+        return api.stream_rows_as_csv(*PulseHeight(request).paged_query())
     except Exception as e:
-        app.logger.exception(
-            "CSV generation failure! " + str(e)
-        )
-        raise
+        return api.csv_error_response(e)
     #return app.response_class(status = 501, mimetype = "text/html")
 
 
@@ -726,15 +1626,9 @@ def housekeeping_csv():
     log_request(request)
     try:
         from api.Housekeeping import Housekeeping
-        return api.stream_result_as_csv(Housekeeping(request).query())
-    except api.ApiException as e:
-        app.logger.warning(str(e))
-        return flask.Response(str(e), status=e.code, mimetype="text/plain")
+        return api.stream_rows_as_csv(*Housekeeping(request).paged_query())
     except Exception as e:
-        app.logger.exception(
-            "CSV generation failure! " + str(e)
-        )
-        raise
+        return api.csv_error_response(e)
     #return app.response_class(status = 501, mimetype = "text/html")
 
 
@@ -752,14 +1646,8 @@ def note_csv():
     try:
         from api.Note import Note
         return api.stream_result_as_csv(Note(request).query())
-    except api.ApiException as e:
-        app.logger.warning(str(e))
-        return flask.Response(str(e), status=e.code, mimetype="text/plain")
     except Exception as e:
-        app.logger.exception(
-            "CSV generation failure! " + str(e)
-        )
-        raise
+        return api.csv_error_response(e)
 
 
 
@@ -795,6 +1683,29 @@ def show_flask_config():
         return api.exception_response(e)
 
 
+#
+# Process metrics
+#
+@app.route('/sys/metrics', methods=['GET'])
+def show_metrics():
+    """Counters of this worker process (buffer hits, etc.) and the state of
+    the in-memory hot-tail buffers. Each uWSGI worker process reports only
+    its own values."""
+    log_request(request)
+    try:
+        from api.HotTail import HotTail
+        return api.response((
+            200,
+            {
+                "pid"       : os.getpid(),
+                "counters"  : api.metrics_snapshot(),
+                "hot_tail"  : HotTail.status()
+            }
+        ))
+    except Exception as e:
+        return api.exception_response(e)
+
+
 #
 # API listing
 #